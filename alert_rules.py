@@ -0,0 +1,240 @@
+"""Alertas meteorológicas declarativas evaluadas de forma incremental para todas las ciudades.
+
+Una regla es un diccionario:
+    {"id": "lluvia", "when": "precipitation_probability > 70", "within_hours": 3,
+     "message": "Probabilidad de lluvia de {value:.0f}% a las {time}"}
+    {"id": "helada", "when": "temperature_2m < 0", "within_hours": 24, "hours": [20, 8],
+     "severity": "warning", "message": "Bajo 0 °C esta noche ({value:.1f} °C a las {time})"}
+
+"hours" limita la regla a un rango de horas locales (con cruce de medianoche: [20, 8] es de
+20:00 a 07:59). Las reglas se compilan una sola vez. Para cada ciudad se guarda qué horas del
+bloque horario cumplen cada condición; al llegar datos nuevos solo se evalúan las horas cuyos
+valores cambiaron. Una alerta se emite una vez al activarse y sigue activa (sin repetirse)
+mientras alguna hora dentro de la ventana cumpla la condición.
+
+Uso con el planificador:
+    engine = AlertEngine(shared_data=SharedWeatherData())
+    AdaptiveRefreshScheduler(service, on_refresh=engine.evaluate_many)
+"""
+import operator
+import re
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from instrumentation import count, debug, info, warning
+
+_OPERATORS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le,
+    '==': operator.eq, '!=': operator.ne,
+}
+_CONDITION = re.compile(r'^\s*(\w+)\s*(>=|<=|==|!=|>|<)\s*(-?\d+(?:\.\d+)?)\s*$')
+_EPOCH = datetime(1970, 1, 1)
+
+DEFAULT_RULES = (
+    {"id": "lluvia", "when": "precipitation_probability > 70", "within_hours": 3,
+     "message": "Probabilidad de lluvia de {value:.0f}% a las {time}"},
+    {"id": "helada", "when": "temperature_2m < 0", "within_hours": 24, "hours": [20, 8],
+     "severity": "warning", "message": "Bajo 0 °C esta noche ({value:.1f} °C a las {time})"},
+)
+
+
+class AlertRule:
+    """Regla compilada: condición sobre una variable horaria, ventana y rango de horas"""
+
+    __slots__ = ("id", "variable", "test", "window", "hours", "message", "severity")
+
+    def __init__(self, spec: Dict):
+        match = _CONDITION.match(spec.get("when", ""))
+        if match is None:
+            raise ValueError(f"Condición inválida en la regla {spec.get('id')!r}: {spec.get('when')!r}")
+        variable, symbol, threshold = match.groups()
+        compare, threshold = _OPERATORS[symbol], float(threshold)
+
+        self.id = spec.get("id") or spec["when"]
+        self.variable = variable
+        # Los valores faltantes (None o NaN) nunca cumplen la condición
+        self.test = lambda value: value is not None and value == value and compare(value, threshold)
+        self.window = timedelta(hours=float(spec.get("within_hours", 24)))
+        hours = spec.get("hours")
+        if hours is None:
+            self.hours = None
+        else:
+            start, end = int(hours[0]) % 24, int(hours[1]) % 24
+            span = (end - start) % 24 or 24
+            self.hours = frozenset((start + offset) % 24 for offset in range(span))
+        self.message = spec.get("message", f"{spec['when']} ({{value}} a las {{time}})")
+        self.message.format(value=0.0, time="00:00", city="")  # Plantilla inválida: falla al compilar
+        self.severity = spec.get("severity", "info")
+
+
+def compile_rules(specs: Iterable[Dict]) -> List[AlertRule]:
+    """Compila las reglas; las inválidas se descartan con un aviso"""
+    rules = []
+    for spec in specs:
+        try:
+            rules.append(AlertRule(spec))
+        except (ValueError, KeyError, TypeError, IndexError) as e:
+            warning(f"⚠️ Regla de alerta descartada: {e}")
+    return rules
+
+
+class _CityState:
+    """Lo visto de una ciudad en la evaluación anterior"""
+
+    __slots__ = ("columns", "slots", "matches", "active")
+
+    def __init__(self):
+        self.columns = {}  # variable -> lista horaria recibida la última vez
+        self.slots = {}  # hora ISO -> valores de las variables de las reglas
+        self.matches = {}  # id de regla -> {hora ISO: valor} de las horas que cumplen la condición
+        self.active = {}  # id de regla -> alerta activa
+
+
+class AlertEngine:
+    """Evalúa reglas compiladas sobre la salida de WeatherService.get_weather_data"""
+
+    def __init__(self, rules: Iterable[Dict] = DEFAULT_RULES, shared_data=None, batch_size: int = 200,
+                 clock=time.time):
+        self.rules = compile_rules(rules)
+        self.variables = tuple(sorted({rule.variable for rule in self.rules}))
+        self.shared_data = shared_data
+        self.batch_size = batch_size
+        self._clock = clock
+        self._states = {}  # ciudad -> _CityState
+        self._lock = Lock()
+
+    def evaluate(self, city: str, data: Dict, now: Optional[float] = None) -> List[Dict]:
+        """Evalúa una ciudad; devuelve las alertas nuevas (las ya emitidas no se repiten)"""
+        return self.evaluate_many({city: data}, now).get(city, [])
+
+    def evaluate_many(self, results: Dict[str, Dict], now: Optional[float] = None) -> Dict[str, List[Dict]]:
+        """Evalúa un lote {ciudad: datos} y publica en SharedWeatherData las alertas activas que cambiaron.
+
+        Devuelve {ciudad: [alertas nuevas]} solo para las ciudades con alertas nuevas.
+        """
+        now = self._clock() if now is None else now
+        fired = {}
+        changed = {}
+        with self._lock:
+            for city, data in results.items():
+                if not isinstance(data, dict) or not data.get('success'):
+                    continue  # Datos por defecto tras un fallo: conservar el estado anterior
+                state = self._states.get(city)
+                if state is None:
+                    state = self._states[city] = _CityState()
+                self._update_matches(state, data.get('hourly') or {})
+                new_alerts, active_changed = self._update_active(city, state, data, now)
+                if new_alerts:
+                    fired[city] = new_alerts
+                if active_changed:
+                    changed[city] = tuple(state.active.values())
+
+        if fired:
+            count("alerts.fired", sum(len(alerts) for alerts in fired.values()))
+            info(f"🔔 {sum(len(alerts) for alerts in fired.values())} alertas nuevas", cities=len(fired))
+        if changed and self.shared_data is not None:
+            self.shared_data.set_alerts(changed)
+        return fired
+
+    def check(self, weather_service, location_names: Optional[List[str]] = None) -> Dict[str, List[Dict]]:
+        """Evalúa las ciudades guardadas (o las indicadas) por lotes a partir de get_weather_data_many"""
+        names = list(weather_service.get_all_locations() if location_names is None else location_names)
+        fired = {}
+        for start in range(0, len(names), self.batch_size):
+            batch = names[start:start + self.batch_size]
+            fired.update(self.evaluate_many(weather_service.get_weather_data_many(batch)))
+        return fired
+
+    def active_alerts(self, city: Optional[str] = None) -> Dict[str, tuple]:
+        """Alertas activas por ciudad (o solo las de city)"""
+        with self._lock:
+            cities = self._states if city is None else {city: self._states[city]} if city in self._states else {}
+            return {name: tuple(state.active.values()) for name, state in cities.items() if state.active}
+
+    def forget(self, city: str):
+        """Olvida el estado de una ciudad eliminada"""
+        with self._lock:
+            self._states.pop(city, None)
+
+    def _update_matches(self, state: _CityState, hourly: Dict):
+        """Reevalúa las condiciones solo en las horas cuyos valores cambiaron desde la vez anterior"""
+        times = hourly.get('time') or []
+        columns = [hourly.get(variable) or () for variable in self.variables]
+        # Caso habitual entre descargas (datos servidos desde caché): listas idénticas, nada que hacer
+        if state.columns.get('time') == times and all(
+                state.columns.get(variable) == column for variable, column in zip(self.variables, columns)):
+            return
+        state.columns = {'time': times, **dict(zip(self.variables, columns))}
+
+        previous = state.slots
+        slots = {}
+        changed = []
+        for index, slot in enumerate(times):
+            values = tuple(column[index] if index < len(column) else None for column in columns)
+            slots[slot] = values
+            if previous.get(slot) != values:
+                changed.append(slot)
+        removed = previous.keys() - slots.keys()
+        state.slots = slots
+        count("alerts.slots_evaluated", len(changed))
+        debug("Horas reevaluadas", changed=len(changed), removed=len(removed))
+
+        positions = {variable: position for position, variable in enumerate(self.variables)}
+        for rule in self.rules:
+            matches = state.matches.setdefault(rule.id, {})
+            for slot in removed:
+                matches.pop(slot, None)
+            position = positions[rule.variable]
+            for slot in changed:
+                value = slots[slot][position]
+                if rule.test(value):
+                    matches[slot] = value
+                else:
+                    matches.pop(slot, None)
+
+    def _update_active(self, city: str, state: _CityState, data: Dict, now: float):
+        """Activa las reglas con alguna hora dentro de su ventana y desactiva las demás"""
+        local_now = _EPOCH + timedelta(seconds=now + (data.get('utc_offset_seconds') or 0))
+        # Las horas del bloque horario son cadenas ISO locales: se comparan como texto
+        current_hour = local_now.strftime('%Y-%m-%dT%H:00')
+        new_alerts = []
+        active_changed = False
+        for rule in self.rules:
+            end = (local_now + rule.window).strftime('%Y-%m-%dT%H:%M')
+            first = None
+            for slot in sorted(state.matches.get(rule.id, ())):
+                if slot < current_hour:
+                    continue
+                if slot >= end:
+                    break
+                if rule.hours is None or int(slot[11:13]) in rule.hours:
+                    first = slot
+                    break
+
+            previous = state.active.get(rule.id)
+            if first is None:
+                if previous is not None:
+                    del state.active[rule.id]
+                    active_changed = True
+                continue
+            if previous is not None and (previous["rule"], previous["severity"]) == (rule.id, rule.severity):
+                # Ya emitida: no duplicar ni reescribirla solo porque la primera hora avanzó
+                continue
+
+            value = state.matches[rule.id][first]
+            alert = {
+                "rule": rule.id,
+                "city": city,
+                "severity": rule.severity,
+                "time": first,
+                "value": value,
+                "message": rule.message.format(value=value, time=first[11:16], city=city),
+                "fired_at": previous["fired_at"] if previous is not None else local_now.isoformat(timespec='minutes'),
+            }
+            state.active[rule.id] = alert
+            active_changed = True
+            if previous is None:
+                new_alerts.append(alert)
+        return new_alerts, active_changed
@@ -0,0 +1,108 @@
+"""Micro-benchmark: conexión persistente con WAL frente a abrir una conexión por llamada.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_database [--cities 200] [--reads 2000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+
+from database_manager import DatabaseManager
+
+
+class OpenPerCallDatabase:
+    """Reproduce el comportamiento anterior: una conexión y un commit por operación"""
+
+    def __init__(self, db_name):
+        self.db_name = db_name
+        conn = sqlite3.connect(db_name)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cities (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS app_config (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                last_selected_city TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO app_config (id, last_selected_city) VALUES (1, NULL)')
+        conn.commit()
+        conn.close()
+
+    def add_city(self, name, latitude, longitude):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute('INSERT INTO cities (name, latitude, longitude) VALUES (?, ?, ?)', (name, latitude, longitude))
+        conn.commit()
+        conn.close()
+
+    def city_exists(self, name):
+        conn = sqlite3.connect(self.db_name)
+        exists = conn.execute('SELECT 1 FROM cities WHERE name = ?', (name,)).fetchone() is not None
+        conn.close()
+        return exists
+
+    def set_last_selected_city(self, city_name):
+        conn = sqlite3.connect(self.db_name)
+        conn.execute('SELECT 1 FROM cities WHERE name = ?', (city_name,))
+        conn.execute('UPDATE app_config SET last_selected_city = ?, updated_at = CURRENT_TIMESTAMP WHERE id = 1', (city_name,))
+        conn.commit()
+        conn.close()
+
+    def get_all_cities(self):
+        conn = sqlite3.connect(self.db_name)
+        rows = conn.execute('SELECT name, latitude, longitude FROM cities ORDER BY name').fetchall()
+        conn.close()
+        return [{"name": r[0], "lat": r[1], "lon": r[2]} for r in rows]
+
+
+def _timed(fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    return elapsed, repeat / elapsed if elapsed else float('inf')
+
+
+def run(db, n_cities, n_reads):
+    """Ejecuta la misma carga sobre una implementación y devuelve operaciones por segundo"""
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['add_city'] = _timed(lambda i: db.add_city(f"Ciudad {i}", i * 0.01, i * 0.02), n_cities)
+        results['city_exists'] = _timed(lambda i: db.city_exists(f"Ciudad {i % n_cities}"), n_reads)
+        results['set_last_selected_city'] = _timed(lambda i: db.set_last_selected_city(f"Ciudad {i % n_cities}"), n_reads // 4)
+        results['get_all_cities'] = _timed(lambda i: db.get_all_cities(), max(1, n_reads // 20))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cities', type=int, default=200)
+    parser.add_argument('--reads', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = run(OpenPerCallDatabase(os.path.join(tmp, 'baseline.db')), args.cities, args.reads)
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager = DatabaseManager(os.path.join(tmp, 'manager.db'))
+        current = run(manager, args.cities, args.reads)
+        manager.close()
+
+    print(f"{'operación':<24}{'por llamada (op/s)':>20}{'persistente (op/s)':>20}{'mejora':>10}")
+    for op in baseline:
+        before, after = baseline[op][1], current[op][1]
+        print(f"{op:<24}{before:>20.0f}{after:>20.0f}{after / before:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark de memoria: bytes por ciudad de los diccionarios anidados frente a Forecast.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_memory [--cities 50] [--days 1 7 16]
+"""
+import argparse
+import json
+import random
+import tracemalloc
+from datetime import datetime, timedelta
+
+from forecast_model import Forecast
+
+
+def sample_payload(days, seed=0):
+    """Genera una respuesta con la forma de la de Open-Meteo para `days` días"""
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    hours = [start + timedelta(hours=h) for h in range(24 * days)]
+    dates = [start + timedelta(days=d) for d in range(days)]
+    return {
+        'current': {
+            'time': '2025-01-01T12:00', 'interval': 900,
+            'temperature_2m': 14.2, 'relative_humidity_2m': 68, 'apparent_temperature': 13.1,
+            'precipitation': 0.0, 'rain': 0.0, 'pressure_msl': 1015.3, 'surface_pressure': 1002.8,
+            'wind_speed_10m': 7.7, 'wind_direction_10m': 210, 'is_day': 1, 'weather_code': 3
+        },
+        'hourly': {
+            'time': [h.strftime('%Y-%m-%dT%H:%M') for h in hours],
+            'temperature_2m': [round(rng.uniform(-5, 30), 1) for _ in hours],
+            'relative_humidity_2m': [rng.randint(20, 100) for _ in hours],
+            'precipitation_probability': [rng.randint(0, 100) for _ in hours],
+            'weather_code': [rng.choice([0, 1, 2, 3, 45, 61, 80, 95]) for _ in hours],
+        },
+        'daily': {
+            'time': [d.strftime('%Y-%m-%d') for d in dates],
+            'weather_code': [rng.choice([0, 3, 61]) for _ in dates],
+            'temperature_2m_max': [round(rng.uniform(10, 30), 1) for _ in dates],
+            'temperature_2m_min': [round(rng.uniform(-5, 10), 1) for _ in dates],
+            'sunrise': [(d + timedelta(hours=7)).strftime('%Y-%m-%dT%H:%M') for d in dates],
+            'sunset': [(d + timedelta(hours=19)).strftime('%Y-%m-%dT%H:%M') for d in dates],
+            'uv_index_max': [round(rng.uniform(0, 11), 2) for _ in dates],
+            'precipitation_sum': [round(rng.uniform(0, 20), 1) for _ in dates],
+        },
+        'success': True
+    }
+
+
+def measure(build, count):
+    """Memoria retenida por `count` objetos construidos con build()"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [build(i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+    return total / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 7, 16])
+    args = parser.parse_args()
+
+    print(f"{'días':>5}{'dict (B/ciudad)':>18}{'Forecast (B/ciudad)':>22}{'reducción':>12}")
+    for days in args.days:
+        texts = [json.dumps(sample_payload(days, seed)) for seed in range(args.cities)]
+        as_dict = measure(lambda i: json.loads(texts[i]), args.cities)
+        as_model = measure(lambda i: Forecast.from_dict(json.loads(texts[i])), args.cities)
+        print(f"{days:>5}{as_dict:>18.0f}{as_model:>22.0f}{as_dict / as_model:>11.1f}x")
+
+
+if __name__ == '__main__':
+    main()
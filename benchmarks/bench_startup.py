@@ -0,0 +1,90 @@
+"""Benchmark de arranque: importación, construcción de WeatherService y primera pantalla.
+
+Cada medición se hace en un intérprete nuevo, como un arranque real de la app.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.bench_startup [--runs 10] [--cities 20]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en el proceso hijo; imprime los tiempos en JSON en la última línea
+_CHILD = r'''
+import contextlib, io, json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import weather_service
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    service = weather_service.WeatherService(base_url="http://127.0.0.1:9/v1/forecast")
+    constructed = time.perf_counter()
+    city, data = service.get_startup_data()
+    rendered = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "construct_ms": (constructed - imported) * 1000,
+    "first_screen_ms": (rendered - constructed) * 1000,
+    "total_ms": (rendered - start) * 1000,
+    "from_cache": bool(data.get("success")),
+    "requests_loaded": "requests" in sys.modules,
+}}))
+'''
+
+
+def _prepare(workdir, cities):
+    """Primer arranque: crea el esquema, las ciudades y un pronóstico guardado"""
+    code = f'''
+import contextlib, io, sys, time
+sys.path.insert(0, {PROJECT_ROOT!r})
+with contextlib.redirect_stdout(io.StringIO()):
+    from forecast_model import Forecast
+    from weather_service import WeatherService
+    service = WeatherService(cache_ttl=10 ** 9)
+    for i in range({cities}):
+        service.add_location(f"Ciudad {{i}}", -33 + i * 0.5, -70 + i * 0.5)
+    service.set_last_selected_city("Ciudad 0")
+    data = service.get_default_data()
+    data["hourly"]["time"] = [time.strftime('%Y-%m-%dT%H:00', time.gmtime(time.time() + h * 3600)) for h in range(-1, 24)]
+    data["daily"]["time"] = [time.strftime('%Y-%m-%d', time.gmtime())]
+    data["success"] = True
+    service._store_blocks(service.locations["Ciudad 0"], service.BLOCKS, Forecast.from_dict(data))
+'''
+    subprocess.run([sys.executable, '-c', code], cwd=workdir, check=True)
+
+
+def measure(workdir, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', _CHILD.format(root=PROJECT_ROOT)],
+                                cwd=workdir, check=True, capture_output=True, text=True).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--cities', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _prepare(workdir, args.cities)
+        samples = measure(workdir, args.runs)
+
+    print(f"{'fase':<18}{'mediana (ms)':>14}{'mínimo (ms)':>14}")
+    for phase in ("import_ms", "construct_ms", "first_screen_ms", "total_ms"):
+        values = [sample[phase] for sample in samples]
+        print(f"{phase:<18}{statistics.median(values):>14.1f}{min(values):>14.1f}")
+    print(f"primera pantalla desde caché: {all(sample['from_cache'] for sample in samples)}")
+    print(f"requests importado al arrancar: {any(sample['requests_loaded'] for sample in samples)}")
+
+
+if __name__ == '__main__':
+    main()
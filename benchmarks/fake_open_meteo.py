@@ -0,0 +1,191 @@
+"""Servidor HTTP local que imita la API de pronóstico de Open-Meteo para benchmarks.
+
+Uso independiente:
+    python -m benchmarks.fake_open_meteo --port 8099 --latency 0.05 --error-rate 0.1
+"""
+import argparse
+import gzip
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_CODES = [0, 1, 2, 3, 45, 51, 61, 63, 80, 95]
+
+
+def _value(variable, rng):
+    """Valor plausible para una variable de Open-Meteo"""
+    if 'weather_code' in variable:
+        return rng.choice(_CODES)
+    if variable == 'is_day':
+        return rng.randint(0, 1)
+    if 'humidity' in variable or 'probability' in variable:
+        return rng.randint(0, 100)
+    if 'pressure' in variable:
+        return round(rng.uniform(990, 1030), 1)
+    if 'direction' in variable:
+        return rng.randint(0, 359)
+    if 'precipitation' in variable or variable == 'rain':
+        return round(max(0.0, rng.gauss(0, 2)), 1)
+    if 'uv' in variable:
+        return round(rng.uniform(0, 11), 2)
+    return round(rng.uniform(-5, 30), 1)
+
+
+def build_location(lat, lon, params, rng, forecast_days=None, past_days=0):
+    """Genera la respuesta de una ubicación con las variables pedidas"""
+    days = forecast_days or int(params.get('forecast_days', 1))
+    past_days = int(params.get('past_days', past_days))
+    # Horas alrededor de hoy (UTC), como la API con timezone=auto para una zona UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    start = datetime(now.year, now.month, now.day) - timedelta(days=past_days)
+    total_days = days + past_days
+    hours = [start + timedelta(hours=h) for h in range(24 * total_days)]
+    dates = [start + timedelta(days=d) for d in range(total_days)]
+    if params.get('timeformat') == 'unixtime':
+        def fmt(moment, pattern):
+            return int(moment.replace(tzinfo=timezone.utc).timestamp())
+    else:
+        def fmt(moment, pattern):
+            return moment.strftime(pattern)
+
+    location = {
+        "latitude": lat, "longitude": lon, "generationtime_ms": 0.1,
+        "utc_offset_seconds": 0, "timezone": "GMT", "timezone_abbreviation": "GMT", "elevation": 100.0,
+    }
+    if params.get('current'):
+        current = {"time": fmt(now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0), '%Y-%m-%dT%H:%M'),
+                   "interval": 900}
+        for variable in params['current'].split(','):
+            current[variable] = _value(variable, rng)
+        location["current"] = current
+    if params.get('hourly'):
+        hourly = {"time": [fmt(h, '%Y-%m-%dT%H:%M') for h in hours]}
+        for variable in params['hourly'].split(','):
+            hourly[variable] = [_value(variable, rng) for _ in hours]
+        location["hourly"] = hourly
+    if params.get('daily'):
+        daily = {"time": [fmt(d, '%Y-%m-%d') for d in dates]}
+        for variable in params['daily'].split(','):
+            if variable in ('sunrise', 'sunset'):
+                hour = 7 if variable == 'sunrise' else 19
+                daily[variable] = [fmt(d + timedelta(hours=hour), '%Y-%m-%dT%H:%M') for d in dates]
+            else:
+                daily[variable] = [_value(variable, rng) for _ in dates]
+        location["daily"] = daily
+    return location
+
+
+class FakeOpenMeteo:
+    """Servidor de prueba con latencia, tamaño de respuesta y tasa de error configurables"""
+
+    def __init__(self, latency=0.0, error_rate=0.0, forecast_days=None, error_status=503,
+                 host='127.0.0.1', port=0, seed=0, slow_rate=0.0, slow_latency=1.0):
+        # Todos los parámetros de fallo se pueden cambiar con el servidor en marcha
+        self.latency = latency
+        self.error_rate = error_rate
+        # Cola de latencia: una fracción slow_rate de las respuestas tarda slow_latency segundos
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.forecast_days = forecast_days
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def start(self):
+        """Arranca el servidor en un hilo y devuelve su URL base"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, como la API real
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests += 1
+                    fail = fake._rng.random() < fake.error_rate
+                    slow = fake._rng.random() < fake.slow_rate
+                    rng = random.Random(fake._rng.random())
+                delay = fake.slow_latency if slow else fake.latency
+                if delay:
+                    time.sleep(delay)
+                if fail:
+                    with fake._lock:
+                        fake.errors += 1
+                    self._send(fake.error_status, {"error": True, "reason": "Fallo simulado"})
+                    return
+
+                params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                latitudes = params.get('latitude', '0').split(',')
+                longitudes = params.get('longitude', '0').split(',')
+                body = [build_location(float(lat), float(lon), params, rng, fake.forecast_days)
+                        for lat, lon in zip(latitudes, longitudes)]
+                self._send(200, body if len(body) > 1 else body[0])
+
+            def _send(self, status, payload):
+                content = json.dumps(payload).encode('utf-8')
+                gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+                if gzipped:
+                    content = gzip.compress(content, compresslevel=5)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                if gzipped:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(content)))
+                try:
+                    self.end_headers()
+                    self.wfile.write(content)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente dejó de esperar (timeout simulado o petición duplicada descartada)
+                    self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--forecast-days', type=int, default=None)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-latency', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = FakeOpenMeteo(latency=args.latency, error_rate=args.error_rate,
+                           forecast_days=args.forecast_days, port=args.port,
+                           slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    print(f"Open-Meteo simulado en {server.start()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
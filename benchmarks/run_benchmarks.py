@@ -0,0 +1,292 @@
+"""Benchmarks de extremo a extremo contra un Open-Meteo simulado; imprime resultados en JSON.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.run_benchmarks [--quick] [--latency 0.05] [--output resultados.json]
+
+Comparar dos ejecuciones:
+    python -m benchmarks.run_benchmarks --compare antes.json despues.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.fake_open_meteo import FakeOpenMeteo
+
+
+def summarize(samples):
+    """Estadísticas de latencia en milisegundos"""
+    ordered = sorted(samples)
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silencia los print() de los servicios durante las mediciones"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def make_service(server, db_name, cities, **options):
+    from database_manager import DatabaseManager
+    from weather_service import WeatherService
+
+    with quiet():
+        service = WeatherService(base_url=server.base_url, **options)
+        service.db_manager = DatabaseManager(db_name)
+        service.cache.db_manager = service.db_manager
+        service.history.db_manager = service.db_manager
+        service.locations = {}
+        for i in range(cities):
+            # Separadas más que la rejilla del modelo para que no compartan caché
+            service.add_location(f"Ciudad {i}", -40 + (i % 40) * 0.5, -75 + (i // 40) * 0.5)
+    return service
+
+
+def bench_weather_latency(server, workdir, cities):
+    """Latencia de get_weather_data en frío (descarga) y en caliente (caché)"""
+    service = make_service(server, os.path.join(workdir, 'latency.db'), cities)
+    names = service.get_all_locations()
+    with quiet():
+        cold = [timed(lambda name=name: service.get_weather_data(name)) for name in names]
+        warm = [timed(lambda name=name: service.get_weather_data(name)) for name in names for _ in range(5)]
+    return {"cold": summarize(cold), "warm": summarize(warm)}
+
+
+def bench_refresh_throughput(server, workdir, cities):
+    """Ciudades por segundo al refrescar todas: secuencial, en lote y en paralelo"""
+    from refresh_engine import RefreshEngine
+
+    service = make_service(server, os.path.join(workdir, 'refresh.db'), cities)
+    names = service.get_all_locations()
+    engine = RefreshEngine(service, max_concurrency=8)
+    results = {}
+    with quiet():
+        for label, run in (
+            ("sequential", lambda: [service.refresh_weather_data(name) for name in names]),
+            ("bulk", lambda: service.get_weather_data_bulk(names)),
+            ("concurrent", lambda: engine.refresh_many(names)),
+        ):
+            requests_before = server.requests
+            elapsed = timed(run)
+            results[label] = {
+                "seconds": elapsed,
+                "cities_per_second": len(names) / elapsed,
+                "upstream_requests": server.requests - requests_before,
+            }
+    engine.shutdown()
+    return results
+
+
+def bench_resilience(workdir, cities, requests):
+    """Caídas y cola de latencia del servidor: circuit breaker y peticiones duplicadas (hedging)"""
+    from circuit_breaker import CircuitBreaker
+    from http_transport import HttpTransport
+
+    server = FakeOpenMeteo(latency=0.01, seed=1)
+    server.start()
+    results = {}
+    try:
+        def resilient_service(name, **options):
+            transport = HttpTransport(read_timeout=0.5, max_retries=0)
+            breaker = CircuitBreaker(failure_threshold=3, latency_slo=0.25, reset_timeout=0.5)
+            return make_service(server, os.path.join(workdir, name), cities,
+                                transport=transport, breaker=breaker, **options)
+
+        service = resilient_service('breaker.db')
+        names = service.get_all_locations()
+        with quiet():
+            for name in names:
+                service.get_weather_data(name)
+
+            for outage, settings in (("errors", {"error_rate": 1.0}), ("timeouts", {"latency": 1.0})):
+                server.error_rate, server.latency = settings.get("error_rate", 0.0), settings.get("latency", 0.01)
+                requests_before = server.requests
+                samples = [timed(lambda name=name: service.refresh_weather_data(name))
+                           for _ in range(3) for name in names]
+                outage_result = summarize(samples)
+                outage_result["upstream_requests"] = server.requests - requests_before
+                outage_result["calls"] = len(samples)
+
+                # Recuperación: el primer intento tras reset_timeout es la prueba que cierra el circuito
+                server.error_rate, server.latency = 0.0, 0.01
+                start = time.perf_counter()
+                while service.breaker.state != "closed":
+                    service.refresh_weather_data(names[0])
+                    time.sleep(0.05)
+                outage_result["recovery_seconds"] = time.perf_counter() - start
+                results[outage] = outage_result
+
+        server.slow_rate, server.slow_latency = 0.05, 0.2
+        for label, hedge in (("tail_plain", False), ("tail_hedged", True)):
+            service = resilient_service(f'{label}.db', hedge=hedge)
+            names = service.get_all_locations()
+            with quiet():
+                requests_before = server.requests
+                samples = [timed(lambda i=i: service.refresh_weather_data(names[i % len(names)]))
+                           for i in range(requests)]
+            results[label] = summarize(samples)
+            results[label]["upstream_requests"] = server.requests - requests_before
+    finally:
+        server.stop()
+    return results
+
+
+def bench_database(workdir, sizes, operations):
+    """Operaciones por segundo de DatabaseManager con distintos tamaños de tabla"""
+    from database_manager import DatabaseManager
+
+    rng = random.Random(0)
+    results = {}
+    for size in sizes:
+        with quiet():
+            db = DatabaseManager(os.path.join(workdir, f'db_{size}.db'))
+        rows = [(f"Ciudad {i}", rng.uniform(-60, 70), rng.uniform(-180, 180)) for i in range(size)]
+        with quiet():
+            import_seconds = timed(lambda: db.import_cities(rows))
+        middle = rows[size // 2][0]
+
+        def rate(fn, count):
+            with quiet():
+                elapsed = timed(lambda: [fn(i) for i in range(count)])
+            return count / elapsed
+
+        results[str(size)] = {
+            "add_city_per_s": rate(lambda i: db.add_city(f"Nueva {i}", 1.0, 1.0), operations),
+            "city_exists_per_s": rate(lambda i: db.city_exists(rows[i % size][0]), operations),
+            "set_last_selected_city_per_s": rate(lambda i: db.set_last_selected_city(rows[i % size][0]), operations),
+            "find_nearest_cities_per_s": rate(lambda i: db.find_nearest_cities(rows[i % size][1], rows[i % size][2], 3),
+                                              operations),
+            "get_all_cities_per_s": rate(lambda i: db.get_all_cities(), max(1, min(operations, 100_000 // size))),
+            "import_rows_per_s": size / import_seconds,
+            "get_cities_page_per_s": rate(lambda i: db.get_cities_page(middle, 100), operations),
+        }
+        db.close()
+    return results
+
+
+def bench_snapshots(updates):
+    """Costo de escribir y leer el snapshot del widget (JSON y binario)"""
+    from shared_data import SharedWeatherData, SnapshotReader
+
+    with quiet():
+        shared = SharedWeatherData()
+        shared.debounce_interval = 0
+        shared.set_binary_snapshot(True)
+        writes = [timed(lambda i=i: shared.update_weather_data("Polcura", i % 40, "Nublado", 68, 7.7, "☁️"))
+                  for i in range(updates)]
+    json_reader = SnapshotReader(shared.data_file)
+    binary_reader = SnapshotReader(shared.binary_file)
+    json_reads = []
+    binary_reads = []
+    unchanged_reads = []
+    for _ in range(updates):
+        json_reader._signature = binary_reader._signature = None  # forzar lectura real
+        json_reads.append(timed(json_reader.read))
+        binary_reads.append(timed(binary_reader.read))
+        unchanged_reads.append(timed(json_reader.read))
+    return {
+        "write": summarize(writes),
+        "read_json": summarize(json_reads),
+        "read_binary": summarize(binary_reads),
+        "read_unchanged": summarize(unchanged_reads),
+    }
+
+
+def compare(before_path, after_path):
+    """Muestra la variación de cada métrica numérica entre dos ejecuciones"""
+    with open(before_path, encoding='utf-8') as f:
+        before = json.load(f)["results"]
+    with open(after_path, encoding='utf-8') as f:
+        after = json.load(f)["results"]
+
+    def walk(old, new, path):
+        for key, value in new.items():
+            if isinstance(value, dict) and isinstance(old.get(key), dict):
+                walk(old[key], value, f"{path}{key}.")
+            elif isinstance(value, (int, float)) and isinstance(old.get(key), (int, float)) and old[key]:
+                change = (value - old[key]) / old[key] * 100
+                print(f"{path}{key:<40} {old[key]:>14.3f} {value:>14.3f} {change:>+8.1f}%")
+
+    walk(before, after, "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="tamaños reducidos para una pasada rápida")
+    parser.add_argument('--latency', type=float, default=0.02, help="latencia simulada del servidor (s)")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--forecast-days', type=int, default=1)
+    parser.add_argument('--cities', type=int, default=None)
+    parser.add_argument('--output', help="archivo donde guardar el JSON (por defecto, stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DESPUES'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    cities = args.cities or (10 if args.quick else 40)
+    db_sizes = [10, 1_000] if args.quick else [10, 1_000, 100_000]
+    operations = 200 if args.quick else 2_000
+
+    server = FakeOpenMeteo(latency=args.latency, error_rate=args.error_rate, forecast_days=args.forecast_days)
+    server.start()
+    previous = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # Todo lo que los servicios escriben con rutas relativas queda en el directorio temporal
+            os.chdir(workdir)
+            try:
+                results = {
+                    "weather_latency": bench_weather_latency(server, workdir, cities),
+                    "refresh_throughput": bench_refresh_throughput(server, workdir, cities),
+                    "database": bench_database(workdir, db_sizes, operations),
+                    "snapshots": bench_snapshots(50 if args.quick else 500),
+                    "resilience": bench_resilience(workdir, min(cities, 10), 100 if args.quick else 400),
+                }
+            finally:
+                os.chdir(previous)
+    finally:
+        server.stop()
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {"cities": cities, "latency": args.latency, "error_rate": args.error_rate,
+                   "forecast_days": args.forecast_days, "db_sizes": db_sizes, "operations": operations},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
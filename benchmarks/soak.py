@@ -0,0 +1,246 @@
+"""Prueba de resistencia: horas de actualizaciones aceleradas contra un Open-Meteo simulado.
+
+Ejercita a la vez las descargas de WeatherService, las actualizaciones de SharedWeatherData,
+el bucle de WidgetService y un bucle de refresco equivalente al del widget de Android
+(SnapshotWatcher + lectura de los datos). Mide RSS y objetos vivos periódicamente y termina
+con código 1 si siguen creciendo tras el calentamiento.
+
+Uso (desde la raíz del proyecto):
+    python -m benchmarks.soak [--duration 3600] [--rate 50] [--tracemalloc] [--output soak.json]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fake_open_meteo import FakeOpenMeteo
+from profiling import MemoryTracker, object_counts, rss_bytes, thread_cpu_times
+
+
+def growth(samples, key):
+    """Crecimiento entre la mediana del primer y del último tercio de las muestras"""
+    values = [sample[key] for sample in samples]
+    third = max(1, len(values) // 3)
+    return statistics.median(values[-third:]) - statistics.median(values[:third])
+
+
+class Soak:
+    """Conjunto de hilos que generan carga hasta que se llama a stop()"""
+
+    def __init__(self, server, cities, rate, fetch_every):
+        from shared_data import SharedWeatherData
+        from weather_service import WeatherService
+        from widget_service import WidgetService
+
+        self.rate = rate
+        self.fetch_every = fetch_every
+        self.stop_event = threading.Event()
+        self.updates = 0
+        self.widget_refreshes = 0
+        self.errors = 0
+        self.last_primary = None  # (ciudad, temperatura) de la última actualización principal
+        self.service = WeatherService(base_url=server.base_url, cache_ttl=1)
+        self.names = []
+        for i in range(cities):
+            name = f"Ciudad {i}"
+            self.service.add_location(name, -40 + (i % 40) * 0.5, -75 + (i // 40) * 0.5)
+            self.names.append(name)
+        self.shared = SharedWeatherData()
+        self.shared.debounce_interval = 0.05  # Escrituras a disco mucho más frecuentes que en la app
+        self.widget_service = WidgetService()
+        self.threads = [
+            threading.Thread(target=self._update_loop, name="soak-updates", daemon=True),
+            threading.Thread(target=self._widget_loop, name="soak-widget", daemon=True),
+        ]
+
+    def start(self):
+        self.widget_service.start()
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=10)
+        self.widget_service.stop()
+        self.shared.flush()
+
+    def _update_loop(self):
+        """Descargas y actualizaciones de SharedWeatherData al ritmo indicado"""
+        rng = random.Random(0)
+        interval = 1.0 / self.rate
+        index = 0
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            name = self.names[index % len(self.names)]
+            try:
+                if index % self.fetch_every == 0:
+                    data = self.service.refresh_weather_data(name)
+                else:
+                    data = self.service.get_weather_data(name)
+                current = data.get('current', {})
+                code = current.get('weather_code')
+                temperature = current.get('temperature_2m', round(rng.uniform(-5, 30), 1))
+                primary = index % len(self.names) == 0
+                self.shared.update_weather_data(
+                    name,
+                    temperature,
+                    self.service.get_weather_description(code),
+                    current.get('relative_humidity_2m', 0),
+                    current.get('wind_speed_10m', 0),
+                    self.service.get_weather_icon(code, current.get('is_day', 1)),
+                    primary=primary,
+                )
+                if primary:
+                    self.last_primary = (name, temperature)
+                self.updates += 1
+            except Exception:
+                self.errors += 1
+            index += 1
+            self.stop_event.wait(max(0.0, interval - (time.monotonic() - started)))
+
+    def lost_update(self):
+        """Describe la pérdida si la última actualización principal no quedó en memoria y en disco"""
+        if self.last_primary is None:
+            return None
+        memory = self.shared.get_weather_data()
+        with open(self.shared.data_file, 'r', encoding='utf-8') as f:
+            disk = json.load(f)
+        for label, data in (("memoria", memory), ("disco", disk)):
+            if (data.get('city'), data.get('temperature')) != self.last_primary:
+                return (f"Actualización perdida en {label}: {data.get('city')} {data.get('temperature')}° "
+                        f"en lugar de {self.last_primary[0]} {self.last_primary[1]}°")
+        return None
+
+    def _widget_loop(self):
+        """Equivalente a WeatherWidgetService: recarga el archivo compartido y relee los datos"""
+        from snapshot_watcher import SnapshotWatcher
+
+        changed = threading.Event()
+        watcher = SnapshotWatcher(self.shared.data_file, lambda path: changed.set(), poll_interval=0.2)
+        self.shared.subscribe(lambda data: changed.set())
+        watcher.start()
+        last_pushed = None
+        try:
+            while not self.stop_event.is_set():
+                if not changed.wait(0.5):
+                    continue
+                changed.clear()
+                self.shared.reload_from_disk()
+                data = self.shared.get_weather_data()
+                fields = (data.get('city'), f"{data.get('temperature')}°", data.get('description'),
+                          f"Actualizado: {str(data.get('last_update', ''))[11:16]}")
+                if fields != last_pushed:
+                    last_pushed = fields
+                    self.widget_refreshes += 1
+        finally:
+            watcher.stop()
+
+
+def run(args):
+    server = FakeOpenMeteo(latency=args.latency, error_rate=args.error_rate, seed=1)
+    server.start()
+    tracker = MemoryTracker(top=10) if args.tracemalloc else None
+    samples = []
+    previous = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # La base de datos y weather_widget_data quedan en el directorio temporal
+            os.chdir(workdir)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()) as captured:
+                    soak = Soak(server, args.cities, args.rate, args.fetch_every)
+                    soak.start()
+                    started = time.monotonic()
+                    measuring = False
+                    while time.monotonic() - started < args.duration:
+                        time.sleep(args.sample_interval)
+                        elapsed = time.monotonic() - started
+                        if not measuring and elapsed >= args.warmup:
+                            measuring = True
+                            if tracker is not None:
+                                tracker.start()
+                        if not measuring:
+                            continue
+                        gc.collect()
+                        samples.append({"elapsed": elapsed, "rss_bytes": rss_bytes(),
+                                        "objects": len(gc.get_objects()), "updates": soak.updates})
+                        # El simulador de widget imprime en cada cambio: no acumularlo en memoria
+                        captured.seek(0)
+                        captured.truncate()
+                    soak.stop()
+                    lost = soak.lost_update()
+            finally:
+                os.chdir(previous)
+    finally:
+        server.stop()
+
+    if len(samples) < 3:
+        print("❌ Muy pocas muestras: aumentar --duration o reducir --sample-interval/--warmup", file=sys.stderr)
+        return 2
+
+    rss_growth = growth(samples, "rss_bytes")
+    object_growth = growth(samples, "objects")
+    object_base = statistics.median(sample["objects"] for sample in samples[:max(1, len(samples) // 3)])
+    failures = [lost] if lost else []
+    if rss_growth > args.max_rss_growth_mb * 1048576:
+        failures.append(f"RSS creció {rss_growth / 1048576:.1f} MB (límite {args.max_rss_growth_mb} MB)")
+    if object_growth > object_base * args.max_object_growth:
+        failures.append(f"Objetos vivos crecieron {object_growth:.0f} "
+                        f"(límite {args.max_object_growth:.0%} de {object_base:.0f})")
+
+    report = {
+        "config": vars(args),
+        "updates": soak.updates,
+        "widget_refreshes": soak.widget_refreshes,
+        "errors": soak.errors,
+        "upstream_requests": server.requests,
+        "rss_growth_bytes": rss_growth,
+        "object_growth": object_growth,
+        "final_objects": object_counts(),
+        "thread_cpu_seconds": thread_cpu_times(),
+        "memory_growth": tracker.diff(since_start=True) if tracker is not None else [],
+        "samples": samples,
+        "failures": failures,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    if not failures:
+        print(f"✅ Sin crecimiento sostenido tras {soak.updates} actualizaciones", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=3600, help="segundos de prueba")
+    parser.add_argument('--warmup', type=float, default=60, help="segundos antes de empezar a medir")
+    parser.add_argument('--sample-interval', type=float, default=10)
+    parser.add_argument('--rate', type=float, default=50, help="actualizaciones por segundo")
+    parser.add_argument('--cities', type=int, default=20)
+    parser.add_argument('--fetch-every', type=int, default=10, help="una descarga forzada cada N actualizaciones")
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--max-rss-growth-mb', type=float, default=16)
+    parser.add_argument('--max-object-growth', type=float, default=0.05, help="fracción de los objetos iniciales")
+    parser.add_argument('--tracemalloc', action='store_true', help="incluir las líneas que más memoria ganaron")
+    parser.add_argument('--output', help="archivo donde guardar el JSON (por defecto, stdout)")
+    sys.exit(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
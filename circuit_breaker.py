@@ -0,0 +1,114 @@
+import time
+from collections import deque
+from threading import Lock
+from typing import Optional
+
+from instrumentation import count, info, warning
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """La petición no se hizo porque el circuito hacia el servidor está abierto"""
+
+
+class CircuitBreaker:
+    """Corta las peticiones a un servidor que falla o responde por encima del SLO de latencia.
+
+    - Cerrado: las peticiones pasan; failure_threshold fallos (o respuestas lentas) seguidos lo abren.
+    - Abierto: allow() devuelve False de inmediato durante reset_timeout segundos.
+    - Semiabierto: deja pasar hasta half_open_probes peticiones de prueba; si una tiene éxito
+      el circuito se cierra, y si falla se vuelve a abrir otros reset_timeout segundos.
+    """
+
+    def __init__(self, failure_threshold: int = 3, latency_slo: Optional[float] = 3.0,
+                 reset_timeout: float = 30.0, half_open_probes: int = 1, window: int = 100,
+                 clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.latency_slo = latency_slo
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0  # Fallos consecutivos
+        self._opened_at = 0.0
+        self._probes = 0  # Pruebas en curso en estado semiabierto
+        self._latencies = deque(maxlen=window)  # Latencias recientes de las peticiones exitosas
+        self._lock = Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def retry_in(self) -> float:
+        """Segundos que faltan para la próxima petición de prueba (0 si el circuito no está abierto)"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        """True si la petición puede hacerse; en semiabierto solo pasan las pruebas permitidas"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    count("breaker.rejected")
+                    return False
+                self._state = HALF_OPEN
+                self._probes = 0
+            if self._probes >= self.half_open_probes:
+                count("breaker.rejected")
+                return False
+            self._probes += 1
+            count("breaker.probes")
+            return True
+
+    def record_success(self, latency: float):
+        """Registra una respuesta correcta; si supera el SLO cuenta como fallo para el circuito"""
+        with self._lock:
+            self._latencies.append(latency)
+        if self.latency_slo is not None and latency > self.latency_slo:
+            count("breaker.slow")
+            self.record_failure()
+            return
+
+        with self._lock:
+            self._failures = 0
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                self._state = CLOSED
+                info("✅ Servidor recuperado, circuito cerrado")
+
+    def record_failure(self):
+        """Registra un fallo; abre el circuito al llegar al umbral o si falla una prueba"""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+            elif self._state != CLOSED or self._failures < self.failure_threshold:
+                return
+            self._state = OPEN
+            self._opened_at = self._clock()
+            count("breaker.opened")
+        warning(f"⚠️ Circuito abierto tras {self._failures} fallos; "
+                f"se usarán los datos guardados durante {self.reset_timeout:.0f}s")
+
+    def latency_percentile(self, fraction: float = 0.95, min_samples: int = 20) -> Optional[float]:
+        """Percentil de las latencias recientes, o None si aún no hay muestras suficientes"""
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def reset(self):
+        """Cierra el circuito y olvida los fallos (las latencias se conservan)"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
@@ -1,229 +1,665 @@
 import sqlite3
+import csv
 import os
 import json
-from typing import List, Dict, Optional
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from instrumentation import count, debug, error, info, timed, warning
+from spatial_index import (encode_geohash, geohash_neighborhood, cell_size_km,
+                           prefix_upper_bound, haversine_km)
+
+
+def _open_text(source, mode):
+    """Abre una ruta como texto UTF-8; si ya es un archivo, lo usa sin cerrarlo"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, mode, encoding='utf-8', newline='')
+    return nullcontext(source)
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _valid_city_rows(cities: Iterable, counts: Dict[str, int]) -> Iterator[Tuple]:
+    """Normaliza filas de importación a (name, lat, lon, geohash), contando las inválidas"""
+    for city in cities:
+        try:
+            if isinstance(city, dict):
+                name = city.get("name")
+                lat = float(city["lat"] if "lat" in city else city["latitude"])
+                lon = float(city["lon"] if "lon" in city else city["longitude"])
+            else:
+                name, lat, lon = city[0], float(city[1]), float(city[2])
+            name = str(name).strip() if name is not None else ""
+            if not name or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+                raise ValueError("fuera de rango")
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            counts["invalid"] += 1
+            debug(f"Ciudad inválida descartada ({e}): {city}")
+            continue
+        yield name, lat, lon, encode_geohash(lat, lon)
+
+
+def _iter_json_objects(f, chunk_size: int = 64 * 1024) -> Iterator:
+    """Elementos de un arreglo JSON o de JSON Lines, decodificados uno a uno mientras se lee"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+    in_array = False
+    while True:
+        # Saltar espacios, la apertura del arreglo y las comas entre elementos
+        while pos < len(buffer) and (buffer[pos] in ' \t\r\n,' or (buffer[pos] == '[' and not in_array)):
+            in_array = in_array or buffer[pos] == '['
+            pos += 1
+        if in_array and pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+            # Un elemento al final del búfer puede seguir en el próximo fragmento
+            if end == len(buffer) and not eof:
+                raise ValueError("elemento incompleto")
+        except ValueError:
+            if eof:
+                if buffer[pos:].strip():
+                    raise
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        in_array = True
+        pos = end
+        yield value
+
 
 class DatabaseManager:
-    def __init__(self, db_name="weather_app.db"):
+    # Versión del esquema guardada en PRAGMA user_version; incrementarla al cambiar tablas o índices
+    SCHEMA_VERSION = 1
+    
+    def __init__(self, db_name="weather_app.db", cache_size_kb=8192):
         self.db_name = db_name
+        self.cache_size_kb = cache_size_kb
+        self._local = threading.local()
+        self._connections = {}  # hilo -> conexión
+        self._connections_lock = threading.Lock()
         self.init_database()
     
+    def _get_connection(self) -> sqlite3.Connection:
+        """Devuelve la conexión persistente del hilo actual, creándola si no existe"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: las transacciones se abren explícitamente con transaction()
+            # check_same_thread=False solo para poder cerrarla desde close(); cada hilo usa la suya
+            conn = sqlite3.connect(self.db_name, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            self._local.conn = conn
+            self._local.depth = 0
+            with self._connections_lock:
+                self._close_dead_thread_connections()
+                self._connections[threading.current_thread()] = conn
+        return conn
+    
+    def _close_dead_thread_connections(self):
+        """Cierra las conexiones de hilos que ya terminaron"""
+        for thread in [t for t in self._connections if not t.is_alive()]:
+            try:
+                self._connections.pop(thread).close()
+            except Exception as e:
+                error(f"Error al cerrar conexión: {e}")
+    
+    @contextmanager
+    def transaction(self, immediate: bool = False):
+        """Agrupa varias operaciones en una sola transacción (admite anidamiento).
+        
+        immediate=True toma el bloqueo de escritura al empezar: necesario cuando se lee y
+        luego se escribe, porque si otro proceso escribe entre medias SQLite no espera y
+        devuelve "database is locked".
+        """
+        conn = self._get_connection()
+        if self._local.depth > 0:
+            # Transacción anidada: se confirma junto con la exterior
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        self._local.depth = 1
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            count("db.rollbacks")
+            raise
+        finally:
+            self._local.depth = 0
+    
+    def close(self):
+        """Cierra todas las conexiones abiertas por el administrador"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, {}
+        for conn in connections.values():
+            try:
+                conn.close()
+            except Exception as e:
+                error(f"Error al cerrar conexión: {e}")
+        self._local = threading.local()
+    
+    @timed("db.init_database")
     def init_database(self):
         """Inicializa la base de datos y crea las tablas si no existen"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            # Crear tabla de ciudades
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS cities (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    latitude REAL NOT NULL,
-                    longitude REAL NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Crear tabla de configuración para guardar la última ciudad
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS app_config (
-                    id INTEGER PRIMARY KEY CHECK (id = 1),
-                    last_selected_city TEXT,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Insertar configuración por defecto si no existe
-            cursor.execute('''
-                INSERT OR IGNORE INTO app_config (id, last_selected_city) 
-                VALUES (1, NULL)
-            ''')
+            # Si el esquema ya está al día no hace falta ejecutar el DDL en cada arranque
+            conn = self._get_connection()
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= self.SCHEMA_VERSION:
+                return
             
-            conn.commit()
-            conn.close()
-            print("Base de datos inicializada correctamente")
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                # Crear tabla de ciudades
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS cities (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        name TEXT UNIQUE NOT NULL,
+                        latitude REAL NOT NULL,
+                        longitude REAL NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        geohash TEXT
+                    )
+                ''')
+                self._migrate_geohash(cursor)
+                
+                # Crear tabla de configuración para guardar la última ciudad
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS app_config (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        last_selected_city TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Crear tabla de caché de pronósticos
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS forecast_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        payload TEXT NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        accessed_at REAL NOT NULL
+                    )
+                ''')
+                
+                # Histórico: 24 valores horarios empaquetados por ubicación, variable y día
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS observation_days (
+                        location TEXT NOT NULL,
+                        variable TEXT NOT NULL,
+                        day TEXT NOT NULL,
+                        hour_values BLOB NOT NULL,
+                        PRIMARY KEY (location, variable, day)
+                    ) WITHOUT ROWID
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_observation_days_day ON observation_days (day)')
+                
+                # Histórico reducido a agregados diarios
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS observation_daily (
+                        location TEXT NOT NULL,
+                        variable TEXT NOT NULL,
+                        day TEXT NOT NULL,
+                        min_value REAL,
+                        max_value REAL,
+                        mean_value REAL,
+                        samples INTEGER NOT NULL,
+                        PRIMARY KEY (location, variable, day)
+                    ) WITHOUT ROWID
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_observation_daily_day ON observation_daily (day)')
+                
+                # Insertar configuración por defecto si no existe
+                cursor.execute('''
+                    INSERT OR IGNORE INTO app_config (id, last_selected_city)
+                    VALUES (1, NULL)
+                ''')
+                cursor.execute(f'PRAGMA user_version = {int(self.SCHEMA_VERSION)}')
             
+            info("Base de datos inicializada correctamente")
+        
         except Exception as e:
-            print(f"Error al inicializar la base de datos: {e}")
+            error(f"Error al inicializar la base de datos: {e}")
     
+    def _migrate_geohash(self, cursor):
+        """Agrega la columna geohash a bases de datos antiguas y la completa"""
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(cities)')]
+        if 'geohash' not in columns:
+            cursor.execute('ALTER TABLE cities ADD COLUMN geohash TEXT')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_cities_geohash ON cities (geohash)')
+        
+        missing = cursor.execute('SELECT id, latitude, longitude FROM cities WHERE geohash IS NULL').fetchall()
+        cursor.executemany('UPDATE cities SET geohash = ? WHERE id = ?',
+                           [(encode_geohash(lat, lon), city_id) for city_id, lat, lon in missing])
+    
+    @timed("db.get_all_cities")
     def get_all_cities(self) -> List[Dict]:
-        """Obtiene todas las ciudades de la base de datos"""
+        """Obtiene todas las ciudades de la base de datos (para tablas grandes, usar iter_cities)"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT name, latitude, longitude FROM cities 
-                ORDER BY name
-            ''')
-            
-            cities = []
-            for row in cursor.fetchall():
-                cities.append({
-                    "name": row[0],
-                    "lat": row[1],
-                    "lon": row[2]
-                })
-            
-            conn.close()
-            return cities
-            
+            cursor = self._get_connection().cursor()
+            cursor.execute('SELECT name, latitude, longitude FROM cities ORDER BY name')
+            return [{"name": row[0], "lat": row[1], "lon": row[2]} for row in cursor.fetchall()]
+        
         except Exception as e:
-            print(f"Error al obtener ciudades: {e}")
+            error(f"Error al obtener ciudades: {e}")
             return []
     
+    def iter_cities(self, batch_size: int = 500) -> Iterator[Dict]:
+        """Recorre las ciudades por nombre, de batch_size en batch_size.
+        
+        Cada lote es una consulta corta por clave (WHERE name > último), así que no queda
+        una lectura abierta entre lotes y la memoria no depende del tamaño de la tabla.
+        """
+        after = None
+        while True:
+            cities, after = self.get_cities_page(after, batch_size)
+            yield from cities
+            if after is None:
+                return
+    
+    @timed("db.get_cities_page")
+    def get_cities_page(self, after: Optional[str] = None, limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+        """Página de ciudades ordenadas por nombre a partir del cursor after.
+        
+        Devuelve (ciudades, cursor de la página siguiente o None si no hay más). El cursor
+        es el último nombre devuelto: la consulta usa el índice de name y su costo no
+        crece con el número de página, a diferencia de OFFSET.
+        """
+        cursor = self._get_connection().cursor()
+        if after is None:
+            cursor.execute('SELECT name, latitude, longitude FROM cities ORDER BY name LIMIT ?', (limit,))
+        else:
+            cursor.execute('''
+                SELECT name, latitude, longitude FROM cities
+                WHERE name > ? ORDER BY name LIMIT ?
+            ''', (after, limit))
+        cities = [{"name": row[0], "lat": row[1], "lon": row[2]} for row in cursor.fetchall()]
+        next_cursor = cities[-1]["name"] if len(cities) == limit else None
+        return cities, next_cursor
+    
+    @timed("db.get_city")
+    def get_city(self, name: str) -> Optional[Dict]:
+        """Obtiene una ciudad por nombre, o None si no existe"""
+        row = self._get_connection().execute(
+            'SELECT name, latitude, longitude FROM cities WHERE name = ?', (name,)).fetchone()
+        return {"name": row[0], "lat": row[1], "lon": row[2]} if row else None
+    
+    def count_cities(self) -> int:
+        """Número de ciudades guardadas"""
+        return self._get_connection().execute('SELECT COUNT(*) FROM cities').fetchone()[0]
+    
+    @timed("db.import_cities")
+    def import_cities(self, cities: Iterable, on_conflict: str = "skip", batch_size: int = 1000) -> Dict[str, int]:
+        """Importa ciudades en una sola transacción con executemany.
+        
+        cities es un iterable de diccionarios (name, lat/latitude, lon/longitude) o de
+        tuplas (name, lat, lon); se consume por lotes, sin cargarlo entero. Si un nombre ya
+        existe, on_conflict decide: "skip" lo deja como está, "update" cambia sus
+        coordenadas y "abort" cancela toda la importación (lanza sqlite3.IntegrityError).
+        Un nombre repetido dentro de la importación es una sola ciudad: con "update" gana
+        la última fila y cuenta una vez, con "skip" las repeticiones cuentan como omitidas.
+        Las filas con coordenadas inválidas se descartan. Devuelve los contadores
+        {"inserted", "updated", "skipped", "invalid"}.
+        """
+        statements = {
+            "skip": 'INSERT OR IGNORE INTO cities (name, latitude, longitude, geohash) VALUES (?, ?, ?, ?)',
+            "update": '''
+                INSERT INTO cities (name, latitude, longitude, geohash) VALUES (?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    latitude = excluded.latitude, longitude = excluded.longitude, geohash = excluded.geohash
+            ''',
+            "abort": 'INSERT INTO cities (name, latitude, longitude, geohash) VALUES (?, ?, ?, ?)',
+        }
+        if on_conflict not in statements:
+            raise ValueError(f"on_conflict debe ser uno de {sorted(statements)}")
+        
+        counts = {"inserted": 0, "updated": 0, "skipped": 0, "invalid": 0}
+        names = set()  # Solo los nombres: las filas se siguen leyendo por lotes
+        with self.transaction(immediate=True) as conn:
+            before = conn.execute('SELECT COUNT(*) FROM cities').fetchone()[0]
+            rows = 0
+            for batch in _batches(_valid_city_rows(cities, counts), batch_size):
+                conn.executemany(statements[on_conflict], batch)
+                rows += len(batch)
+                names.update(row[0] for row in batch)
+            counts["inserted"] = conn.execute('SELECT COUNT(*) FROM cities').fetchone()[0] - before
+        
+        if on_conflict == "update":
+            counts["updated"] = len(names) - counts["inserted"]  # Ciudades que ya existían
+        else:
+            counts["skipped"] = rows - counts["inserted"]
+        info(f"Importación de ciudades: {counts['inserted']} nuevas, {counts['updated']} actualizadas, "
+             f"{counts['skipped']} repetidas, {counts['invalid']} inválidas")
+        return counts
+    
+    def import_cities_csv(self, source, on_conflict: str = "skip") -> Dict[str, int]:
+        """Importa un CSV con cabecera name, lat (o latitude) y lon (o longitude); source es una ruta o un archivo"""
+        with _open_text(source, 'r') as f:
+            return self.import_cities(csv.DictReader(f), on_conflict)
+    
+    def import_cities_json(self, source, on_conflict: str = "skip") -> Dict[str, int]:
+        """Importa un arreglo JSON de objetos o JSON Lines (un objeto por línea), leyendo por fragmentos"""
+        with _open_text(source, 'r') as f:
+            return self.import_cities(_iter_json_objects(f), on_conflict)
+    
+    def export_cities_csv(self, target) -> int:
+        """Escribe todas las ciudades como CSV (name, lat, lon) sin cargarlas en memoria; devuelve cuántas"""
+        exported = 0
+        with _open_text(target, 'w') as f:
+            writer = csv.writer(f)
+            writer.writerow(("name", "lat", "lon"))
+            for city in self.iter_cities():
+                writer.writerow((city["name"], city["lat"], city["lon"]))
+                exported += 1
+        return exported
+    
+    def export_cities_json(self, target) -> int:
+        """Escribe todas las ciudades como arreglo JSON, una por línea; devuelve cuántas"""
+        exported = 0
+        with _open_text(target, 'w') as f:
+            f.write('[')
+            for city in self.iter_cities():
+                f.write(',\n' if exported else '\n')
+                f.write(json.dumps(city, ensure_ascii=False))
+                exported += 1
+            f.write('\n]\n')
+        return exported
+    
+    @timed("db.add_city")
     def add_city(self, name: str, latitude: float, longitude: float) -> bool:
         """Agrega una nueva ciudad a la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
+            with self.transaction() as conn:
+                conn.execute('''
+                    INSERT INTO cities (name, latitude, longitude, geohash)
+                    VALUES (?, ?, ?, ?)
+                ''', (name, latitude, longitude, encode_geohash(latitude, longitude)))
             
-            cursor.execute('''
-                INSERT INTO cities (name, latitude, longitude) 
-                VALUES (?, ?, ?)
-            ''', (name, latitude, longitude))
-            
-            conn.commit()
-            conn.close()
-            print(f"Ciudad {name} agregada a la base de datos")
+            info(f"Ciudad {name} agregada a la base de datos")
             return True
-            
+        
         except sqlite3.IntegrityError:
-            print(f"La ciudad {name} ya existe en la base de datos")
+            warning(f"La ciudad {name} ya existe en la base de datos")
             return False
         except Exception as e:
-            print(f"Error al agregar ciudad: {e}")
+            error(f"Error al agregar ciudad: {e}")
             return False
     
+    @timed("db.delete_city")
     def delete_city(self, name: str) -> bool:
         """Elimina una ciudad de la base de datos"""
         try:
-            print(f"Eliminando ciudad de BD: {name}")
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            # Primero verificar si es la última ciudad seleccionada
-            cursor.execute('SELECT last_selected_city FROM app_config WHERE id = 1')
-            last_city = cursor.fetchone()
-            
-            cursor.execute('DELETE FROM cities WHERE name = ?', (name,))
-            
-            # Si la ciudad eliminada era la última seleccionada, limpiar la configuración
-            if last_city and last_city[0] == name:
-                cursor.execute('UPDATE app_config SET last_selected_city = NULL WHERE id = 1')
-            
-            conn.commit()
-            conn.close()
+            debug(f"Eliminando ciudad de BD: {name}")
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('DELETE FROM cities WHERE name = ?', (name,))
+                deleted = cursor.rowcount
+                
+                # Si la ciudad eliminada era la última seleccionada, limpiar la configuración
+                cursor.execute('''
+                    UPDATE app_config SET last_selected_city = NULL
+                    WHERE id = 1 AND last_selected_city = ?
+                ''', (name,))
             
-            if cursor.rowcount > 0:
-                print(f"Ciudad {name} eliminada de la base de datos")
+            if deleted > 0:
+                info(f"Ciudad {name} eliminada de la base de datos")
                 return True
             else:
-                print(f"Ciudad {name} no encontrada en la base de datos")
+                warning(f"Ciudad {name} no encontrada en la base de datos")
                 return False
-                
+        
         except Exception as e:
-            print(f"Error al eliminar ciudad: {e}")
+            error(f"Error al eliminar ciudad: {e}")
             return False
     
+    @timed("db.get_last_selected_city")
     def get_last_selected_city(self) -> Optional[str]:
         """Obtiene la última ciudad seleccionada por el usuario"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
+            cursor = self._get_connection().cursor()
             
             cursor.execute('SELECT last_selected_city FROM app_config WHERE id = 1')
             result = cursor.fetchone()
             
-            conn.close()
-            
             if result and result[0]:
-                print(f"Última ciudad seleccionada encontrada en BD: {result[0]}")
+                debug(f"Última ciudad seleccionada encontrada en BD: {result[0]}")
                 return result[0]
             else:
-                print("No hay última ciudad seleccionada en la BD")
+                debug("No hay última ciudad seleccionada en la BD")
                 return None
-                
+        
         except Exception as e:
-            print(f"Error al obtener última ciudad: {e}")
+            error(f"Error al obtener última ciudad: {e}")
             return None
     
+    @timed("db.set_last_selected_city")
     def set_last_selected_city(self, city_name: str) -> bool:
         """Guarda la última ciudad seleccionada por el usuario"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            # Verificar que la ciudad existe (pero permitir guardar incluso si no existe aún)
-            cursor.execute('SELECT 1 FROM cities WHERE name = ?', (city_name,))
-            city_exists = cursor.fetchone() is not None
-            
-            if not city_exists:
-                print(f"Advertencia: La ciudad {city_name} no existe en cities, pero se guardará igual")
-            
-            cursor.execute('''
-                UPDATE app_config 
-                SET last_selected_city = ?, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = 1
-            ''', (city_name,))
-            
-            conn.commit()
-            conn.close()
+            with self.transaction(immediate=True) as conn:
+                cursor = conn.cursor()
+                
+                # Verificar que la ciudad existe (pero permitir guardar incluso si no existe aún)
+                cursor.execute('SELECT 1 FROM cities WHERE name = ?', (city_name,))
+                city_exists = cursor.fetchone() is not None
+                
+                if not city_exists:
+                    warning(f"Advertencia: La ciudad {city_name} no existe en cities, pero se guardará igual")
+                
+                cursor.execute('''
+                    UPDATE app_config
+                    SET last_selected_city = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = 1
+                ''', (city_name,))
             
-            print(f"Última ciudad seleccionada guardada en BD: {city_name}")
+            debug(f"Última ciudad seleccionada guardada en BD: {city_name}")
             return True
-            
+        
         except Exception as e:
-            print(f"Error al guardar última ciudad: {e}")
+            error(f"Error al guardar última ciudad: {e}")
             return False
     
+    @timed("db.city_exists")
     def city_exists(self, name: str) -> bool:
         """Verifica si una ciudad existe en la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
+            cursor = self._get_connection().cursor()
             
             cursor.execute('SELECT 1 FROM cities WHERE name = ?', (name,))
-            exists = cursor.fetchone() is not None
-            
-            conn.close()
-            return exists
-            
+            return cursor.fetchone() is not None
+        
         except Exception as e:
-            print(f"Error al verificar ciudad: {e}")
+            error(f"Error al verificar ciudad: {e}")
             return False
     
+    @timed("db.update_city")
     def update_city(self, old_name: str, new_name: str, latitude: float, longitude: float) -> bool:
         """Actualiza los datos de una ciudad"""
         try:
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                UPDATE cities 
-                SET name = ?, latitude = ?, longitude = ? 
-                WHERE name = ?
-            ''', (new_name, latitude, longitude, old_name))
-            
-            # Si se actualizó el nombre, actualizar también en la configuración si era la última seleccionada
-            if old_name != new_name:
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                
                 cursor.execute('''
-                    UPDATE app_config 
-                    SET last_selected_city = ? 
-                    WHERE last_selected_city = ? AND id = 1
-                ''', (new_name, old_name))
-            
-            conn.commit()
-            conn.close()
-            
-            if cursor.rowcount > 0:
-                print(f"Ciudad {old_name} actualizada a {new_name}")
+                    UPDATE cities
+                    SET name = ?, latitude = ?, longitude = ?, geohash = ?
+                    WHERE name = ?
+                ''', (new_name, latitude, longitude, encode_geohash(latitude, longitude), old_name))
+                updated = cursor.rowcount
+                
+                # Si se actualizó el nombre, actualizar también en la configuración si era la última seleccionada
+                if updated > 0 and old_name != new_name:
+                    cursor.execute('''
+                        UPDATE app_config
+                        SET last_selected_city = ?
+                        WHERE last_selected_city = ? AND id = 1
+                    ''', (new_name, old_name))
+            
+            if updated > 0:
+                info(f"Ciudad {old_name} actualizada a {new_name}")
                 return True
             else:
-                print(f"Ciudad {old_name} no encontrada")
+                warning(f"Ciudad {old_name} no encontrada")
                 return False
-                
+        
+        except Exception as e:
+            error(f"Error al actualizar ciudad: {e}")
+            return False
+    
+    def _cities_in_cells(self, cells: List[str]) -> List[Dict]:
+        """Ciudades cuyo geohash empieza por alguna de las celdas (usa el índice)"""
+        cursor = self._get_connection().cursor()
+        if cells:
+            clauses = ' OR '.join('(geohash >= ? AND geohash < ?)' for _ in cells)
+            params = [bound for cell in cells for bound in (cell, prefix_upper_bound(cell))]
+            cursor.execute(f'SELECT name, latitude, longitude FROM cities WHERE {clauses}', params)
+        else:
+            cursor.execute('SELECT name, latitude, longitude FROM cities')
+        return [{"name": row[0], "lat": row[1], "lon": row[2]} for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _rank_by_distance(cities: List[Dict], latitude: float, longitude: float) -> List[Dict]:
+        for city in cities:
+            city["distance_km"] = haversine_km(latitude, longitude, city["lat"], city["lon"])
+        return sorted(cities, key=lambda city: city["distance_km"])
+    
+    @timed("db.find_nearest_cities")
+    def find_nearest_cities(self, latitude: float, longitude: float, k: int = 1) -> List[Dict]:
+        """Obtiene las k ciudades guardadas más cercanas a una coordenada"""
+        try:
+            # Empezar con celdas pequeñas y ampliar hasta que el resultado sea seguro
+            for precision in range(7, 0, -1):
+                ranked = self._rank_by_distance(
+                    self._cities_in_cells(geohash_neighborhood(latitude, longitude, precision)),
+                    latitude, longitude)
+                # Todo lo que quede fuera de las 9 celdas está al menos a un lado de celda de distancia
+                if len(ranked) >= k and ranked[k - 1]["distance_km"] <= cell_size_km(latitude, precision):
+                    return ranked[:k]
+            
+            return self._rank_by_distance(self._cities_in_cells([]), latitude, longitude)[:k]
+            
+        except Exception as e:
+            error(f"Error al buscar ciudades cercanas: {e}")
+            return []
+    
+    @timed("db.find_cities_within")
+    def find_cities_within(self, latitude: float, longitude: float, radius_km: float) -> List[Dict]:
+        """Obtiene las ciudades guardadas dentro de un radio, ordenadas por distancia"""
+        try:
+            cells = []
+            for precision in range(7, 0, -1):
+                if cell_size_km(latitude, precision) >= radius_km:
+                    cells = geohash_neighborhood(latitude, longitude, precision)
+                    break
+            
+            ranked = self._rank_by_distance(self._cities_in_cells(cells), latitude, longitude)
+            return [city for city in ranked if city["distance_km"] <= radius_km]
+            
+        except Exception as e:
+            error(f"Error al buscar ciudades en el radio: {e}")
+            return []
+    
+    @timed("db.get_cached_forecast")
+    def get_cached_forecast(self, cache_key: str) -> Optional[Dict]:
+        """Obtiene un pronóstico guardado en la caché persistente.
+        
+        Es solo una lectura, sin transacción de escritura: ForecastCache guarda las fechas
+        de acceso por lotes con touch_cached_forecasts.
+        """
+        try:
+            row = self._get_connection().execute('''
+                SELECT payload, fetched_at FROM forecast_cache
+                WHERE cache_key = ?
+            ''', (cache_key,)).fetchone()
+            
+            if row:
+                return {"payload": row[0], "fetched_at": row[1]}
+            return None
+        
+        except Exception as e:
+            error(f"Error al obtener pronóstico en caché: {e}")
+            return None
+    
+    @timed("db.touch_cached_forecasts")
+    def touch_cached_forecasts(self, accessed: Dict[str, float]) -> bool:
+        """Guarda de una vez las fechas de último acceso {clave: timestamp} que usa la depuración LRU"""
+        if not accessed:
+            return True
+        try:
+            with self.transaction() as conn:
+                conn.executemany('''
+                    UPDATE forecast_cache SET accessed_at = MAX(accessed_at, ?)
+                    WHERE cache_key = ?
+                ''', [(accessed_at, cache_key) for cache_key, accessed_at in accessed.items()])
+            return True
+        
+        except Exception as e:
+            error(f"Error al actualizar accesos de la caché: {e}")
+            return False
+    
+    @timed("db.save_cached_forecast")
+    def save_cached_forecast(self, cache_key: str, payload, fetched_at: float) -> bool:
+        """Guarda o reemplaza un pronóstico en la caché persistente (bytes de Forecast.to_bytes o JSON)"""
+        try:
+            with self.transaction() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO forecast_cache (cache_key, payload, fetched_at, accessed_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (cache_key, payload, fetched_at, time.time()))
+            return True
+        
+        except Exception as e:
+            error(f"Error al guardar pronóstico en caché: {e}")
+            return False
+    
+    @timed("db.delete_cached_forecast")
+    def delete_cached_forecast(self, cache_key: str) -> bool:
+        """Elimina un pronóstico de la caché persistente"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.execute('DELETE FROM forecast_cache WHERE cache_key = ?', (cache_key,))
+            return cursor.rowcount > 0
+        
+        except Exception as e:
+            error(f"Error al eliminar pronóstico en caché: {e}")
+            return False
+    
+    @timed("db.prune_forecast_cache")
+    def prune_forecast_cache(self, max_entries: int) -> int:
+        """Elimina los pronósticos menos usados recientemente si se supera el máximo"""
+        try:
+            with self.transaction() as conn:
+                cursor = conn.execute('''
+                    DELETE FROM forecast_cache WHERE cache_key NOT IN (
+                        SELECT cache_key FROM forecast_cache
+                        ORDER BY accessed_at DESC LIMIT ?
+                    )
+                ''', (max_entries,))
+            return cursor.rowcount
+        
         except Exception as e:
-            print(f"Error al actualizar ciudad: {e}")
-            return False
\ No newline at end of file
+            error(f"Error al depurar caché de pronósticos: {e}")
+            return 0
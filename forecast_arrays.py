@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import numpy as np
+
+import weather_codes
+
+MISSING_CODE = -1
+_CODE_RANGE = 100  # Los códigos WMO van de 0 a 99
+_UNKNOWN_INDEX = _CODE_RANGE  # Entrada extra de las tablas para códigos desconocidos o faltantes
+
+
+def _build_lookup(fn):
+    """Precalcula fn(código) para todos los códigos WMO, más una entrada para desconocidos"""
+    return np.array([fn(code) for code in range(_CODE_RANGE)] + [fn(None)], dtype=object)
+
+
+_ICONS_DAY = _build_lookup(lambda code: weather_codes.icon_file(code, True))
+_ICONS_NIGHT = _build_lookup(lambda code: weather_codes.icon_file(code, False))
+_DESCRIPTIONS = _build_lookup(weather_codes.description)
+_HOUR_LABELS = np.array([datetime(2000, 1, 1, hour).strftime('%I %p').lstrip('0') for hour in range(24)], dtype=object)
+
+_TIME_VARIABLES = {'time', 'sunrise', 'sunset'}
+
+
+def _to_datetimes(values, unit='m'):
+    """Convierte cadenas ISO (o '--:--') a datetime64, con NaT para los valores inválidos"""
+    try:
+        return np.array(values, dtype=f'datetime64[{unit}]')
+    except (TypeError, ValueError):
+        pass
+    # Hay valores inválidos: convertir uno a uno
+    result = np.full(len(values), np.datetime64('NaT'), dtype=f'datetime64[{unit}]')
+    for i, value in enumerate(values):
+        try:
+            result[i] = np.datetime64(value, unit)
+        except (TypeError, ValueError):
+            pass
+    return result
+
+
+def _to_block(block: Dict, time_unit: str) -> Dict[str, np.ndarray]:
+    """Convierte un bloque horario o diario de listas a arreglos tipados"""
+    arrays = {}
+    for variable, values in block.items():
+        if not isinstance(values, list):
+            continue
+        if variable in _TIME_VARIABLES:
+            arrays[variable] = _to_datetimes(values, time_unit if variable == 'time' else 'm')
+        elif variable == 'weather_code':
+            codes = np.array(values, dtype=np.float32)
+            arrays[variable] = np.where(np.isnan(codes), MISSING_CODE, codes).astype(np.int8)
+        else:
+            # None -> NaN al convertir a float
+            arrays[variable] = np.array(values, dtype=np.float32)
+    return arrays
+
+
+class ForecastArrays:
+    """Pronóstico convertido una sola vez a arreglos NumPy para procesarlo de forma vectorizada"""
+
+    def __init__(self, data: Dict):
+        self.success = data.get('success', False)
+        self.current = dict(data.get('current', {}))
+        self.utc_offset = np.timedelta64(int(data.get('utc_offset_seconds', 0)), 's')
+        self.hourly = _to_block(data.get('hourly', {}), 'm')
+        self.daily = _to_block(data.get('daily', {}), 'D')
+
+    @property
+    def hourly_time(self) -> np.ndarray:
+        return self.hourly.get('time', np.array([], dtype='datetime64[m]'))
+
+    def local_now(self) -> np.datetime64:
+        """Hora actual en la zona horaria de la ubicación"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return np.datetime64(now, 'm') + self.utc_offset
+
+    def next_hours(self, hours: int, now: Optional[np.datetime64] = None) -> Dict[str, np.ndarray]:
+        """Devuelve las próximas N horas de todas las variables horarias (vistas, sin copias)"""
+        times = self.hourly_time
+        if now is None:
+            now = self.local_now()
+        # La hora en curso se incluye: se busca desde el inicio de la hora actual
+        start = int(np.searchsorted(times, np.datetime64(now, 'h').astype(times.dtype), side='left'))
+        end = start + hours
+        return {variable: values[start:end] for variable, values in self.hourly.items()}
+
+    def min_max(self, variable: str, block: str = 'hourly'):
+        """Mínimo y máximo de una variable, ignorando valores faltantes"""
+        values = getattr(self, block).get(variable)
+        if values is None or not len(values) or np.all(np.isnan(values)):
+            return None, None
+        return float(np.nanmin(values)), float(np.nanmax(values))
+
+    def rolling_mean(self, variable: str, window: int) -> np.ndarray:
+        """Media móvil de una variable horaria (tamaño len - window + 1)"""
+        values = self.hourly.get(variable)
+        if values is None or window <= 0 or len(values) < window:
+            return np.array([], dtype=np.float32)
+        cumulative = np.cumsum(np.insert(values.astype(np.float64), 0, 0.0))
+        return ((cumulative[window:] - cumulative[:-window]) / window).astype(np.float32)
+
+    def precipitation_total(self, hours: Optional[int] = None, now: Optional[np.datetime64] = None) -> float:
+        """Precipitación total, de las próximas N horas o de todo el pronóstico"""
+        if hours is not None:
+            values = self.next_hours(hours, now).get('precipitation')
+        else:
+            values = self.hourly.get('precipitation')
+            if values is None:
+                values = self.daily.get('precipitation_sum')
+        if values is None or not len(values):
+            return 0.0
+        return float(np.nansum(values))
+
+    def icons(self, is_day=None) -> np.ndarray:
+        """Nombres de icono para todas las horas en una sola operación"""
+        codes = self._lookup_codes(self.hourly.get('weather_code'))
+        if is_day is None:
+            is_day = self.hourly.get('is_day')
+            if is_day is None:
+                is_day = self._daylight_mask()
+        day_mask = np.broadcast_to(np.asarray(is_day).astype(bool), codes.shape)
+        return np.where(day_mask, _ICONS_DAY[codes], _ICONS_NIGHT[codes])
+
+    def _daylight_mask(self) -> np.ndarray:
+        """Indica para cada hora si está entre la salida y la puesta de sol de su día"""
+        times = self.hourly_time
+        days, sunrise, sunset = (self.daily.get(name) for name in ('time', 'sunrise', 'sunset'))
+        if days is None or sunrise is None or sunset is None or not len(days):
+            return np.ones(len(times), dtype=bool)
+        index = np.clip(np.searchsorted(days, times.astype('datetime64[D]')), 0, len(days) - 1)
+        return (times >= sunrise[index]) & (times < sunset[index])
+
+    def descriptions(self, block: str = 'hourly') -> np.ndarray:
+        """Descripciones para todos los códigos de un bloque"""
+        return _DESCRIPTIONS[self._lookup_codes(getattr(self, block).get('weather_code'))]
+
+    def hour_labels(self) -> np.ndarray:
+        """Etiquetas '3 PM' para cada hora, equivalentes a format_time(..., 'hour')"""
+        hours = self.hourly_time.astype('datetime64[h]').astype(np.int64) % 24
+        return _HOUR_LABELS[hours]
+
+    @staticmethod
+    def _lookup_codes(codes) -> np.ndarray:
+        """Códigos listos para indexar las tablas (los desconocidos usan el valor por defecto)"""
+        if codes is None:
+            return np.array([], dtype=np.intp)
+        codes = codes.astype(np.intp)
+        return np.where((codes >= 0) & (codes < _CODE_RANGE), codes, _UNKNOWN_INDEX)
@@ -0,0 +1,188 @@
+import json
+import struct
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Tuple, Union
+
+from forecast_model import Forecast
+from instrumentation import count
+
+
+class ForecastCache:
+    """Caché LRU con TTL para respuestas de pronóstico, persistida en la base de datos.
+
+    La memoria es la fuente de verdad mientras la entrada está vigente: leer no escribe en
+    la base de datos. La fecha de acceso que usa la depuración LRU persistida se anota como
+    mucho una vez cada touch_interval segundos por clave y se guarda junto con la siguiente
+    escritura. Una entrada vencida se vuelve a buscar en la base de datos (por si otro
+    proceso ya la renovó) como mucho una vez cada recheck_interval segundos.
+    """
+
+    def __init__(self, db_manager=None, ttl: float = 600, max_entries: int = 64,
+                 touch_interval: float = 60.0, recheck_interval: float = 30.0):
+        self.db_manager = db_manager
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.recheck_interval = recheck_interval
+        self._entries = OrderedDict()  # key -> (Forecast, fetched_at), en formato compacto
+        self._touched = {}  # key -> último acceso anotado
+        self._pending_touches = {}  # key -> acceso aún no guardado en la base de datos
+        self._checked = {}  # key -> última consulta a la base de datos
+        self._lock = Lock()
+
+    @staticmethod
+    def make_key(lat: float, lon: float, params: Dict) -> str:
+        """Construye la clave de caché a partir de la ubicación y los parámetros de la petición"""
+        extra = "&".join(
+            f"{name}={params[name]}" for name in sorted(params)
+            if name not in ("latitude", "longitude")
+        )
+        return f"{lat:.4f},{lon:.4f}|{extra}"
+
+    def get(self, key: str) -> Optional[Tuple[Dict, bool]]:
+        """Devuelve (datos, vigente) si la clave está en caché, o None si no existe"""
+        cached = self.get_forecast(key)
+        if cached is None:
+            return None
+        forecast, is_fresh = cached
+        return forecast.to_dict(), is_fresh
+
+    def get_forecast(self, key: str, ttl: Optional[float] = None) -> Optional[Tuple[Forecast, bool]]:
+        """Como get(), pero devuelve el modelo compacto sin convertirlo a diccionario.
+        
+        ttl permite usar una vigencia distinta a la de la caché para esta clave.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._touch(key, now)
+
+        if entry is None:
+            entry = self._load_from_db(key)
+            if entry is None:
+                count("cache.misses")
+                return None
+            count("cache.hits.disk")
+        else:
+            count("cache.hits.memory")
+
+        ttl = self.ttl if ttl is None else ttl
+        forecast, fetched_at = entry
+        is_fresh = (now - fetched_at) < ttl
+        if not is_fresh and self._should_recheck(key, now):
+            # Otro proceso que comparte la base de datos puede haberla renovado ya
+            renewed = self._load_from_db(key, newer_than=fetched_at)
+            if renewed is not None:
+                count("cache.renewed")
+                forecast, fetched_at = renewed
+                is_fresh = (now - fetched_at) < ttl
+        if not is_fresh:
+            count("cache.stale")
+        return forecast, is_fresh
+
+    def get_entry(self, key: str) -> Optional[Tuple[Forecast, float]]:
+        """Devuelve (pronóstico, fetched_at) sin contar como acceso.
+
+        Es de solo lectura: no cambia el orden LRU, no anota accesos y lo leído de la base
+        de datos no se guarda en memoria (el planificador consulta así todas las ciudades).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load_from_db(key, remember=False)
+        return entry
+
+    def set(self, key: str, payload: Union[Dict, Forecast], fetched_at: Optional[float] = None):
+        """Guarda una respuesta (diccionario o Forecast) en la caché en memoria y en la base de datos"""
+        if fetched_at is None:
+            fetched_at = time.time()
+
+        forecast = payload if isinstance(payload, Forecast) else Forecast.from_dict(payload)
+        self._remember(key, forecast, fetched_at)
+
+        if self.db_manager is not None:
+            with self._lock:
+                touches, self._pending_touches = self._pending_touches, {}
+            touches.pop(key, None)  # La propia escritura ya guarda la fecha de acceso
+            # Formato binario: se guarda sin convertir los arreglos a listas de Python
+            self.db_manager.save_cached_forecast(key, forecast.to_bytes(), fetched_at)
+            # Los accesos anotados se guardan antes de depurar para que el orden LRU sea el actual
+            self.db_manager.touch_cached_forecasts(touches)
+            self.db_manager.prune_forecast_cache(self.max_entries)
+
+    def invalidate(self, key: str):
+        """Elimina una entrada de la caché"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._forget(key)
+        if self.db_manager is not None:
+            self.db_manager.delete_cached_forecast(key)
+
+    def clear(self):
+        """Vacía la caché en memoria (la persistida se mantiene)"""
+        with self._lock:
+            self._entries.clear()
+            self._touched.clear()
+            self._checked.clear()
+
+    def _remember(self, key: str, forecast: Forecast, fetched_at: float):
+        """Inserta la entrada en memoria aplicando el desalojo LRU"""
+        with self._lock:
+            self._entries[key] = (forecast, fetched_at)
+            self._entries.move_to_end(key)
+            now = time.time()
+            self._checked[key] = now
+            self._touch(key, now)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget(evicted)
+
+    def _touch(self, key: str, now: float):
+        """Anota el acceso para la base de datos si el último anotado es antiguo (con el bloqueo tomado)"""
+        if now - self._touched.get(key, 0.0) >= self.touch_interval:
+            self._touched[key] = now
+            self._pending_touches[key] = now
+
+    def _should_recheck(self, key: str, now: float) -> bool:
+        """True si toca volver a consultar la base de datos por una entrada vencida"""
+        if self.db_manager is None:
+            return False
+        with self._lock:
+            if now - self._checked.get(key, 0.0) < self.recheck_interval:
+                return False
+            self._checked[key] = now
+            return True
+
+    def _forget(self, key: str):
+        """Olvida el estado auxiliar de una clave que sale de memoria (con el bloqueo tomado)"""
+        self._touched.pop(key, None)
+        self._checked.pop(key, None)
+
+    def _load_from_db(self, key: str, newer_than: Optional[float] = None,
+                      remember: bool = True) -> Optional[Tuple[Forecast, float]]:
+        """Recupera una entrada persistida (tras un reinicio, o guardada por otro proceso)"""
+        if self.db_manager is None:
+            return None
+
+        row = self.db_manager.get_cached_forecast(key)
+        if row is None or (newer_than is not None and row["fetched_at"] <= newer_than):
+            return None
+
+        payload = row["payload"]
+        try:
+            if isinstance(payload, bytes):
+                forecast = Forecast.from_bytes(payload)
+            else:
+                # Entradas guardadas como JSON por versiones anteriores
+                forecast = Forecast.from_dict(json.loads(payload))
+        except (TypeError, ValueError, AttributeError, KeyError, struct.error):
+            self.db_manager.delete_cached_forecast(key)
+            return None
+
+        if remember:
+            self._remember(key, forecast, row["fetched_at"])
+        return forecast, row["fetched_at"]
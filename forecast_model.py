@@ -0,0 +1,281 @@
+import json
+import math
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+_EPOCH = datetime(1970, 1, 1)
+NO_TIME = -(2 ** 63)  # Marca para horas inválidas ('--:--')
+NO_CODE = -1
+
+_CODE_VARIABLES = {'weather_code', 'is_day'}
+_TIME_VARIABLES = {'sunrise', 'sunset'}
+
+# Serialización binaria: magic + longitud de la cabecera JSON, luego los arreglos en little-endian
+_BLOB_MAGIC = b'FCM1'
+_BLOB_HEADER = struct.Struct('<4sI')
+
+
+def parse_local_time(value) -> int:
+    """Convierte una hora ISO local a segundos desde la época (sin zona horaria)"""
+    try:
+        return int((datetime.fromisoformat(value) - _EPOCH).total_seconds())
+    except (TypeError, ValueError):
+        return NO_TIME
+
+
+def _format_time(seconds: int, fmt: str, missing: str):
+    if seconds == NO_TIME:
+        return missing
+    return (_EPOCH + timedelta(seconds=seconds)).strftime(fmt)
+
+
+def series_typecode(variable: str) -> str:
+    """Tipo de array.array con que se guarda una serie: 'q' horas, 'b' códigos, 'd' el resto"""
+    if variable in _TIME_VARIABLES:
+        return 'q'
+    if variable in _CODE_VARIABLES:
+        return 'b'
+    return 'd'
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == 'little':
+        return values.tobytes()
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _from_little_endian(typecode: str, buffer) -> array:
+    values = array(typecode)
+    values.frombytes(buffer)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _pack(variable: str, values):
+    """Elige el arreglo más compacto para una serie de valores"""
+    if variable in _TIME_VARIABLES:
+        return array('q', (parse_local_time(v) for v in values))
+    if variable in _CODE_VARIABLES:
+        return array('b', (NO_CODE if v is None else int(v) for v in values))
+    try:
+        return array('d', (math.nan if v is None else float(v) for v in values))
+    except (TypeError, ValueError):
+        # Serie no numérica: se conserva tal cual
+        return tuple(values)
+
+
+def _unpack(variable: str, values) -> list:
+    if isinstance(values, tuple):
+        return list(values)
+    if variable in _TIME_VARIABLES:
+        return [_format_time(v, '%Y-%m-%dT%H:%M', '--:--') for v in values]
+    if variable in _CODE_VARIABLES:
+        return [None if v == NO_CODE else v for v in values]
+    return [None if math.isnan(v) else _to_number(v) for v in values]
+
+
+def _to_number(value: float):
+    """Devuelve enteros como int para que to_dict reproduzca el JSON original"""
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+
+@dataclass(slots=True)
+class CurrentWeather:
+    """Condiciones actuales"""
+    time: Optional[str] = None
+    interval: Optional[int] = None
+    temperature_2m: Optional[float] = None
+    relative_humidity_2m: Optional[float] = None
+    apparent_temperature: Optional[float] = None
+    precipitation: Optional[float] = None
+    rain: Optional[float] = None
+    pressure_msl: Optional[float] = None
+    surface_pressure: Optional[float] = None
+    wind_speed_10m: Optional[float] = None
+    wind_direction_10m: Optional[float] = None
+    is_day: Optional[int] = None
+    weather_code: Optional[int] = None
+    extra: Optional[Dict] = None  # Variables no previstas, para no perder datos
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CurrentWeather":
+        current = cls()
+        extra = {}
+        for name, value in data.items():
+            if name != 'extra' and name in cls.__slots__:
+                setattr(current, name, value)
+            else:
+                extra[name] = value
+        current.extra = extra or None
+        return current
+
+    def to_dict(self) -> Dict:
+        result = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if name != 'extra' and value is not None:
+                result[name] = value
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+
+@dataclass(slots=True)
+class SeriesForecast:
+    """Serie temporal: eje de tiempo en segundos y un arreglo compacto por variable"""
+    time: array = field(default_factory=lambda: array('q'))
+    variables: Dict[str, object] = field(default_factory=dict)
+
+    TIME_FORMAT = '%Y-%m-%dT%H:%M'
+
+    @classmethod
+    def from_dict(cls, data: Dict):
+        series = cls(time=array('q', (parse_local_time(t) for t in data.get('time', []))))
+        for name, values in data.items():
+            if name != 'time' and isinstance(values, list):
+                series.variables[name] = _pack(name, values)
+        return series
+
+    def to_dict(self) -> Dict:
+        result = {'time': [_format_time(t, self.TIME_FORMAT, '--:--') for t in self.time]}
+        for name, values in self.variables.items():
+            result[name] = _unpack(name, values)
+        return result
+
+    def view(self, variable: str) -> Optional[memoryview]:
+        """Vista de solo lectura sobre una variable, sin copiar los datos"""
+        values = self.variables.get(variable)
+        if values is None or isinstance(values, tuple):
+            return None
+        return memoryview(values).toreadonly()
+
+    def __len__(self):
+        return len(self.time)
+
+
+@dataclass(slots=True)
+class HourlyForecast(SeriesForecast):
+    """Pronóstico por hora"""
+
+
+@dataclass(slots=True)
+class DailyForecast(SeriesForecast):
+    """Pronóstico por día"""
+
+    TIME_FORMAT = '%Y-%m-%d'
+
+
+@dataclass(slots=True)
+class Forecast:
+    """Pronóstico completo de una ubicación en formato compacto"""
+    current: CurrentWeather
+    hourly: HourlyForecast
+    daily: DailyForecast
+    success: bool = False
+    utc_offset_seconds: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Forecast":
+        """Construye el modelo a partir del diccionario de get_weather_data"""
+        return cls(
+            current=CurrentWeather.from_dict(data.get('current', {})),
+            hourly=HourlyForecast.from_dict(data.get('hourly', {})),
+            daily=DailyForecast.from_dict(data.get('daily', {})),
+            success=bool(data.get('success', False)),
+            utc_offset_seconds=int(data.get('utc_offset_seconds', 0) or 0),
+        )
+
+    def to_dict(self) -> Dict:
+        """Devuelve el formato de diccionario usado hasta ahora por la aplicación"""
+        return {
+            'current': self.current.to_dict(),
+            'hourly': self.hourly.to_dict(),
+            'daily': self.daily.to_dict(),
+            'utc_offset_seconds': self.utc_offset_seconds,
+            'success': self.success
+        }
+
+    def only(self, block: str) -> "Forecast":
+        """Copia con solo uno de los bloques ('current', 'hourly' o 'daily'); comparte los arreglos"""
+        return Forecast(
+            current=self.current if block == 'current' else CurrentWeather(),
+            hourly=self.hourly if block == 'hourly' else HourlyForecast(),
+            daily=self.daily if block == 'daily' else DailyForecast(),
+            success=self.success,
+            utc_offset_seconds=self.utc_offset_seconds,
+        )
+
+    def to_bytes(self) -> bytes:
+        """Serialización compacta para la caché persistente (los arreglos se copian tal cual)"""
+        arrays = []
+
+        def describe(series):
+            arrays.append(series.time)
+            variables = []
+            for name, values in series.variables.items():
+                if isinstance(values, tuple):
+                    variables.append([name, None, list(values)])
+                else:
+                    variables.append([name, values.typecode, len(values)])
+                    arrays.append(values)
+            return [len(series.time), variables]
+
+        header = json.dumps({
+            'current': self.current.to_dict(),
+            'hourly': describe(self.hourly),
+            'daily': describe(self.daily),
+            'success': self.success,
+            'utc_offset_seconds': self.utc_offset_seconds,
+        }, separators=(',', ':')).encode('utf-8')
+        return b''.join([_BLOB_HEADER.pack(_BLOB_MAGIC, len(header)), header] +
+                        [_little_endian(values) for values in arrays])
+
+    @classmethod
+    def from_bytes(cls, blob) -> "Forecast":
+        """Reconstruye un pronóstico guardado con to_bytes(); lanza ValueError si no es válido"""
+        view = memoryview(blob)
+        magic, header_size = _BLOB_HEADER.unpack_from(view, 0)
+        if magic != _BLOB_MAGIC:
+            raise ValueError("Pronóstico binario con formato desconocido")
+        offset = _BLOB_HEADER.size + header_size
+        header = json.loads(bytes(view[_BLOB_HEADER.size:offset]))
+
+        def read(typecode, length):
+            nonlocal offset
+            end = offset + length * array(typecode).itemsize
+            values = _from_little_endian(typecode, view[offset:end])
+            offset = end
+            return values
+
+        def restore(series, description):
+            time_length, variables = description
+            series.time = read('q', time_length)
+            for name, typecode, content in variables:
+                series.variables[name] = tuple(content) if typecode is None else read(typecode, content)
+            return series
+
+        return cls(
+            current=CurrentWeather.from_dict(header['current']),
+            hourly=restore(HourlyForecast(), header['hourly']),
+            daily=restore(DailyForecast(), header['daily']),
+            success=header['success'],
+            utc_offset_seconds=header['utc_offset_seconds'],
+        )
+
+    def widget_fields(self) -> Dict:
+        """Campos que necesita el widget, leídos directamente del modelo"""
+        current = self.current
+        return {
+            "temperature": current.temperature_2m or 0,
+            "humidity": current.relative_humidity_2m or 0,
+            "wind_speed": current.wind_speed_10m or 0,
+            "weather_code": current.weather_code or 0,
+            "is_day": current.is_day if current.is_day is not None else 1,
+        }
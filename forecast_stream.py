@@ -0,0 +1,222 @@
+"""Lectura incremental de respuestas de Open-Meteo directamente al modelo compacto (Forecast).
+
+Los arreglos de "hourly" y "daily" se decodifican valor a valor en array.array, sin
+crear nunca listas de floats de Python; el resto de la respuesta (current, unidades,
+metadatos) es pequeño y se decodifica con json. El búfer solo retiene el texto aún no
+consumido, así que el pico de memoria queda acotado por el tamaño de los arreglos de salida.
+"""
+import codecs
+import json
+import re
+from array import array
+from datetime import datetime, timedelta
+from typing import Iterable, List, Union
+
+from forecast_model import (NO_CODE, NO_TIME, CurrentWeather, DailyForecast, Forecast, HourlyForecast,
+                            parse_local_time, series_typecode)
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+_NUMBER_CHARS = '0123456789.eE+-'
+# Elemento de un arreglo plano: cadena, null o literal numérico
+_TOKEN = re.compile(r'"((?:[^"\\]|\\.)*)"|(null)|([^,\s"]+)')
+_EPOCH = datetime(1970, 1, 1)
+
+
+class _Reader:
+    """Búfer de texto que se rellena con los fragmentos de la respuesta a medida que se necesitan"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Añade el siguiente fragmento descartando el texto ya consumido; False si no hay más"""
+        if self.eof:
+            return False
+        try:
+            text = self._decoder.decode(next(self._chunks))
+        except StopIteration:
+            self.eof = True
+            text = self._decoder.decode(b'', final=True)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return bool(text) or not self.eof
+
+    def peek(self) -> str:
+        """Siguiente carácter significativo (sin consumirlo)"""
+        while True:
+            buffer = self.buffer
+            while self.pos < len(buffer) and buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(buffer):
+                return buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Respuesta JSON incompleta")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Se esperaba {char!r} en la respuesta JSON")
+        self.pos += 1
+
+    def separator(self, closing: str) -> bool:
+        """Consume ',' (devuelve True) o el cierre del contenedor (devuelve False)"""
+        char = self.peek()
+        self.pos += 1
+        if char == ',':
+            return True
+        if char == closing:
+            return False
+        raise ValueError(f"Carácter inesperado {char!r} en la respuesta JSON")
+
+    def value(self):
+        """Decodifica un valor JSON pequeño completo (claves, metadatos, 'current')"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # Un valor al final del búfer (o un número cortado, como "0.") podría continuar
+            # en el siguiente fragmento
+            truncated = end == len(self.buffer) or (
+                isinstance(value, (int, float)) and self.buffer[end] in _NUMBER_CHARS)
+            if truncated and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    def array_span(self):
+        """Posiciones (inicio, fin) del contenido de un arreglo plano dentro del búfer"""
+        self.expect('[')
+        while True:
+            end = self.buffer.find(']', self.pos)
+            if end >= 0:
+                start, self.pos = self.pos, end + 1
+                return start, end
+            if not self.fill():
+                raise ValueError("Arreglo JSON incompleto")
+
+
+def _read_array(reader: _Reader, typecode: str):
+    """Decodifica un arreglo al tipo compacto; devuelve (valores, contenía horas en formato unixtime)"""
+    start, end = reader.array_span()
+    buffer = reader.buffer
+
+    if typecode == 'q':
+        numeric = False
+
+        def convert(match):
+            nonlocal numeric
+            text, null, number = match.groups()
+            if text is not None:
+                return parse_local_time(text)
+            if null:
+                return NO_TIME
+            numeric = True
+            return int(number)
+
+        values = array('q', (convert(match) for match in _TOKEN.finditer(buffer, start, end)))
+        return values, numeric
+
+    text = buffer[start:end]
+    if not text.strip():
+        return array(typecode), False
+    try:
+        # float() acepta 'nan' y espacios alrededor: basta con separar por comas
+        items = text.replace('null', 'nan').split(',')
+        if typecode == 'b':
+            values = array('b', (NO_CODE if item.strip() == 'nan' else int(float(item)) for item in items))
+        else:
+            values = array('d', map(float, items))
+    except (TypeError, ValueError, OverflowError):
+        # Serie no numérica: se conserva como tupla, igual que Forecast.from_dict
+        values = tuple(json.loads('[' + text + ']'))
+    return values, False
+
+
+def _read_series(reader: _Reader, series, unix_arrays: List[array]):
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if reader.peek() == '[':
+            values, numeric = _read_array(reader, 'q' if name == 'time' else series_typecode(name))
+            if numeric:
+                unix_arrays.append(values)
+            if name == 'time':
+                series.time = values
+            else:
+                series.variables[name] = values
+        else:
+            reader.value()
+        if not reader.separator('}'):
+            return
+
+
+def _read_location(reader: _Reader) -> Forecast:
+    forecast = Forecast(current=CurrentWeather(), hourly=HourlyForecast(), daily=DailyForecast(), success=True)
+    current = {}
+    unix_arrays = []
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return forecast
+
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key in ('hourly', 'daily') and reader.peek() == '{':
+            _read_series(reader, forecast.hourly if key == 'hourly' else forecast.daily, unix_arrays)
+        else:
+            value = reader.value()
+            if key == 'current' and isinstance(value, dict):
+                current = value
+            elif key == 'utc_offset_seconds':
+                forecast.utc_offset_seconds = int(value or 0)
+            elif key == 'error' and value:
+                forecast.success = False
+        if not reader.separator('}'):
+            break
+
+    # Con timeformat=unixtime las horas llegan en UTC; el modelo guarda la hora local
+    offset = forecast.utc_offset_seconds
+    if offset:
+        for values in unix_arrays:
+            for index, seconds in enumerate(values):
+                if seconds != NO_TIME:
+                    values[index] = seconds + offset
+    if isinstance(current.get('time'), int):
+        current['time'] = (_EPOCH + timedelta(seconds=current['time'] + offset)).strftime('%Y-%m-%dT%H:%M')
+    forecast.current = CurrentWeather.from_dict(current)
+    return forecast
+
+
+def parse_forecast_stream(chunks: Iterable[bytes]) -> Union[Forecast, List[Forecast]]:
+    """Lee una respuesta de Open-Meteo por fragmentos.
+
+    Devuelve un Forecast, o una lista si la petición era para varias ubicaciones.
+    Las ubicaciones con error devuelven un Forecast con success=False.
+    """
+    reader = _Reader(chunks)
+    if reader.peek() != '[':
+        return _read_location(reader)
+
+    reader.expect('[')
+    forecasts = []
+    if reader.peek() == ']':
+        reader.pos += 1
+        return forecasts
+    while True:
+        forecasts.append(_read_location(reader))
+        if not reader.separator(']'):
+            return forecasts
@@ -0,0 +1,246 @@
+"""Buscador offline de ciudades a partir de un volcado de GeoNames.
+
+Construir el índice (una sola vez, por ejemplo con cities15000.txt de GeoNames):
+    python gazetteer.py build cities15000.txt gazetteer.idx
+
+Buscar:
+    python gazetteer.py search gazetteer.idx "conce"
+"""
+import heapq
+import mmap
+import os
+import struct
+import sys
+import unicodedata
+from typing import Dict, List, Optional
+
+from instrumentation import info
+
+GAZETTEER_MAGIC = b'GZIX'
+GAZETTEER_VERSION = 2
+KEY_SIZE = 32  # Bytes del nombre normalizado guardados por registro
+TOP_PREFIX_BYTES = 3  # Prefijos cortos con ranking precalculado
+TOP_PER_PREFIX = 32
+
+# magic, versión, nº registros, offset registros, offset tabla de prefijos, nº prefijos, offset cadenas
+_HEADER = struct.Struct('<4sHIIIII')
+# clave normalizada, geonameid, población, lat, lon, offset del texto a mostrar
+_RECORD = struct.Struct(f'<{KEY_SIZE}sIIffI')
+_TOP_ENTRY = struct.Struct(f'<{TOP_PREFIX_BYTES}sB{TOP_PER_PREFIX}i')
+_TEXT_LENGTH = struct.Struct('<H')
+
+# Columnas del formato de GeoNames
+_COL_ID, _COL_NAME, _COL_ASCII, _COL_ALTERNATES = 0, 1, 2, 3
+_COL_LAT, _COL_LON, _COL_COUNTRY, _COL_ADMIN1, _COL_POPULATION = 4, 5, 8, 10, 14
+
+
+def normalize_name(text: str) -> str:
+    """Minúsculas y sin tildes ni diacríticos: 'Concepción' -> 'concepcion'"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def _key_bytes(text: str) -> bytes:
+    return normalize_name(text).encode('utf-8')[:KEY_SIZE]
+
+
+def build_index(source_path: str, output_path: str, min_population: int = 0,
+                include_alternate_names: bool = False) -> int:
+    """Genera el índice ordenado a partir de un archivo TSV de GeoNames; devuelve el nº de registros"""
+    records = []  # (clave, -población, geonameid, población, lat, lon, offset)
+    texts = bytearray()
+
+    with open(source_path, 'r', encoding='utf-8') as source:
+        for line in source:
+            columns = line.rstrip('\n').split('\t')
+            if len(columns) <= _COL_POPULATION:
+                continue
+            try:
+                geonameid = int(columns[_COL_ID])
+                population = int(columns[_COL_POPULATION] or 0)
+                lat = float(columns[_COL_LAT])
+                lon = float(columns[_COL_LON])
+            except ValueError:
+                continue
+            if population < min_population:
+                continue
+
+            offset = len(texts)
+            text = '\t'.join((columns[_COL_NAME], columns[_COL_COUNTRY], columns[_COL_ADMIN1])).encode('utf-8')
+            texts += _TEXT_LENGTH.pack(len(text)) + text
+
+            names = [columns[_COL_NAME], columns[_COL_ASCII]]
+            if include_alternate_names and columns[_COL_ALTERNATES]:
+                names += columns[_COL_ALTERNATES].split(',')
+            for key in {_key_bytes(name) for name in names if name}:
+                if key:
+                    records.append((key, -population, geonameid, population, lat, lon, offset))
+
+    records.sort()
+
+    # Ranking por población precalculado para prefijos de 1 a TOP_PREFIX_BYTES bytes
+    top = {}
+    for index, (key, _, geonameid, population, *_rest) in enumerate(records):
+        for length in range(1, TOP_PREFIX_BYTES + 1):
+            if len(key) < length:
+                break
+            heap = top.setdefault(key[:length], [])
+            entry = (population, -index)
+            if len(heap) < TOP_PER_PREFIX:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+
+    records_offset = _HEADER.size
+    top_offset = records_offset + len(records) * _RECORD.size
+    strings_offset = top_offset + len(top) * _TOP_ENTRY.size
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as output:
+        output.write(_HEADER.pack(GAZETTEER_MAGIC, GAZETTEER_VERSION, len(records),
+                                  records_offset, top_offset, len(top), strings_offset))
+        for key, _, geonameid, population, lat, lon, offset in records:
+            output.write(_RECORD.pack(key, geonameid, population, lat, lon, offset))
+        for prefix in sorted(top):
+            ranked = [-index for _, index in sorted(top[prefix], reverse=True)]
+            ranked += [-1] * (TOP_PER_PREFIX - len(ranked))
+            output.write(_TOP_ENTRY.pack(prefix, len(prefix), *ranked))
+        output.write(texts)
+    os.replace(tmp_path, output_path)
+
+    info(f"Índice de ciudades generado: {len(records)} entradas", path=output_path)
+    return len(records)
+
+
+class Gazetteer:
+    """Búsqueda por prefijo sobre el índice mapeado en memoria (no se carga entero en RAM)"""
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._file = None
+        self._map = None
+        self._top = None
+
+    def _open(self):
+        if self._map is not None:
+            return
+        self._file = open(self.index_path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, self.records_offset,
+         self.top_offset, self.top_count, self.strings_offset) = _HEADER.unpack_from(self._map, 0)
+        if magic != GAZETTEER_MAGIC or version != GAZETTEER_VERSION:
+            self.close()
+            raise ValueError(f"Índice de ciudades no válido: {self.index_path}")
+
+    def close(self):
+        """Libera el mapeo del archivo"""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._top = None
+
+    def _key_at(self, index: int) -> bytes:
+        start = self.records_offset + index * _RECORD.size
+        return self._map[start:start + KEY_SIZE].rstrip(b'\0')
+
+    def _lower_bound(self, prefix: bytes) -> int:
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key_at(mid) < prefix:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _upper_bound(self, prefix: bytes) -> int:
+        """Primer registro posterior a todos los que empiezan por prefix"""
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key_at(mid)[:len(prefix)] <= prefix:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def _record(self, index: int) -> Dict:
+        _, geonameid, population, lat, lon, offset = _RECORD.unpack_from(
+            self._map, self.records_offset + index * _RECORD.size)
+        start = self.strings_offset + offset
+        (length,) = _TEXT_LENGTH.unpack_from(self._map, start)
+        start += _TEXT_LENGTH.size
+        name, country, admin1 = self._map[start:start + length].decode('utf-8').split('\t')
+        return {
+            "name": name,
+            "country": country,
+            "admin1": admin1,
+            "lat": round(lat, 5),
+            "lon": round(lon, 5),
+            "population": population,
+            "geonameid": geonameid,
+        }
+
+    def _top_for_prefix(self, prefix: bytes) -> List[int]:
+        """Índices precalculados de los registros más poblados para un prefijo corto"""
+        if self._top is None:
+            self._top = {}
+            for i in range(self.top_count):
+                key, length, *ranked = _TOP_ENTRY.unpack_from(self._map, self.top_offset + i * _TOP_ENTRY.size)
+                self._top[key[:length]] = [index for index in ranked if index >= 0]
+        return self._top.get(prefix, [])
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Ciudades cuyo nombre empieza por query (sin distinguir tildes), las más pobladas primero"""
+        self._open()
+        prefix = _key_bytes(query)
+        if not prefix or limit <= 0:
+            return []
+
+        if len(prefix) <= TOP_PREFIX_BYTES:
+            ranked = self._top_for_prefix(prefix)
+        else:
+            # Se recorre todo el rango del prefijo: cortar por orden alfabético dejaría
+            # fuera a las ciudades grandes que ordenan tarde ("sant" -> "santo domingo")
+            best = {}  # geonameid -> (población, -índice) del mejor registro
+            for index in range(self._lower_bound(prefix), self._upper_bound(prefix)):
+                _, geonameid, population, *_rest = _RECORD.unpack_from(
+                    self._map, self.records_offset + index * _RECORD.size)
+                entry = (population, -index)
+                if entry > best.get(geonameid, (-1, 0)):
+                    best[geonameid] = entry
+            ranked = [-index for _, index in heapq.nlargest(limit, best.values())]
+
+        # Una ciudad puede aparecer con varios nombres
+        results = []
+        seen = set()
+        for index in ranked:
+            record = self._record(index)
+            if record["geonameid"] in seen:
+                continue
+            seen.add(record["geonameid"])
+            results.append(record)
+            if len(results) >= limit:
+                break
+        return results
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 3 and argv[0] == 'build':
+        min_population = int(argv[3]) if len(argv) > 3 else 0
+        build_index(argv[1], argv[2], min_population=min_population)
+    elif len(argv) >= 3 and argv[0] == 'search':
+        for result in Gazetteer(argv[1]).search(' '.join(argv[2:])):
+            print(f"{result['name']}, {result['admin1']} ({result['country']}) "
+                  f"{result['lat']}, {result['lon']} - {result['population']} hab.")
+    else:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    main()
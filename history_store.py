@@ -0,0 +1,217 @@
+import math
+import sys
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from forecast_model import NO_CODE, NO_TIME
+from instrumentation import error, info
+
+HOURS_PER_DAY = 24
+MISSING = float('nan')
+_EPOCH = datetime(1970, 1, 1)
+
+
+def location_key(lat: float, lon: float) -> str:
+    """Clave de ubicación usada por el histórico"""
+    return f"{float(lat):.4f},{float(lon):.4f}"
+
+
+def pack_day(values) -> bytes:
+    """Empaqueta 24 valores horarios como float32 little-endian"""
+    packed = array('f', values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_day(blob: bytes) -> array:
+    """Desempaqueta un día almacenado con pack_day"""
+    values = array('f')
+    values.frombytes(blob)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class HistoryStore:
+    """Histórico compacto de observaciones: un blob de 24 valores por ubicación, variable y día"""
+
+    def __init__(self, db_manager, raw_retention_days: int = 30, retention_days: int = 730):
+        self.db_manager = db_manager
+        self.raw_retention_days = raw_retention_days
+        self.retention_days = retention_days
+        self._last_maintenance = None
+        self._maintenance_lock = threading.Lock()
+
+    def ingest(self, lat: float, lon: float, data: Dict):
+        """Guarda las condiciones actuales y los arreglos horarios de una respuesta exitosa"""
+        if not data.get('success'):
+            return
+
+        slots = {}  # (variable, día) -> {hora: valor}
+        self._collect_hourly(data.get('hourly', {}), slots)
+        self._collect_current(data.get('current', {}), slots)
+        self._write_slots(lat, lon, slots)
+
+    def ingest_forecast(self, lat: float, lon: float, forecast):
+        """Igual que ingest(), pero leyendo directamente los arreglos de un Forecast"""
+        if not forecast.success:
+            return
+
+        slots = {}
+        hourly = forecast.hourly
+        # Día y hora se calculan una sola vez por posición, no por variable
+        moments = [None if seconds == NO_TIME else _EPOCH + timedelta(seconds=seconds) for seconds in hourly.time]
+        for variable, series in hourly.variables.items():
+            if isinstance(series, tuple) or series.typecode == 'q':
+                continue
+            is_code = series.typecode == 'b'
+            for moment, value in zip(moments, series):
+                if moment is None or (value == NO_CODE if is_code else math.isnan(value)):
+                    continue
+                slots.setdefault((variable, moment.date().isoformat()), {})[moment.hour] = float(value)
+        self._collect_current(forecast.current.to_dict(), slots)
+        self._write_slots(lat, lon, slots)
+
+    def _write_slots(self, lat: float, lon: float, slots: Dict):
+        if not slots:
+            return
+
+        location = location_key(lat, lon)
+        with self.db_manager.transaction(immediate=True) as conn:
+            for (variable, day), hours in slots.items():
+                row = conn.execute('''
+                    SELECT hour_values FROM observation_days
+                    WHERE location = ? AND variable = ? AND day = ?
+                ''', (location, variable, day)).fetchone()
+
+                values = unpack_day(row[0]) if row else array('f', [MISSING] * HOURS_PER_DAY)
+                for hour, value in hours.items():
+                    values[hour] = value
+
+                conn.execute('''
+                    INSERT OR REPLACE INTO observation_days (location, variable, day, hour_values)
+                    VALUES (?, ?, ?, ?)
+                ''', (location, variable, day, pack_day(values)))
+
+        self._maybe_run_maintenance()
+
+    def _collect_hourly(self, hourly: Dict, slots: Dict):
+        times = hourly.get('time') or []
+        for variable, series in hourly.items():
+            if variable == 'time' or not isinstance(series, list):
+                continue
+            for time_str, value in zip(times, series):
+                self._add_slot(slots, variable, time_str, value)
+
+    def _collect_current(self, current: Dict, slots: Dict):
+        time_str = current.get('time')
+        if not time_str:
+            return
+        for variable, value in current.items():
+            if variable not in ('time', 'interval'):
+                self._add_slot(slots, f"current.{variable}", time_str, value)
+
+    @staticmethod
+    def _add_slot(slots: Dict, variable: str, time_str, value):
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return
+        try:
+            moment = datetime.fromisoformat(str(time_str).replace('Z', '+00:00'))
+        except ValueError:
+            return
+        slots.setdefault((variable, moment.date().isoformat()), {})[moment.hour] = float(value)
+
+    def query(self, lat: float, lon: float, variable: str,
+              start_day: date, end_day: date) -> List[Tuple[str, float]]:
+        """Devuelve los valores horarios de un rango de días (ambos inclusive)"""
+        with self.db_manager.transaction() as conn:
+            rows = conn.execute('''
+                SELECT day, hour_values FROM observation_days
+                WHERE location = ? AND variable = ? AND day BETWEEN ? AND ?
+                ORDER BY day
+            ''', (location_key(lat, lon), variable, start_day.isoformat(), end_day.isoformat())).fetchall()
+
+        series = []
+        for day, blob in rows:
+            for hour, value in enumerate(unpack_day(blob)):
+                if not math.isnan(value):
+                    series.append((f"{day}T{hour:02d}:00", value))
+        return series
+
+    def query_daily(self, lat: float, lon: float, variable: str,
+                    start_day: date, end_day: date) -> List[Dict]:
+        """Devuelve agregados diarios (min/max/media), ya estén reducidos o aún en detalle horario"""
+        location = location_key(lat, lon)
+        params = (location, variable, start_day.isoformat(), end_day.isoformat())
+
+        daily = {}
+        with self.db_manager.transaction() as conn:
+            for day, minimum, maximum, mean, samples in conn.execute('''
+                SELECT day, min_value, max_value, mean_value, samples FROM observation_daily
+                WHERE location = ? AND variable = ? AND day BETWEEN ? AND ?
+            ''', params):
+                daily[day] = {"day": day, "min": minimum, "max": maximum, "mean": mean, "samples": samples}
+
+            # Los días recientes aún están en detalle horario
+            for day, blob in conn.execute('''
+                SELECT day, hour_values FROM observation_days
+                WHERE location = ? AND variable = ? AND day BETWEEN ? AND ?
+            ''', params):
+                aggregate = self._aggregate(blob)
+                if aggregate:
+                    daily[day] = {"day": day, **aggregate}
+
+        return [daily[day] for day in sorted(daily)]
+
+    @staticmethod
+    def _aggregate(blob: bytes) -> Optional[Dict]:
+        values = [v for v in unpack_day(blob) if not math.isnan(v)]
+        if not values:
+            return None
+        return {"min": min(values), "max": max(values),
+                "mean": sum(values) / len(values), "samples": len(values)}
+
+    def _maybe_run_maintenance(self):
+        """Ejecuta la reducción y la retención como máximo una vez al día"""
+        today = date.today()
+        with self._maintenance_lock:
+            if self._last_maintenance == today:
+                return
+            self._last_maintenance = today
+        try:
+            self.run_maintenance(today)
+        except Exception as e:
+            error(f"Error en mantenimiento del histórico: {e}")
+
+    def run_maintenance(self, today: Optional[date] = None):
+        """Reduce a agregados diarios los días antiguos y aplica la retención"""
+        today = today or date.today()
+        raw_cutoff = (today - timedelta(days=self.raw_retention_days)).isoformat()
+        retention_cutoff = (today - timedelta(days=self.retention_days)).isoformat()
+
+        with self.db_manager.transaction(immediate=True) as conn:
+            old_rows = conn.execute('''
+                SELECT location, variable, day, hour_values FROM observation_days
+                WHERE day < ?
+            ''', (raw_cutoff,)).fetchall()
+
+            aggregates = []
+            for location, variable, day, blob in old_rows:
+                aggregate = self._aggregate(blob)
+                if aggregate and day >= retention_cutoff:
+                    aggregates.append((location, variable, day, aggregate["min"], aggregate["max"],
+                                       aggregate["mean"], aggregate["samples"]))
+
+            conn.executemany('''
+                INSERT OR REPLACE INTO observation_daily
+                    (location, variable, day, min_value, max_value, mean_value, samples)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', aggregates)
+            conn.execute('DELETE FROM observation_days WHERE day < ?', (raw_cutoff,))
+            conn.execute('DELETE FROM observation_daily WHERE day < ?', (retention_cutoff,))
+
+        if old_rows:
+            info(f"Histórico: {len(old_rows)} días reducidos a agregados diarios")
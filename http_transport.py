@@ -0,0 +1,139 @@
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import OPEN, CircuitOpenError
+from instrumentation import count, span, warning
+
+try:
+    import brotli  # noqa: F401  (urllib3 lo usa para descomprimir "br")
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = "gzip, deflate, br"
+    except ImportError:
+        ACCEPT_ENCODING = "gzip, deflate"
+
+
+class HttpTransport:
+    """Transporte HTTP con sesión persistente, compresión y reintentos con backoff"""
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, max_retry_after=30, pool_size=8, session=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.session = session or self._create_session(pool_size)
+
+    def _create_session(self, pool_size):
+        """Crea una sesión con pool de conexiones keep-alive"""
+        session = requests.Session()
+        # Los reintentos los gestiona get() para poder respetar Retry-After
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers.update({
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "Accept": "application/json",
+            "Connection": "keep-alive",
+        })
+        return session
+
+    def get(self, url, params=None, stream=False, breaker=None):
+        """Hace una petición GET reintentando los errores transitorios.
+
+        Con stream=True el cuerpo no se descarga de inmediato: se lee con
+        response.iter_content() y el llamador debe cerrar la respuesta.
+
+        Con breaker (CircuitBreaker) cada intento, reintentos incluidos, pasa por el circuito:
+        si está abierto (también si lo acaba de abrir un intento) se lanza CircuitOpenError sin
+        esperar el backoff, los errores de red, 429 y 5xx cuentan como fallo, y cualquier otra
+        respuesta (también 4xx) como éxito con la latencia de ese intento.
+        """
+        attempt = 0
+        while True:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(f"Circuito abierto, próximo intento en {breaker.retry_in():.0f}s")
+            started = time.monotonic()
+            try:
+                with span("http.request"):
+                    response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                count("http.network_errors")
+                if breaker is not None:
+                    breaker.record_failure()
+                if attempt >= self.max_retries:
+                    count("http.failures")
+                    raise
+                delay = self._backoff_delay(attempt)
+                warning(f"Error de red ({e}), reintento {attempt + 1} en {delay:.2f}s")
+            else:
+                count(f"http.status.{response.status_code}")
+                if breaker is not None:
+                    if response.status_code in self.RETRY_STATUS:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success(time.monotonic() - started)
+                if response.status_code not in self.RETRY_STATUS or attempt >= self.max_retries:
+                    if response.status_code >= 400:
+                        count("http.failures")
+                    return response
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff_delay(attempt)
+                elif delay > self.max_retry_after:
+                    # El servidor pide esperar demasiado; no bloquear al llamador
+                    count("http.failures")
+                    return response
+                warning(f"HTTP {response.status_code}, reintento {attempt + 1} en {delay:.2f}s")
+                response.close()
+
+            if breaker is not None and breaker.state == OPEN:
+                # El fallo abrió el circuito: el reintento se rechazaría, no tiene sentido esperarlo
+                count("http.failures")
+                raise CircuitOpenError(f"Circuito abierto, próximo intento en {breaker.retry_in():.0f}s")
+            count("http.retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def get_json(self, url, params=None):
+        """Hace una petición GET y devuelve el cuerpo JSON, o lanza un error HTTP"""
+        response = self.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def _backoff_delay(self, attempt):
+        """Backoff exponencial con jitter completo"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        """Interpreta la cabecera Retry-After (segundos o fecha HTTP)"""
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            if retry_at.tzinfo is None:
+                retry_at = retry_at.replace(tzinfo=timezone.utc)
+            delay = (retry_at - datetime.now(timezone.utc)).total_seconds()
+
+        return max(delay, 0)
+
+    def close(self):
+        """Cierra las conexiones del pool"""
+        self.session.close()
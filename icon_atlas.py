@@ -0,0 +1,237 @@
+"""Atlas de iconos rasterizados a partir de los SVG de assets/.
+
+Construir (una vez, o cuando cambien los SVG; requiere cairosvg y Pillow):
+    python icon_atlas.py build [assets] [assets/atlas] [densidades...]
+
+Por cada densidad se genera icons@<d>x.png (todos los iconos en una cuadrícula) y
+icons@<d>x.atlas, un índice JSON en el formato de atlas de Kivy
+({"icons@2x.png": {"wi-day-sunny": [x, y, ancho, alto]}}, con y medido desde abajo),
+de modo que la interfaz puede usar directamente "atlas://assets/atlas/icons@2x/wi-day-sunny".
+Si los SVG no han cambiado desde la última construcción, el atlas existente se reutiliza.
+
+En tiempo de ejecución IconAtlas recorta los iconos de la hoja ya decodificada y los guarda
+en una caché LRU, así que desplazar filas horarias no vuelve a leer ni rasterizar SVG.
+"""
+import json
+import math
+import os
+import sys
+from collections import OrderedDict
+from io import BytesIO
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import weather_codes
+from instrumentation import count, info, warning
+
+try:
+    import cairosvg
+except (ImportError, OSError):  # OSError: falta la biblioteca nativa de cairo
+    cairosvg = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+BASE_SIZE = 48  # Lado del icono en píxeles a densidad 1x (mdpi)
+DENSITIES = (1.0, 1.5, 2.0, 3.0)  # mdpi, hdpi, xhdpi, xxhdpi
+PADDING = 1  # Separación entre iconos para evitar sangrado al escalar
+ATLAS_DIR = os.path.join("assets", "atlas")
+
+
+def atlas_name(density: float) -> str:
+    """Nombre base del atlas para una densidad: 2.0 -> 'icons@2x', 1.5 -> 'icons@1.5x'"""
+    return f"icons@{density:g}x"
+
+
+def pick_density(scale: float, densities: Sequence[float] = DENSITIES) -> float:
+    """Menor densidad disponible que cubre la escala de pantalla (o la mayor si ninguna basta)"""
+    candidates = [density for density in sorted(densities) if density >= scale]
+    return candidates[0] if candidates else max(densities)
+
+
+def _svg_path(assets_dir: str, name: str) -> str:
+    return os.path.join(assets_dir, f"{name}.svg")
+
+
+def _rasterize(path: str, size: int):
+    """Rasteriza un SVG a una imagen RGBA de size x size"""
+    png = cairosvg.svg2png(url=path, output_width=size, output_height=size)
+    image = Image.open(BytesIO(png))
+    image.load()
+    return image.convert("RGBA")
+
+
+def _is_current(index_path: str, sheet_path: str, names: List[str], sources: List[str]) -> bool:
+    """True si el atlas existente contiene los mismos iconos y es más reciente que sus SVG"""
+    if not (os.path.exists(index_path) and os.path.exists(sheet_path)):
+        return False
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        built_at = min(os.path.getmtime(index_path), os.path.getmtime(sheet_path))
+    except (OSError, ValueError):
+        return False
+    packed = set()
+    for rects in index.values():
+        packed.update(rects)
+    return packed == set(names) and all(os.path.getmtime(path) <= built_at for path in sources)
+
+
+def build_atlas(assets_dir: str = "assets", out_dir: str = ATLAS_DIR,
+                densities: Iterable[float] = DENSITIES, names: Optional[Iterable[str]] = None,
+                force: bool = False) -> Dict[float, str]:
+    """Genera una hoja de iconos por densidad; devuelve {densidad: ruta del índice .atlas}.
+
+    Por defecto solo incluye los iconos que pueden devolver las tablas de weather_codes.
+    """
+    if cairosvg is None or Image is None:
+        warning("⚠️ Para construir el atlas de iconos hacen falta cairosvg y Pillow")
+        return {}
+
+    names = sorted(set(weather_codes.icon_names() if names is None else names))
+    missing = [name for name in names if not os.path.exists(_svg_path(assets_dir, name))]
+    if missing:
+        warning("⚠️ Iconos sin SVG en assets, se omiten del atlas", missing=",".join(missing))
+        names = [name for name in names if name not in missing]
+    sources = [_svg_path(assets_dir, name) for name in names]
+    os.makedirs(out_dir, exist_ok=True)
+
+    columns = max(1, math.ceil(math.sqrt(len(names))))
+    rows = max(1, math.ceil(len(names) / columns))
+    built = {}
+    for density in densities:
+        base = atlas_name(density)
+        sheet_name = f"{base}.png"
+        index_path = os.path.join(out_dir, f"{base}.atlas")
+        sheet_path = os.path.join(out_dir, sheet_name)
+        built[density] = index_path
+        if not force and _is_current(index_path, sheet_path, names, sources):
+            info(f"✅ Atlas {base} al día, se reutiliza")
+            continue
+
+        size = round(BASE_SIZE * density)
+        cell = size + 2 * PADDING
+        sheet = Image.new("RGBA", (columns * cell, rows * cell), (0, 0, 0, 0))
+        rects = {}
+        for position, (name, path) in enumerate(zip(names, sources)):
+            x = (position % columns) * cell + PADDING
+            y = (position // columns) * cell + PADDING
+            sheet.paste(_rasterize(path, size), (x, y))
+            # Kivy mide y desde el borde inferior de la hoja
+            rects[name] = [x, sheet.height - y - size, size, size]
+
+        sheet.save(sheet_path, optimize=True)
+        temporary = f"{index_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({sheet_name: rects}, f, sort_keys=True)
+        os.replace(temporary, index_path)
+        info(f"🖼️ Atlas {base} generado", icons=len(rects), size=f"{sheet.width}x{sheet.height}")
+    return built
+
+
+class IconAtlas:
+    """Iconos decodificados de un atlas, con caché LRU; rasteriza el SVG si el atlas no existe"""
+
+    def __init__(self, density: float = 1.0, atlas_dir: str = ATLAS_DIR, assets_dir: str = "assets",
+                 max_entries: int = 64):
+        self.density = density
+        self.size = round(BASE_SIZE * density)
+        self.atlas_dir = atlas_dir
+        self.assets_dir = assets_dir
+        self.max_entries = max_entries
+        self._rects = None  # nombre -> (hoja, x, y, ancho, alto), con y medido desde abajo (Kivy)
+        self._sheets = {}  # archivo -> imagen de la hoja ya decodificada
+        self._images = OrderedDict()  # nombre -> imagen recortada
+        self._lock = Lock()
+
+    @staticmethod
+    def _name(icon: str) -> str:
+        """Acepta tanto 'wi-day-sunny' como 'wi-day-sunny.svg'"""
+        return icon[:-4] if icon.endswith(".svg") else icon
+
+    def _load_index(self) -> Dict:
+        if self._rects is not None:
+            return self._rects
+        rects = {}
+        index_path = os.path.join(self.atlas_dir, f"{atlas_name(self.density)}.atlas")
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        for sheet_name, entries in index.items():
+            for name, (x, y, width, height) in entries.items():
+                rects[name] = (sheet_name, x, y, width, height)
+        self._rects = rects
+        return rects
+
+    def _sheet(self, sheet_name: str):
+        sheet = self._sheets.get(sheet_name)
+        if sheet is None:
+            sheet = Image.open(os.path.join(self.atlas_dir, sheet_name))
+            sheet.load()
+            self._sheets[sheet_name] = sheet
+        return sheet
+
+    def _decode(self, name: str):
+        rect = self._load_index().get(name)
+        if rect is not None:
+            sheet_name, x, y, width, height = rect
+            sheet = self._sheet(sheet_name)
+            top = sheet.height - y - height
+            count("icons.atlas")
+            return sheet.crop((x, top, x + width, top + height))
+
+        path = _svg_path(self.assets_dir, name)
+        if cairosvg is None or not os.path.exists(path):
+            return None
+        count("icons.rasterized")
+        return _rasterize(path, self.size)
+
+    def get(self, icon: str):
+        """Imagen RGBA (PIL) del icono, o None si no está disponible"""
+        if Image is None:
+            return None
+        name = self._name(icon)
+        with self._lock:
+            image = self._images.get(name)
+            if image is not None:
+                self._images.move_to_end(name)
+                count("icons.hits")
+                return image
+
+            image = self._decode(name)
+            if image is None:
+                return None
+            self._images[name] = image
+            while len(self._images) > self.max_entries:
+                self._images.popitem(last=False)
+            return image
+
+    def for_code(self, weather_code, is_day=True):
+        """Imagen del icono correspondiente a un código WMO"""
+        return self.get(weather_codes.icon_file(weather_code, is_day))
+
+    def clear(self):
+        """Libera las imágenes decodificadas (el índice se vuelve a leer en el próximo acceso)"""
+        with self._lock:
+            self._images.clear()
+            self._sheets.clear()
+            self._rects = None
+
+
+def main(argv: Optional[List[str]] = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'build':
+        assets_dir = argv[1] if len(argv) > 1 else "assets"
+        out_dir = argv[2] if len(argv) > 2 else os.path.join(assets_dir, "atlas")
+        densities = [float(value) for value in argv[3:]] or DENSITIES
+        build_atlas(assets_dir, out_dir, densities)
+    else:
+        print(__doc__)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""Registro por niveles y métricas ligeras (contadores, histogramas de latencia y spans).
+
+Configuración por variables de entorno:
+    WEATHER_LOG_LEVEL=DEBUG|INFO|WARNING|ERROR|OFF   (por defecto INFO; WARNING en Android)
+    WEATHER_METRICS=1                                 activa contadores, histogramas y spans
+    WEATHER_METRICS_PORT=9464                         expone /metrics por HTTP (solo localhost)
+    WEATHER_METRICS_FILE=metrics.json                 vuelca las métricas periódicamente
+    WEATHER_METRICS_INTERVAL=60                       segundos entre volcados
+
+Con las métricas desactivadas, span() devuelve un objeto vacío compartido y
+count()/observe() retornan tras comprobar una sola variable global.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+DEBUG, INFO, WARNING, ERROR, OFF = 10, 20, 30, 40, 100
+_LEVEL_NAMES = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR, "OFF": OFF}
+
+# Límites superiores (segundos) de los intervalos de los histogramas de latencia
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _default_level():
+    name = os.environ.get("WEATHER_LOG_LEVEL", "").upper()
+    if name in _LEVEL_NAMES:
+        return _LEVEL_NAMES[name]
+    return WARNING if 'ANDROID_ARGUMENT' in os.environ else INFO
+
+
+_level = _default_level()
+_enabled = os.environ.get("WEATHER_METRICS", "") not in ("", "0", "false")
+_sink = print
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_exporters_started = False
+
+
+def configure(level=None, enabled=None, sink=None):
+    """Cambia el nivel de registro, activa/desactiva métricas o redirige la salida de log()"""
+    global _level, _enabled, _sink
+    if level is not None:
+        _level = _LEVEL_NAMES[level.upper()] if isinstance(level, str) else level
+    if enabled is not None:
+        _enabled = enabled
+    if sink is not None:
+        _sink = sink
+
+
+def is_enabled():
+    return _enabled
+
+
+def log(level, message, **fields):
+    """Escribe el mensaje si supera el nivel configurado; los campos se añaden como clave=valor"""
+    if level < _level:
+        return
+    if fields:
+        message = message + " " + " ".join(f"{key}={value}" for key, value in fields.items())
+    _sink(message)
+    if _enabled and level >= WARNING:
+        count("log.errors" if level >= ERROR else "log.warnings")
+
+
+def debug(message, **fields):
+    if DEBUG >= _level:
+        log(DEBUG, message, **fields)
+
+
+def info(message, **fields):
+    if INFO >= _level:
+        log(INFO, message, **fields)
+
+
+def warning(message, **fields):
+    log(WARNING, message, **fields)
+
+
+def error(message, **fields):
+    log(ERROR, message, **fields)
+
+
+class Histogram:
+    """Histograma de intervalos fijos: cuenta, suma, mínimo, máximo y percentiles aproximados"""
+
+    __slots__ = ("bounds", "buckets", "count", "total", "min", "max")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """Límite superior del intervalo donde cae el percentil p (0-100)"""
+        if not self.count:
+            return 0.0
+        target = p / 100 * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target and bucket:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip([str(bound) for bound in self.bounds] + ["+Inf"], self.buckets)),
+        }
+
+
+def count(name, value=1):
+    """Incrementa un contador"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name, seconds):
+    """Registra una duración (en segundos) en el histograma indicado"""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(seconds)
+
+
+class _Span:
+    __slots__ = ("name", "start", "failed")
+
+    def __init__(self, name):
+        self.name = name
+        self.failed = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start)
+        if exc_type is not None or self.failed:
+            count(self.name + ".errors")
+        return False
+
+    def fail(self):
+        """Marca el span como fallido sin lanzar excepción"""
+        self.failed = True
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def fail(self):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Mide la duración de un bloque: with span("http.get"): ..."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def timed(name):
+    """Decorador equivalente a envolver la función entera en span(name)"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """Copia de todas las métricas como diccionario serializable a JSON"""
+    with _lock:
+        return {
+            "timestamp": time.time(),
+            "counters": dict(_counters),
+            "histograms": {name: histogram.to_dict() for name, histogram in _histograms.items()},
+        }
+
+
+def reset():
+    """Borra todas las métricas acumuladas"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def dump(path):
+    """Escribe las métricas en un archivo JSON de forma atómica"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def start_periodic_dump(path, interval=60.0):
+    """Vuelca las métricas a path cada interval segundos en un hilo daemon; devuelve un Event para detenerlo"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            try:
+                dump(path)
+            except OSError as e:
+                warning(f"⚠️ Error volcando métricas: {e}")
+        try:
+            dump(path)
+        except OSError:
+            pass
+
+    threading.Thread(target=run, name="metrics-dump", daemon=True).start()
+    return stop
+
+
+def serve_metrics(port=0, host='127.0.0.1'):
+    """Expone GET /metrics (JSON) en un hilo daemon; devuelve el servidor (server.server_address da el puerto)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = json.dumps(snapshot()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_exporters_from_env():
+    """Arranca (una sola vez) los exportadores indicados por WEATHER_METRICS_PORT / WEATHER_METRICS_FILE"""
+    global _exporters_started
+    with _lock:
+        if _exporters_started or not _enabled:
+            return
+        _exporters_started = True
+    try:
+        port = os.environ.get("WEATHER_METRICS_PORT")
+        if port:
+            serve_metrics(int(port))
+        path = os.environ.get("WEATHER_METRICS_FILE")
+        if path:
+            start_periodic_dump(path, float(os.environ.get("WEATHER_METRICS_INTERVAL", 60)))
+    except (OSError, ValueError) as e:
+        warning(f"⚠️ No se pudieron iniciar los exportadores de métricas: {e}")
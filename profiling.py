@@ -0,0 +1,266 @@
+"""Perfilado opcional de los servicios de fondo: memoria (tracemalloc), CPU por hilo y muestreo de pilas.
+
+Se activa por variables de entorno (desactivado por defecto, sin costo alguno):
+    WEATHER_PROFILE=1                      arranca el perfilado periódico
+    WEATHER_PROFILE_INTERVAL=300           segundos entre informes
+    WEATHER_PROFILE_FILE=profile.json      vuelca el último informe (si no, solo se registra en el log)
+    WEATHER_PROFILE_SAMPLE=0.01            segundos entre muestras de pila (0 desactiva el muestreo)
+
+Cada informe incluye el RSS del proceso, las líneas cuya memoria más creció desde el informe
+anterior, el tiempo de CPU consumido por cada hilo y las funciones más vistas en las muestras.
+"""
+import gc
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from instrumentation import info, warning
+
+_active = None  # Profiler arrancado por start_profiling_from_env
+_start_lock = threading.Lock()
+
+
+def rss_bytes() -> int:
+    """Memoria residente actual del proceso (pico en sistemas sin /proc)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def object_counts(top: int = 10) -> Dict:
+    """Número total de objetos seguidos por el recolector y los tipos más numerosos (costoso)"""
+    objects = gc.get_objects()
+    by_type = Counter(type(obj).__name__ for obj in objects)
+    return {"total": len(objects), "top": dict(by_type.most_common(top))}
+
+
+def thread_cpu_times() -> Dict[str, float]:
+    """Segundos de CPU consumidos por cada hilo vivo (Linux/Android); vacío si no está disponible"""
+    if not hasattr(time, "pthread_getcpuclockid"):
+        return {}
+    times = {}
+    for thread in threading.enumerate():
+        try:
+            clock = time.pthread_getcpuclockid(thread.ident)
+            times[thread.name] = time.clock_gettime(clock)
+        except (OSError, TypeError, ValueError):
+            continue  # El hilo terminó entre enumerate() y la consulta
+    return times
+
+
+class MemoryTracker:
+    """Snapshots periódicos de tracemalloc comparados con el anterior"""
+
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),  # Las propias estructuras del perfilador
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, frames: int = 1, top: int = 10):
+        self.frames = frames
+        self.top = top
+        self._previous = None
+        self._baseline = None
+        self._owns_tracing = False  # Solo se detiene tracemalloc si lo arrancó este tracker
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._owns_tracing = True
+        self._baseline = self._previous = self._take()
+
+    def stop(self):
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+        self._previous = self._baseline = None
+
+    def _take(self):
+        return tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    def diff(self, since_start: bool = False) -> List[Dict]:
+        """Líneas con mayor crecimiento desde el snapshot anterior (o desde start())"""
+        if not tracemalloc.is_tracing():
+            self.start()
+            return []
+        current = self._take()
+        reference = self._baseline if since_start else self._previous
+        self._previous = current
+        stats = current.compare_to(reference, "lineno")
+        growing = [stat for stat in stats if stat.size_diff > 0][:self.top]
+        return [{
+            "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff": stat.size_diff,
+            "size": stat.size,
+            "count_diff": stat.count_diff,
+        } for stat in growing]
+
+    def traced(self) -> int:
+        """Bytes asignados actualmente según tracemalloc"""
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+class ThreadSampler:
+    """Perfilador por muestreo: cada interval segundos mira la pila de todos los hilos.
+
+    Cuenta la función que se está ejecutando en cada hilo y llama a hook(nombre_hilo, frame),
+    si se indica, para conectar otro perfilador o registrar pilas completas.
+    """
+
+    def __init__(self, interval: float = 0.01, hook: Optional[Callable] = None, top: int = 10):
+        self.interval = interval
+        self.hook = hook
+        self.top = top
+        self.samples = 0
+        self._counts = {}  # nombre del hilo -> Counter de "archivo:línea función"
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                self.samples += 1
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    name = names.get(ident, str(ident))
+                    code = frame.f_code
+                    where = f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"
+                    self._counts.setdefault(name, Counter())[where] += 1
+                    if self.hook is not None:
+                        try:
+                            self.hook(name, frame)
+                        except Exception as e:
+                            warning(f"⚠️ Error en el hook de muestreo: {e}")
+                            self.hook = None
+            del frames
+
+    def report(self, reset: bool = True) -> Dict[str, Dict[str, int]]:
+        """Funciones más vistas por hilo desde el último informe"""
+        with self._lock:
+            result = {name: dict(counts.most_common(self.top)) for name, counts in self._counts.items()}
+            if reset:
+                self._counts = {}
+        return result
+
+
+class Profiler:
+    """Informes periódicos de memoria y CPU en un hilo daemon"""
+
+    def __init__(self, interval: float = 300.0, path: Optional[str] = None, sample_interval: float = 0.01,
+                 hook: Optional[Callable] = None, top: int = 10):
+        self.interval = interval
+        self.path = path
+        self.memory = MemoryTracker(top=top)
+        self.sampler = ThreadSampler(sample_interval, hook, top) if sample_interval > 0 else None
+        self._cpu_before = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self.memory.start()
+        self._cpu_before = thread_cpu_times()
+        if self.sampler is not None:
+            self.sampler.start()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detiene los hilos y tracemalloc; start_profiling_from_env() puede volver a arrancarlo"""
+        global _active
+        self._stop.set()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        self.memory.stop()
+        with _start_lock:
+            if _active is self:
+                _active = None
+
+    def report(self) -> Dict:
+        """Informe desde el anterior: RSS, crecimiento de memoria, CPU por hilo y muestras"""
+        cpu = thread_cpu_times()
+        cpu_delta = {name: seconds - self._cpu_before.get(name, 0.0) for name, seconds in cpu.items()}
+        self._cpu_before = cpu
+        return {
+            "timestamp": time.time(),
+            "rss_bytes": rss_bytes(),
+            "traced_bytes": self.memory.traced(),
+            "memory_growth": self.memory.diff(),
+            "thread_cpu_seconds": dict(sorted(cpu_delta.items(), key=lambda item: -item[1])),
+            "samples": self.sampler.report() if self.sampler is not None else {},
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                report = self.report()
+                self._publish(report)
+            except Exception as e:
+                warning(f"⚠️ Error generando el informe de perfilado: {e}")
+
+    def _publish(self, report: Dict):
+        busiest = next(iter(report["thread_cpu_seconds"].items()), ("-", 0.0))
+        growth = report["memory_growth"][0]["where"] if report["memory_growth"] else "-"
+        info("📈 Perfil", rss_mb=f"{report['rss_bytes'] / 1048576:.1f}",
+             cpu_thread=f"{busiest[0]}:{busiest[1]:.2f}s", top_growth=growth)
+        if self.path:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def start_profiling_from_env() -> Optional[Profiler]:
+    """Arranca (una sola vez) el perfilado indicado por WEATHER_PROFILE; devuelve el Profiler o None"""
+    global _active
+    if os.environ.get("WEATHER_PROFILE", "") in ("", "0", "false"):
+        return None
+    try:
+        profiler = Profiler(
+            interval=float(os.environ.get("WEATHER_PROFILE_INTERVAL", 300)),
+            path=os.environ.get("WEATHER_PROFILE_FILE") or None,
+            sample_interval=float(os.environ.get("WEATHER_PROFILE_SAMPLE", 0.01)),
+        )
+    except ValueError as e:
+        warning(f"⚠️ Configuración de perfilado inválida: {e}")
+        return None
+    with _start_lock:
+        if _active is not None:
+            return None
+        _active = profiler
+    profiler.start()
+    info("📈 Perfilado activado", interval=profiler.interval)
+    return profiler
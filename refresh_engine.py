@@ -0,0 +1,164 @@
+import os
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+
+from instrumentation import error
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución"""
+
+    def __init__(self):
+        self._in_flight = {}  # key -> Future
+        self._lock = Lock()
+
+    def do(self, key, fn: Callable):
+        """Ejecuta fn una sola vez por clave; los demás llamadores esperan el mismo resultado"""
+        with self._lock:
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def in_flight(self) -> int:
+        """Número de claves que se están ejecutando en este momento"""
+        with self._lock:
+            return len(self._in_flight)
+
+
+class InterProcessLock:
+    """Exclusión por clave entre procesos que comparten un directorio de bloqueos.
+
+    Cada clave se asigna a uno de stripes archivos y se bloquea con fcntl.flock. flock
+    pertenece al descriptor abierto, no al hilo, así que cada franja lleva además un Lock
+    para que dos hilos del mismo proceso tampoco la compartan. Solo en sistemas POSIX:
+    en otros, el constructor lanza ImportError.
+    """
+
+    def __init__(self, path: str, stripes: int = 32):
+        import fcntl
+        self._fcntl = fcntl
+        self.path = path
+        self.stripes = stripes
+        os.makedirs(path, exist_ok=True)
+        self._fds = [os.open(os.path.join(path, f"{index}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                     for index in range(stripes)]
+        self._locks = [Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def hold(self, key: str):
+        """Bloquea la clave hasta salir del bloque with"""
+        stripe = zlib.crc32(key.encode('utf-8')) % self.stripes
+        with self._locks[stripe]:
+            self._fcntl.flock(self._fds[stripe], self._fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                self._fcntl.flock(self._fds[stripe], self._fcntl.LOCK_UN)
+
+    def close(self):
+        for fd in self._fds:
+            os.close(fd)
+
+
+class RefreshEngine:
+    """Refresca varias ciudades en paralelo con un límite de concurrencia"""
+
+    def __init__(self, weather_service, max_concurrency: int = 8):
+        self.weather_service = weather_service
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="weather-refresh")
+        self._in_flight = {}  # location_name -> Future
+        self._lock = Lock()
+
+    def submit(self, location_name: str) -> Future:
+        """Programa el refresco de una ciudad; reutiliza el que ya esté en curso"""
+        with self._lock:
+            future = self._in_flight.get(location_name)
+            if future is not None:
+                return future
+
+            future = self._executor.submit(self.weather_service.refresh_weather_data, location_name)
+            self._in_flight[location_name] = future
+
+        future.add_done_callback(lambda f: self._forget(location_name, f))
+        return future
+
+    def _forget(self, location_name: str, future: Future):
+        """Quita un refresco terminado de la tabla de peticiones en curso"""
+        with self._lock:
+            if self._in_flight.get(location_name) is future:
+                del self._in_flight[location_name]
+
+    def _submit_many(self, location_names: Optional[List[str]]) -> Dict[str, Future]:
+        if location_names is None:
+            location_names = self.weather_service.get_all_locations()
+        return {name: self.submit(name) for name in location_names}
+
+    def refresh_many(self, location_names: Optional[List[str]] = None,
+                     timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """Refresca las ciudades indicadas (o todas) y espera los resultados"""
+        futures = self._submit_many(location_names)
+        wait(futures.values(), timeout=timeout)
+        return {name: self._result_or_default(future) for name, future in futures.items()}
+
+    async def refresh_async(self, location_names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """Versión awaitable de refresh_many"""
+        import asyncio  # Quien llama ya tiene un bucle de eventos; no penalizar el arranque
+        futures = self._submit_many(location_names)
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in futures.values()), return_exceptions=True)
+        return {name: self._result_or_default(future) for name, future in futures.items()}
+
+    def refresh_with_callback(self, location_names: Optional[List[str]], callback: Callable,
+                              on_complete: Optional[Callable] = None) -> Dict[str, Future]:
+        """Refresca sin bloquear; llama a callback(ciudad, datos) a medida que llegan los resultados"""
+        futures = self._submit_many(location_names)
+        pending = [len(futures)]
+        pending_lock = Lock()
+
+        def done(name, future):
+            try:
+                callback(name, self._result_or_default(future))
+            except Exception as e:
+                error(f"Error en callback de refresco para {name}: {e}")
+            finally:
+                with pending_lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished and on_complete is not None:
+                    on_complete()
+
+        if not futures and on_complete is not None:
+            on_complete()
+
+        for name, future in futures.items():
+            future.add_done_callback(lambda f, name=name: done(name, f))
+        return futures
+
+    def _result_or_default(self, future: Future) -> Dict:
+        """Devuelve el resultado de un refresco o los datos por defecto si falló o no terminó"""
+        if future.done() and not future.cancelled() and future.exception() is None:
+            return future.result()
+        return self.weather_service.get_default_data()
+
+    def shutdown(self, wait: bool = True):
+        """Detiene el pool de trabajadores"""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,340 @@
+import heapq
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from instrumentation import count, error, info
+
+
+class TokenBucket:
+    """Cubo de fichas: permite ráfagas de hasta capacity y se rellena a rate fichas por segundo"""
+
+    def __init__(self, capacity: float, rate: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.rate = rate
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def take(self, tokens: float):
+        self._refill()
+        self._tokens -= tokens
+
+    def time_until(self, tokens: float = 1) -> float:
+        """Segundos hasta que haya tokens fichas disponibles"""
+        missing = tokens - self.available()
+        return max(0.0, missing / self.rate) if self.rate > 0 else math.inf
+
+
+class RequestBudget:
+    """Límite global de peticiones a la API por minuto y por día"""
+
+    def __init__(self, per_minute: int = 10, per_day: int = 5000, clock: Callable[[], float] = time.monotonic):
+        self._buckets = (
+            TokenBucket(per_minute, per_minute / 60, clock),
+            TokenBucket(per_day, per_day / 86400, clock),
+        )
+        self._lock = threading.Lock()
+
+    def available(self) -> int:
+        with self._lock:
+            return int(min(bucket.available() for bucket in self._buckets))
+
+    def try_acquire(self, requests: int = 1) -> bool:
+        """Reserva fichas en ambos cubos solo si los dos tienen suficientes"""
+        with self._lock:
+            if any(bucket.available() < requests for bucket in self._buckets):
+                return False
+            for bucket in self._buckets:
+                bucket.take(requests)
+            return True
+
+    def time_until(self, requests: int = 1) -> float:
+        with self._lock:
+            return max(bucket.time_until(requests) for bucket in self._buckets)
+
+
+class AdaptiveRefreshScheduler:
+    """Decide por ciudad cuándo volver a descargar el pronóstico.
+
+    El intervalo base depende de si la ciudad está fijada, visible o en segundo
+    plano, y se acorta cuando el pronóstico de las próximas horas es inestable
+    (cambios de weather_code, probabilidad o cantidad de precipitación). Las
+    ciudades visibles se refrescan además al pasar la hora en punto, cuando las
+    condiciones "actuales" descargadas quedan desfasadas. Todas las descargas
+    pasan por un RequestBudget y se agrupan en peticiones múltiples.
+
+    El vencimiento de cada ciudad se calcula al terminar su refresco (o al cambiar su
+    visibilidad) y se guarda en un montículo: cada ciclo solo mira las ciudades vencidas.
+    """
+
+    def __init__(self, weather_service, budget: Optional[RequestBudget] = None,
+                 visible_interval: float = 900, background_interval: float = 3 * 3600,
+                 min_interval: float = 300, hour_grace: float = 120, volatility_hours: int = 6,
+                 failure_backoff: float = 120, on_refresh: Optional[Callable[[Dict[str, Dict]], None]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.weather_service = weather_service
+        self.budget = budget or RequestBudget()
+        self.visible_interval = visible_interval
+        self.background_interval = background_interval
+        self.min_interval = min_interval
+        self.hour_grace = hour_grace
+        self.volatility_hours = volatility_hours
+        self.failure_backoff = failure_backoff
+        self.on_refresh = on_refresh
+        self._clock = clock
+        self._visible = set()
+        self._pinned = set()
+        self._retry_at = {}  # ciudad -> momento del siguiente intento tras un fallo
+        self._failures = {}
+        self._heap = []  # (vencimiento, ciudad); las entradas obsoletas se descartan al salir
+        self._due_at = {}  # ciudad -> vencimiento vigente
+        self._recompute = set()  # ciudades cuyo vencimiento cambió por visibilidad
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+
+    # --- Visibilidad ---
+
+    def set_visible(self, location_names: Iterable[str]):
+        """Ciudades que se muestran ahora en pantalla (reemplaza las anteriores)"""
+        with self._lock:
+            visible = set(location_names)
+            self._recompute |= visible ^ self._visible
+            self._visible = visible
+        self._wake.set()
+
+    def pin(self, location_name: str):
+        """Mantiene una ciudad siempre al día (por ejemplo, la del widget)"""
+        with self._lock:
+            self._pinned.add(location_name)
+            self._recompute.add(location_name)
+        self._wake.set()
+
+    def unpin(self, location_name: str):
+        with self._lock:
+            self._pinned.discard(location_name)
+            self._recompute.add(location_name)
+
+    def _is_important(self, location_name: str) -> bool:
+        return location_name in self._pinned or location_name in self._visible
+
+    # --- Decisión por ciudad ---
+
+    def volatility(self, forecast, now: float) -> float:
+        """Inestabilidad del pronóstico en las próximas horas, entre 0 (estable) y 1"""
+        hourly = forecast.hourly
+        start = self._hour_index(forecast, now)
+        end = min(len(hourly), start + self.volatility_hours)
+        if start >= end:
+            return 0.0
+
+        score = 0.0
+        codes = hourly.variables.get('weather_code')
+        if codes is not None and not isinstance(codes, tuple):
+            window = codes[start:end]
+            changes = sum(1 for a, b in zip(window, window[1:]) if a != b)
+            score = max(score, min(1.0, changes / 3))
+            # Tormentas (95-99) y chubascos (80-86) cambian rápido
+            if any(code >= 80 for code in window):
+                score = max(score, 0.8)
+
+        probability = hourly.variables.get('precipitation_probability')
+        if probability is not None and not isinstance(probability, tuple):
+            values = [v for v in probability[start:end] if not math.isnan(v)]
+            if values:
+                score = max(score, max(values) / 100 * 0.8)
+
+        if forecast.current.precipitation:
+            score = max(score, 0.6)
+        return min(1.0, score)
+
+    def _hour_index(self, forecast, now: float) -> int:
+        """Índice de la hora en curso dentro de hourly.time"""
+        local_now = now + forecast.utc_offset_seconds
+        times = forecast.hourly.time
+        low, high = 0, len(times)
+        while low < high:
+            mid = (low + high) // 2
+            if times[mid] <= local_now:
+                low = mid + 1
+            else:
+                high = mid
+        return max(0, low - 1)
+
+    def _next_hour_boundary(self, forecast, fetched_at: float) -> Optional[float]:
+        """Siguiente hora en punto del arreglo hourly.time posterior a la descarga (en época UTC)"""
+        times = forecast.hourly.time
+        if not times:
+            return None
+        index = self._hour_index(forecast, fetched_at) + 1
+        if index >= len(times):
+            return None
+        return times[index] - forecast.utc_offset_seconds
+
+    def next_refresh_at(self, location_name: str, now: Optional[float] = None) -> float:
+        """Momento (época UTC) en que conviene volver a descargar la ciudad"""
+        now = self._clock() if now is None else now
+        retry_at = self._retry_at.get(location_name)
+        if retry_at is not None:
+            return retry_at
+
+        entry = self.weather_service.get_cache_entry(location_name)
+        if entry is None:
+            return now  # Nunca descargada
+
+        forecast, fetched_at = entry
+        important = self._is_important(location_name)
+        base = self.visible_interval if important else self.background_interval
+        interval = max(self.min_interval, base * (1 - 0.5 * self.volatility(forecast, now)))
+        due = fetched_at + interval
+
+        if important:
+            boundary = self._next_hour_boundary(forecast, fetched_at)
+            if boundary is not None:
+                due = min(due, boundary + self.hour_grace)
+        return max(due, fetched_at + self.min_interval)
+
+    # --- Montículo de vencimientos ---
+
+    def _schedule(self, names: Iterable[str], now: float):
+        """Recalcula el vencimiento de las ciudades indicadas"""
+        for name in names:
+            due_at = self.next_refresh_at(name, now)
+            with self._lock:
+                if name in self._due_at:
+                    self._due_at[name] = due_at
+                    heapq.heappush(self._heap, (due_at, name))
+
+    def _sync(self, now: float):
+        """Incorpora las ciudades nuevas, olvida las eliminadas y recalcula las de visibilidad cambiada"""
+        names = set(self.weather_service.get_all_locations())
+        with self._lock:
+            removed = self._due_at.keys() - names
+            for name in removed:
+                del self._due_at[name]
+                self._retry_at.pop(name, None)
+                self._failures.pop(name, None)
+            pending = (names - self._due_at.keys()) | (self._recompute & names)
+            self._recompute.clear()
+            for name in pending:
+                self._due_at.setdefault(name, now)
+            if len(self._heap) > 2 * len(self._due_at) + 64:
+                # Demasiadas entradas obsoletas: reconstruir
+                self._heap = [(due_at, name) for name, due_at in self._due_at.items()]
+                heapq.heapify(self._heap)
+        self._schedule(pending, now)
+
+    def due_locations(self, now: Optional[float] = None) -> List[str]:
+        """Ciudades que ya toca refrescar, las más importantes y atrasadas primero"""
+        now = self._clock() if now is None else now
+        self._sync(now)
+        expired = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due_at, name = heapq.heappop(self._heap)
+                if self._due_at.get(name) == due_at:
+                    expired[name] = due_at
+
+        # Se confirma al vencer: la ciudad pudo refrescarse fuera del planificador
+        self._schedule(expired, now)
+        due = []
+        with self._lock:
+            for name in expired:
+                due_at = self._due_at.get(name)
+                if due_at is not None and due_at <= now:
+                    due.append((name not in self._pinned, name not in self._visible, due_at, name))
+        due.sort()
+        return [entry[-1] for entry in due]
+
+    # --- Ejecución ---
+
+    def run_once(self, now: Optional[float] = None) -> Dict[str, Dict]:
+        """Refresca las ciudades vencidas que permita el presupuesto y devuelve sus datos"""
+        now = self._clock() if now is None else now
+        due = self.due_locations(now)
+        if not due:
+            return {}
+
+        # Cada grupo es una petición múltiple (mismos bloques, hasta BULK_CHUNK_SIZE celdas)
+        plan = self.weather_service.plan_bulk_requests(due)
+        requests_allowed = min(len(plan), self.budget.available())
+        if requests_allowed <= 0 or not self.budget.try_acquire(requests_allowed):
+            count("scheduler.budget_exhausted")
+            return {}
+        if requests_allowed < len(plan):
+            count("scheduler.deferred", sum(len(members) for _, groups in plan[requests_allowed:]
+                                            for members in groups))
+        due = [name for _, groups in plan[:requests_allowed] for members in groups for name in members]
+
+        # Sin peticiones duplicadas (hedge): el presupuesto solo descontó una por grupo
+        results = self.weather_service.get_weather_data_bulk(due, hedge=False)
+        for name, data in results.items():
+            # Tras un fallo se sirven datos guardados (stale=True), que también traen success=True
+            if data.get('success') and not data.get('stale'):
+                self._failures.pop(name, None)
+                self._retry_at.pop(name, None)
+            else:
+                failures = self._failures.get(name, 0) + 1
+                self._failures[name] = failures
+                self._retry_at[name] = now + min(self.background_interval, self.failure_backoff * 2 ** (failures - 1))
+        self._schedule(results, now)
+        count("scheduler.refreshed", len(results))
+
+        if self.on_refresh is not None:
+            try:
+                self.on_refresh(results)
+            except Exception as e:
+                error(f"Error en callback del planificador: {e}")
+        return results
+
+    def seconds_until_next(self, now: Optional[float] = None) -> float:
+        """Tiempo hasta la próxima ciudad vencida, o hasta que haya presupuesto"""
+        now = self._clock() if now is None else now
+        self._sync(now)
+        with self._lock:
+            while self._heap and self._due_at.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return self.background_interval
+            wait = self._heap[0][0] - now
+        return max(wait, self.budget.time_until(1), 0.0)
+
+    def start(self, max_sleep: float = 300):
+        """Ejecuta el planificador en un hilo daemon"""
+        if self._running:
+            return
+        self._running = True
+
+        def loop():
+            while self._running:
+                try:
+                    self.run_once()
+                    delay = self.seconds_until_next()
+                except Exception as e:
+                    error(f"Error en planificador de refresco: {e}")
+                    delay = self.failure_backoff
+                self._wake.wait(min(max_sleep, max(1.0, delay)))
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=loop, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+        info("Planificador de refresco iniciado")
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
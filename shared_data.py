@@ -1,15 +1,137 @@
 import json
 import os
-from threading import Lock
+import struct
+import tempfile
+import time
+from threading import Condition, Lock, Timer
 from datetime import datetime
+from types import MappingProxyType
+from urllib.parse import quote
+from instrumentation import count, error, info, span, warning
+
+# Formato binario: cabecera fija + campos numéricos + cadenas UTF-8 con prefijo de longitud
+SNAPSHOT_MAGIC = b'WSNP'
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct('<4sHQd')  # magic, versión, secuencia, marca de tiempo
+_NUMBERS = struct.Struct('<ddd')  # temperatura, humedad, viento
+_TEXT_LENGTH = struct.Struct('<H')
+_TEXT_FIELDS = ("city", "description", "icon", "last_update")
 
 def is_android():
     """Detecta si estamos ejecutando en Android"""
     return hasattr(os, 'getenv') and 'ANDROID_ARGUMENT' in os.environ
 
+def _atomic_write(path, content: bytes):
+    """Escribe en un archivo temporal y lo renombra, para no dejar nunca un archivo a medias.
+
+    El temporal tiene nombre único en el mismo directorio: varios procesos pueden escribir
+    el mismo snapshot a la vez sin pisarse el temporal.
+    """
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp",
+                                    dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def encode_binary_snapshot(data, sequence):
+    """Codifica los datos del widget en el formato binario compacto"""
+    parts = [
+        _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sequence, time.time()),
+        _NUMBERS.pack(float(data.get("temperature") or 0), float(data.get("humidity") or 0),
+                      float(data.get("wind_speed") or 0)),
+    ]
+    for name in _TEXT_FIELDS:
+        text = str(data.get(name, "")).encode('utf-8')
+        parts.append(_TEXT_LENGTH.pack(len(text)))
+        parts.append(text)
+    return b''.join(parts)
+
+def decode_binary_snapshot(blob):
+    """Decodifica un snapshot binario; lanza ValueError si no es válido"""
+    magic, version, sequence, _ = _HEADER.unpack_from(blob, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Snapshot binario con formato desconocido")
+    
+    offset = _HEADER.size
+    temperature, humidity, wind_speed = _NUMBERS.unpack_from(blob, offset)
+    offset += _NUMBERS.size
+    data = {"temperature": temperature, "humidity": humidity, "wind_speed": wind_speed}
+    for name in _TEXT_FIELDS:
+        (length,) = _TEXT_LENGTH.unpack_from(blob, offset)
+        offset += _TEXT_LENGTH.size
+        data[name] = blob[offset:offset + length].decode('utf-8')
+        offset += length
+    data["sequence"] = sequence
+    return data
+
+def read_binary_sequence(path):
+    """Lee solo el número de secuencia de un snapshot binario (sin decodificar el resto)"""
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER.size)
+    magic, version, sequence, _ = _HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Snapshot binario con formato desconocido")
+    return sequence
+
+class SnapshotReader:
+    """Lector para otros procesos: solo vuelve a leer el archivo cuando cambia"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.binary = path.endswith('.bin')
+        self._signature = None
+        self._data = None
+    
+    def has_changed(self):
+        """Indica si el archivo cambió desde la última lectura (por mtime y tamaño)"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) != self._signature
+    
+    def read(self):
+        """Devuelve los datos más recientes, reutilizando los ya leídos si no hubo cambios"""
+        try:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature != self._signature or self._data is None:
+                with open(self.path, 'rb') as f:
+                    content = f.read()
+                if self.binary:
+                    self._data = decode_binary_snapshot(content)
+                else:
+                    self._data = json.loads(content.decode('utf-8'))
+                self._signature = signature
+        except (OSError, ValueError, struct.error) as e:
+            warning(f"⚠️ Error leyendo snapshot: {e}")
+        return self._data
+
+def city_snapshot_path(data_dir, city, binary=False):
+    """Ruta del snapshot de una ciudad (nombre escapado para que sea un archivo válido)"""
+    return os.path.join(data_dir, "cities", quote(city, safe='') + (".bin" if binary else ".json"))
+
 class SharedWeatherData:
+    """Datos del widget para varias ciudades, compartidos entre hilos y procesos.
+
+    Cada ciudad tiene su propio registro inmutable (MappingProxyType) y su propio archivo
+    en weather_widget_data/cities/. Los escritores reemplazan el diccionario de registros
+    por una copia nueva (copy-on-write) bajo un lock; los lectores solo leen la referencia
+    actual, así que nunca se bloquean entre sí ni copian datos. La ciudad principal se
+    sigue guardando además en current_weather.json para el widget.
+    """
     _instance = None
     _lock = Lock()
+    debounce_interval = 2.0  # Segundos mínimos entre escrituras a disco
     
     def __new__(cls):
         with cls._lock:
@@ -20,8 +142,24 @@ class SharedWeatherData:
     
     def _initialize(self):
         self.data_file = self._get_data_path()
+        self.data_dir = os.path.dirname(self.data_file)
+        self.binary_file = os.path.splitext(self.data_file)[0] + ".bin"
+        self.write_binary = False
         self._ensure_data_directory()
-        self.current_data = self._load_data()
+        self._update_lock = Lock()
+        self.current_data = MappingProxyType(self._load_data())
+        self._records = MappingProxyType(self._load_city_records())
+        self.sequence = max([int(self.current_data.get("sequence", 0))] +
+                            [int(record.get("sequence", 0)) for record in self._records.values()])
+        self._write_lock = Lock()
+        self._write_timer = None
+        self._last_write = 0.0
+        self._dirty = set()  # ciudades con cambios sin escribir ('' = archivo de la ciudad principal)
+        # Identifica los archivos escritos por este proceso: el watcher también avisa de ellos
+        self._writer_token = os.urandom(4).hex()
+        self._changed = Condition(Lock())
+        self._subscribers = []
+        self._wake_generation = 0
     
     def _get_data_path(self):
         """Obtiene la ruta del archivo de datos compartidos"""
@@ -41,18 +179,18 @@ class SharedWeatherData:
             data_dir = os.path.join(base_dir, "weather_widget_data")
             os.makedirs(data_dir, exist_ok=True)
             return os.path.join(data_dir, "current_weather.json")
-            
+        
         except Exception as e:
-            print(f"⚠️ Error obteniendo ruta: {e}")
+            warning(f"⚠️ Error obteniendo ruta: {e}")
             # Fallback absoluto
             return "current_weather.json"
     
     def _ensure_data_directory(self):
-        """Asegura que el directorio de datos existe"""
+        """Asegura que existen el directorio de datos y el de las ciudades"""
         try:
-            os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
+            os.makedirs(os.path.join(self.data_dir, "cities"), exist_ok=True)
         except Exception as e:
-            print(f"⚠️ Error creando directorio: {e}")
+            warning(f"⚠️ Error creando directorio: {e}")
     
     def _load_data(self):
         """Carga los datos existentes"""
@@ -61,9 +199,12 @@ class SharedWeatherData:
                 with open(self.data_file, 'r', encoding='utf-8') as f:
                     return json.load(f)
         except Exception as e:
-            print(f"⚠️ Error cargando datos: {e}")
-        
-        # Datos por defecto
+            warning(f"⚠️ Error cargando datos: {e}")
+        return self._default_data()
+    
+    @staticmethod
+    def _default_data():
+        """Datos por defecto del widget cuando no hay ninguna ciudad"""
         return {
             "city": "Agregar ciudad",
             "temperature": 0,
@@ -74,28 +215,294 @@ class SharedWeatherData:
             "icon": "☀️"
         }
     
-    def update_weather_data(self, city, temperature, description, humidity=0, wind_speed=0, icon="☀️"):
-        """Actualiza los datos del clima para el widget"""
-        with self._lock:
-            self.current_data = {
+    def _load_city_records(self):
+        """Carga los snapshots por ciudad guardados en sesiones anteriores"""
+        records = {}
+        directory = os.path.join(self.data_dir, "cities")
+        try:
+            names = [name for name in os.listdir(directory) if name.endswith(".json")]
+        except OSError:
+            return records
+        for name in names:
+            try:
+                with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+                records[record["city"]] = MappingProxyType(record)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                warning(f"⚠️ Error cargando snapshot {name}: {e}")
+        return records
+    
+    def set_binary_snapshot(self, enabled=True):
+        """Activa o desactiva el snapshot binario compacto para lectores externos"""
+        self.write_binary = enabled
+        if enabled:
+            self.flush()
+    
+    def update_weather_data(self, city, temperature, description, humidity=0, wind_speed=0, icon="☀️",
+                            primary=True):
+        """Actualiza los datos del clima de una ciudad; primary=True la muestra además en el widget"""
+        with self._update_lock:
+            self.sequence += 1
+            fields = {
                 "city": city,
                 "temperature": temperature,
                 "description": description,
                 "humidity": humidity,
                 "wind_speed": wind_speed,
                 "icon": icon,
-                "last_update": datetime.now().isoformat()
+                "last_update": datetime.now().isoformat(),
+                "sequence": self.sequence
             }
+            # Las alertas las publica AlertEngine por separado: se conservan al actualizar el clima
+            previous = self._records.get(city)
+            if previous is not None and "alerts" in previous:
+                fields["alerts"] = previous["alerts"]
+            record = MappingProxyType(fields)
+            self._replace_record(city, record, primary)
+        
+        count("snapshot.updates")
+        self._notify_change(record, primary)
+        self._schedule_write()
+    
+    def set_alerts(self, alerts_by_city):
+        """Publica las alertas activas de varias ciudades {ciudad: [alertas]} en una sola actualización"""
+        if not alerts_by_city:
+            return
+        with self._update_lock:
+            # Una sola copia del diccionario de registros para todo el lote
+            records = dict(self._records)
+            primary_city = self.current_data.get("city")
+            primary_changed = False
+            for city, alerts in alerts_by_city.items():
+                self.sequence += 1
+                previous = records.get(city)
+                if previous is None:
+                    # Ciudad aún sin datos del clima: registro mínimo para que el widget muestre la alerta
+                    fields = {"city": city, "temperature": 0, "description": "Sin datos", "humidity": 0,
+                              "wind_speed": 0, "icon": "☀️", "last_update": datetime.now().isoformat()}
+                else:
+                    fields = dict(previous)
+                fields["alerts"] = tuple(dict(alert) for alert in alerts)
+                fields["sequence"] = self.sequence
+                record = records[city] = MappingProxyType(fields)
+                self._dirty.add(city)
+                if city == primary_city:
+                    self.current_data = record
+                    self._dirty.add('')
+                    primary_changed = True
+            self._records = MappingProxyType(records)
+            primary = self.current_data
+        
+        count("snapshot.alert_updates", len(alerts_by_city))
+        self._notify_change(primary, primary_changed)
+        self._schedule_write()
+    
+    def _replace_record(self, city, record, primary):
+        """Publica un registro nuevo (con _update_lock tomado); los lectores ven el dict anterior o el nuevo"""
+        records = dict(self._records)
+        records[city] = record
+        self._records = MappingProxyType(records)
+        self._dirty.add(city)
+        if primary:
+            self.current_data = record
+            self._dirty.add('')
+    
+    def remove_city(self, city):
+        """Quita una ciudad del almacén y borra sus archivos; devuelve True si existía.
+        
+        Si era la ciudad principal, pasa a serlo la actualizada más recientemente (o los datos
+        por defecto si no queda ninguna).
+        """
+        # Mismo orden de locks que _write_pending: una escritura pendiente no puede volver
+        # a crear los archivos después de borrarlos
+        with self._write_lock:
+            with self._update_lock:
+                if city not in self._records:
+                    return False
+                records = dict(self._records)
+                del records[city]
+                self._records = MappingProxyType(records)
+                self._dirty.discard(city)
+                primary_removed = self.current_data.get("city") == city
+                if primary_removed:
+                    remaining = max(records.values(), key=lambda record: record.get("sequence", 0), default=None)
+                    self.sequence += 1
+                    self.current_data = remaining or MappingProxyType(
+                        dict(self._default_data(), sequence=self.sequence))
+                    self._dirty.add('')
+                primary = self.current_data
+            for binary in (False, True):
+                try:
+                    os.remove(city_snapshot_path(self.data_dir, city, binary))
+                except OSError:
+                    pass
+        
+        if primary_removed:
+            self._notify_change(primary, True)
+            self._schedule_write()
+        return True
+    
+    def reload_from_disk(self, city=None):
+        """Recarga el archivo principal (o el de city) si otro proceso escribió datos más nuevos; devuelve True si cambió"""
+        path = self.data_file if city is None else city_snapshot_path(self.data_dir, city)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            warning(f"⚠️ Error recargando datos: {e}")
+            return False
+        
+        with self._update_lock:
+            if data.get("writer") == self._writer_id():
+                # Escritura propia: la memoria es igual o más nueva que el disco
+                return False
+            current = self.current_data if city is None else self._records.get(city)
+            sequence = int(data.get("sequence", 0))
+            if sequence <= self.sequence and data == current:
+                return False
+            pending = data.get("city") in self._dirty or (city is None and '' in self._dirty)
+            if pending and current is not None and \
+                    str(data.get("last_update", "")) <= str(current.get("last_update", "")):
+                # La memoria tiene cambios más nuevos aún sin escribir: su escritura prevalece
+                return False
+            record = MappingProxyType(data)
+            self.sequence = max(sequence, self.sequence + 1)
+            if "city" in data:
+                self._replace_record(data["city"], record, primary=city is None)
+            else:
+                self.current_data = record
+            # Ya está en disco: no volver a escribirlo
+            self._dirty.discard(data.get("city"))
+            if city is None:
+                self._dirty.discard('')
+        
+        self._notify_change(record, city is None)
+        return True
+    
+    def subscribe(self, callback):
+        """Registra callback(datos), que se llama cada vez que cambia la ciudad principal (la del widget)"""
+        with self._changed:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+    
+    def unsubscribe(self, callback):
+        """Elimina un callback registrado con subscribe"""
+        with self._changed:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+    
+    def wait_for_change(self, last_sequence, timeout=None):
+        """Bloquea hasta que la secuencia supere last_sequence; devuelve la nueva o None si vence el tiempo"""
+        with self._changed:
+            generation = self._wake_generation
+            self._changed.wait_for(
+                lambda: self.sequence > last_sequence or self._wake_generation != generation, timeout)
+            return self.sequence if self.sequence > last_sequence else None
+    
+    def wake_waiters(self):
+        """Despierta a los hilos bloqueados en wait_for_change (por ejemplo, al detener un servicio)"""
+        with self._changed:
+            self._wake_generation += 1
+            self._changed.notify_all()
+    
+    def _notify_change(self, data, primary=True):
+        """Despierta a los hilos en espera y, si cambió la ciudad principal, avisa a los suscriptores"""
+        with self._changed:
+            self._changed.notify_all()
+            if not primary:
+                return
+            subscribers = list(self._subscribers)
+        
+        for callback in subscribers:
+            try:
+                callback(data)
+            except Exception as e:
+                error(f"❌ Error en suscriptor de datos widget: {e}")
+    
+    def _schedule_write(self):
+        """Agrupa actualizaciones seguidas: como máximo una escritura por intervalo"""
+        with self._write_lock:
+            if self._write_timer is not None:
+                return  # Ya hay una escritura pendiente que incluirá estos datos
+            delay = self._last_write + self.debounce_interval - time.monotonic()
+            if delay > 0:
+                self._write_timer = Timer(delay, self._write_pending)
+                self._write_timer.daemon = True
+                self._write_timer.start()
+                return
+        
+        self._write_pending()
+    
+    def _write_pending(self, force=False):
+        """Escribe a disco solo los archivos de las ciudades que cambiaron desde la última escritura"""
+        with self._write_lock:
+            self._write_timer = None
+            with self._update_lock:
+                dirty, self._dirty = self._dirty, set()
+                records = self._records
+                primary = self.current_data
+                sequence = self.sequence
+            if force:
+                dirty.add('')
+            if not dirty:
+                return
             
-            # Guardar en archivo
             try:
-                with open(self.data_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.current_data, f, ensure_ascii=False, indent=2)
-                print(f"✅ Datos para widget guardados: {city} - {temperature}°")
+                with span("snapshot.write"):
+                    for city in dirty:
+                        if city == '':
+                            self._write_snapshot(self.data_file, self.binary_file, primary, sequence)
+                        elif city in records:
+                            self._write_snapshot(city_snapshot_path(self.data_dir, city),
+                                                 city_snapshot_path(self.data_dir, city, binary=True),
+                                                 records[city], records[city].get("sequence", sequence))
+                count("snapshot.writes", len(dirty))
+                info(f"✅ Datos para widget guardados: {primary['city']} - {primary['temperature']}°"
+                     f" ({len(dirty)} archivos)")
             except Exception as e:
-                print(f"❌ Error guardando datos widget: {e}")
+                # Reintentar en la próxima escritura
+                with self._update_lock:
+                    self._dirty |= dirty
+                count("snapshot.write_failures")
+                error(f"❌ Error guardando datos widget: {e}")
+            finally:
+                self._last_write = time.monotonic()
+    
+    def _writer_id(self):
+        """Autor de las escrituras de este proceso (incluye el pid: un fork hereda el singleton)"""
+        return f"{os.getpid()}-{self._writer_token}"
+    
+    def _write_snapshot(self, json_path, binary_path, data, sequence):
+        payload = dict(data, writer=self._writer_id())
+        _atomic_write(json_path, json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+        if self.write_binary:
+            _atomic_write(binary_path, encode_binary_snapshot(data, sequence))
+    
+    def flush(self):
+        """Escribe de inmediato cualquier actualización pendiente"""
+        with self._write_lock:
+            timer, self._write_timer = self._write_timer, None
+        if timer is not None:
+            timer.cancel()
+        self._write_pending(force=True)
+    
+    def get_sequence(self):
+        """Número de secuencia de la última actualización (crece con cada cambio)"""
+        return self.sequence
+    
+    def get_weather_data(self, city=None):
+        """Datos del widget de una ciudad (por defecto, la principal) como snapshot inmutable, sin copiar.
+        
+        Si la ciudad no tiene datos devuelve None.
+        """
+        if city is None:
+            return self.current_data
+        return self._records.get(city)
+    
+    def get_all_weather_data(self):
+        """Snapshot inmutable {ciudad: datos} de todas las ciudades en un mismo instante"""
+        return self._records
     
-    def get_weather_data(self):
-        """Obtiene los datos actuales para el widget"""
-        with self._lock:
-            return self.current_data.copy()
\ No newline at end of file
+    def get_cities(self):
+        """Ciudades con datos guardados"""
+        return list(self._records)
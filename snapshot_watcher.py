@@ -0,0 +1,124 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+from instrumentation import error
+
+# Constantes de inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    """Devuelve las funciones de inotify de libc, o None si no están disponibles"""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class SnapshotWatcher:
+    """Vigila el archivo de snapshot y llama a callback(ruta) cuando se reemplaza.
+
+    Usa inotify en Linux/Android y, si no está disponible, compara mtime y tamaño
+    cada poll_interval segundos.
+    """
+
+    def __init__(self, path, callback, poll_interval=1.0):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        """Inicia la vigilancia en un hilo de fondo"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Detiene la vigilancia"""
+        self.is_running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=self.poll_interval + 1)
+
+    def _run(self):
+        fd = self._open_inotify()
+        try:
+            if fd is not None:
+                self._watch_inotify(fd)
+            else:
+                self._watch_polling()
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    def _open_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(os.O_NONBLOCK)
+        if fd < 0:
+            return None
+        # Se vigila el directorio: la escritura atómica reemplaza el archivo con un rename
+        directory = os.path.dirname(self.path).encode()
+        if libc.inotify_add_watch(fd, directory, IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _watch_inotify(self, fd):
+        name = os.path.basename(self.path).encode()
+        while self.is_running:
+            ready, _, _ = select.select([fd], [], [], self.poll_interval)
+            if not ready:
+                continue
+            try:
+                buffer = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+
+            changed = False
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(buffer):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+                event_name = buffer[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += _EVENT_HEADER.size + length
+                changed = changed or event_name == name
+
+            if changed:
+                self._notify()
+
+    def _watch_polling(self):
+        signature = self._signature()
+        while self.is_running:
+            time.sleep(self.poll_interval)
+            current = self._signature()
+            if current != signature:
+                signature = current
+                self._notify()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _notify(self):
+        try:
+            self.callback(self.path)
+        except Exception as e:
+            error(f"❌ Error en vigilante de snapshot: {e}")
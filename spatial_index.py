@@ -0,0 +1,116 @@
+import math
+from typing import List, Tuple
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+GEOHASH_PRECISION = 9  # ~5 m: precisión guardada en la tabla cities
+EARTH_RADIUS_KM = 6371.0088
+
+# Resolución aproximada de los modelos más finos de Open-Meteo (~2-3 km).
+# Ubicaciones dentro de la misma celda comparten descarga y entrada de caché.
+GRID_RESOLUTION_DEG = 0.025
+
+
+def encode_geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    """Codifica una coordenada como geohash"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_range[0] = mid
+            else:
+                value <<= 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def decode_geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """Devuelve (lat_min, lat_max, lon_min, lon_max) de la celda"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lon_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if bit:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def geohash_neighborhood(lat: float, lon: float, precision: int) -> List[str]:
+    """Celda que contiene el punto más sus 8 vecinas (sin duplicados)"""
+    center = encode_geohash(lat, lon, precision)
+    lat_min, lat_max, lon_min, lon_max = decode_geohash_bbox(center)
+    lat_step = lat_max - lat_min
+    lon_step = lon_max - lon_min
+    center_lat = (lat_min + lat_max) / 2
+    center_lon = (lon_min + lon_max) / 2
+
+    cells = []
+    for d_lat in (-1, 0, 1):
+        neighbor_lat = center_lat + d_lat * lat_step
+        if not -90 <= neighbor_lat <= 90:
+            continue
+        for d_lon in (-1, 0, 1):
+            neighbor_lon = (center_lon + d_lon * lon_step + 180) % 360 - 180
+            cell = encode_geohash(neighbor_lat, neighbor_lon, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def cell_size_km(lat: float, precision: int) -> float:
+    """Lado menor (en km) de una celda geohash a esa latitud"""
+    lat_min, lat_max, lon_min, lon_max = decode_geohash_bbox(encode_geohash(lat, 0.0, precision))
+    height = (lat_max - lat_min) * math.pi / 180 * EARTH_RADIUS_KM
+    width = (lon_max - lon_min) * math.pi / 180 * EARTH_RADIUS_KM * math.cos(math.radians(min(abs(lat) + (lat_max - lat_min), 90)))
+    return min(height, width)
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Límite superior exclusivo para buscar un prefijo con un índice B-tree"""
+    return prefix + '~'
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia sobre la superficie terrestre en km"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def grid_cell(lat: float, lon: float, resolution: float = GRID_RESOLUTION_DEG) -> Tuple[float, float]:
+    """Centro de la celda de la rejilla del modelo que contiene el punto"""
+    return (
+        round((math.floor(lat / resolution) + 0.5) * resolution, 6),
+        round((math.floor(lon / resolution) + 0.5) * resolution, 6),
+    )
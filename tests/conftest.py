@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos de la aplicación están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def shared_data(tmp_path, monkeypatch):
+    """SharedWeatherData nuevo con sus archivos en un directorio temporal"""
+    from shared_data import SharedWeatherData
+
+    monkeypatch.chdir(tmp_path)
+    SharedWeatherData._instance = None
+    shared = SharedWeatherData()
+    shared.debounce_interval = 60
+    yield shared
+    shared.flush()
+    SharedWeatherData._instance = None
+
+
+@pytest.fixture
+def fake_server():
+    """Open-Meteo simulado en un puerto libre"""
+    from benchmarks.fake_open_meteo import FakeOpenMeteo
+
+    server = FakeOpenMeteo(seed=1)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def weather_service(tmp_path, monkeypatch, fake_server):
+    """WeatherService con base de datos temporal, contra el servidor simulado y sin reintentos"""
+    from http_transport import HttpTransport
+    from weather_service import WeatherService
+
+    monkeypatch.chdir(tmp_path)
+    service = WeatherService(base_url=fake_server.base_url,
+                             transport=HttpTransport(read_timeout=2, max_retries=0))
+    yield service
+    service.transport.close()
+    service.db_manager.close()
@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta, timezone
+
+from alert_rules import AlertEngine, compile_rules
+
+NOW = datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc).timestamp()
+RAIN = {"id": "lluvia", "when": "precipitation_probability > 70", "within_hours": 3,
+        "message": "Lluvia {value:.0f}% a las {time}"}
+
+
+class FakeSharedData:
+    def __init__(self):
+        self.published = []
+
+    def set_alerts(self, alerts_by_city):
+        self.published.append(alerts_by_city)
+
+
+def weather(probabilities, start=datetime(2024, 5, 1, 10)):
+    return {"success": True, "utc_offset_seconds": 0, "hourly": {
+        "time": [(start + timedelta(hours=h)).strftime('%Y-%m-%dT%H:%M') for h in range(len(probabilities))],
+        "precipitation_probability": probabilities,
+    }}
+
+
+def make_engine(rules=(RAIN,)):
+    shared = FakeSharedData()
+    return AlertEngine(rules, shared_data=shared), shared
+
+
+def test_invalid_rules_are_dropped_at_compile_time():
+    rules = compile_rules([
+        RAIN,
+        {"id": "mala", "when": "temperature_2m ~ 3"},
+        {"id": "plantilla", "when": "temperature_2m < 0", "message": "{desconocido}"},
+        {"id": "noche", "when": "temperature_2m < 0", "hours": [20, 8]},
+    ])
+
+    assert [rule.id for rule in rules] == ["lluvia", "noche"]
+    assert rules[1].hours == frozenset(list(range(20, 24)) + list(range(0, 8)))
+    assert rules[0].test(71) and not rules[0].test(70) and not rules[0].test(None)
+    assert not rules[0].test(float("nan"))
+
+
+def test_alert_is_raised_once_within_its_window():
+    engine, shared = make_engine()
+
+    fired = engine.evaluate("Concepción", weather([10, 20, 80, 90, 95]), NOW)
+
+    assert [alert["time"] for alert in fired] == ["2024-05-01T12:00"]
+    assert fired[0]["message"] == "Lluvia 80% a las 12:00"
+    assert shared.published == [{"Concepción": tuple(fired)}]
+
+
+def test_matches_outside_the_window_do_not_raise():
+    engine, shared = make_engine()
+
+    assert engine.evaluate("Concepción", weather([10, 20, 30, 40, 95]), NOW) == []
+    assert shared.published == []
+
+
+def test_repeated_and_advancing_evaluations_do_not_duplicate_or_republish():
+    engine, shared = make_engine()
+    data = weather([10, 80, 90, 95, 10])
+    engine.evaluate("Concepción", data, NOW)
+
+    assert engine.evaluate("Concepción", data, NOW) == []
+    # Dos horas después la primera hora que cumple pasa de 11:00 a 12:00: la alerta sigue igual
+    assert engine.evaluate("Concepción", data, NOW + 2 * 3600) == []
+    assert len(shared.published) == 1
+    assert engine.active_alerts("Concepción")["Concepción"][0]["time"] == "2024-05-01T11:00"
+
+
+def test_alert_clears_when_no_slot_matches():
+    engine, shared = make_engine()
+    engine.evaluate("Concepción", weather([10, 80, 10]), NOW)
+
+    assert engine.evaluate("Concepción", weather([10, 20, 10]), NOW) == []
+    assert engine.active_alerts() == {}
+    assert shared.published[-1] == {"Concepción": ()}
+
+    fired = engine.evaluate("Concepción", weather([10, 85, 10]), NOW)
+    assert len(fired) == 1  # Tras despejarse, vuelve a emitirse
+
+
+def test_failed_downloads_keep_the_previous_state():
+    engine, shared = make_engine()
+    engine.evaluate("Concepción", weather([10, 80, 10]), NOW)
+
+    engine.evaluate("Concepción", {"success": False}, NOW)
+
+    assert "Concepción" in engine.active_alerts()
+    assert len(shared.published) == 1
+
+
+def test_only_changed_slots_are_reevaluated():
+    calls = []
+    engine, _ = make_engine()
+    rule = engine.rules[0]
+    original = rule.test
+    rule.test = lambda value: calls.append(value) or original(value)
+
+    engine.evaluate("Concepción", weather([10, 20, 30, 40]), NOW)
+    assert len(calls) == 4
+    engine.evaluate("Concepción", weather([10, 20, 75, 40]), NOW)
+    assert calls[4:] == [75]
+    engine.evaluate("Concepción", weather([10, 20, 75, 40]), NOW)
+    assert calls[4:] == [75]
@@ -0,0 +1,61 @@
+from weather_service import WeatherService
+
+
+def add_cities(service, count, lat=-30.01):
+    names = [f"Ciudad {i}" for i in range(count)]
+    for i, name in enumerate(names):
+        service.add_location(name, lat - i, -70.01)
+    return names
+
+
+def test_unknown_cities_are_left_out(weather_service):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+
+    assert weather_service.plan_bulk_requests([]) == []
+    assert weather_service.plan_bulk_requests(["Atlántida"]) == []
+    assert weather_service.plan_bulk_requests(["Atlántida", "Concepción"]) == [
+        (WeatherService.BLOCKS, [["Concepción"]])]
+
+
+def test_cities_in_the_same_grid_cell_share_a_slot(weather_service):
+    weather_service.add_location("Norte", 40.001, -2.999)
+    weather_service.add_location("Lejos", 10.0, 10.0)
+    weather_service.add_location("Sur", 40.002, -2.998)
+
+    plan = weather_service.plan_bulk_requests(["Norte", "Lejos", "Sur"])
+
+    assert plan == [(WeatherService.BLOCKS, [["Norte", "Sur"], ["Lejos"]])]
+
+
+def test_groups_are_split_into_chunks(weather_service, monkeypatch):
+    monkeypatch.setattr(weather_service, "BULK_CHUNK_SIZE", 2)
+    names = add_cities(weather_service, 5)
+
+    plan = weather_service.plan_bulk_requests(names)
+
+    assert [groups for _, groups in plan] == [[[names[0]], [names[1]]], [[names[2]], [names[3]]], [[names[4]]]]
+    assert all(blocks == WeatherService.BLOCKS for blocks, _ in plan)
+
+
+def test_fresh_cities_only_ask_for_current(weather_service):
+    fresh = add_cities(weather_service, 2)
+    weather_service.get_weather_data_bulk(fresh)
+    weather_service.add_location("Nueva", 5.0, 5.0)
+
+    plan = dict(weather_service.plan_bulk_requests(fresh + ["Nueva"]))
+
+    assert plan == {("current",): [[fresh[0]], [fresh[1]]], WeatherService.BLOCKS: [["Nueva"]]}
+
+
+def test_bulk_download_makes_one_request_per_planned_group(weather_service, fake_server, monkeypatch):
+    monkeypatch.setattr(weather_service, "BULK_CHUNK_SIZE", 2)
+    names = add_cities(weather_service, 3)
+    weather_service.add_location("Vecina", -30.005, -70.005)  # Misma celda que "Ciudad 0"
+
+    results = weather_service.get_weather_data_bulk(names + ["Vecina", "Atlántida"])
+
+    assert fake_server.requests == 2
+    assert list(results) == names + ["Vecina", "Atlántida"]
+    assert all(results[name]["success"] for name in names + ["Vecina"])
+    assert results["Vecina"]["current"] == results["Ciudad 0"]["current"]
+    assert results["Atlántida"]["success"] is False
@@ -0,0 +1,65 @@
+import time
+
+from circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from http_transport import HttpTransport
+
+
+def use_retrying_transport(service, max_retries=3):
+    service.transport.close()
+    service.transport = HttpTransport(read_timeout=2, max_retries=max_retries, backoff_base=0)
+
+
+def test_each_transport_retry_counts_towards_the_breaker(weather_service, fake_server):
+    fake_server.error_rate = 1.0
+    weather_service.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    use_retrying_transport(weather_service)
+    weather_service.add_location("Madrid", 40.4, -3.7)
+
+    weather_service.refresh_weather_data("Madrid")
+
+    assert weather_service.breaker.state == OPEN
+    assert fake_server.requests == 3  # El cuarto intento ya no llega al servidor
+
+    weather_service.refresh_weather_data("Madrid")
+    assert fake_server.requests == 3
+
+
+def test_client_errors_do_not_open_the_breaker(weather_service, fake_server):
+    fake_server.error_rate = 1.0
+    fake_server.error_status = 400
+    weather_service.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    use_retrying_transport(weather_service)
+    weather_service.add_location("Madrid", 40.4, -3.7)
+
+    for _ in range(4):
+        weather_service.refresh_weather_data("Madrid")
+
+    assert weather_service.breaker.state == CLOSED
+    assert fake_server.requests == 4  # Los 4xx tampoco se reintentan
+
+
+def test_rate_limiting_counts_as_failure(weather_service, fake_server):
+    fake_server.error_rate = 1.0
+    fake_server.error_status = 429
+    weather_service.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    weather_service.add_location("Madrid", 40.4, -3.7)
+
+    for _ in range(3):
+        weather_service.refresh_weather_data("Madrid")
+
+    assert weather_service.breaker.state == OPEN
+    assert fake_server.requests == 2
+
+
+def test_retry_is_not_slept_once_the_breaker_opens(weather_service, fake_server, monkeypatch):
+    fake_server.error_rate = 1.0
+    weather_service.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    use_retrying_transport(weather_service)
+    monkeypatch.setattr(weather_service.transport, "_backoff_delay", lambda attempt: 3.0)
+    weather_service.add_location("Madrid", 40.4, -3.7)
+
+    started = time.monotonic()
+    data = weather_service.refresh_weather_data("Madrid")
+
+    assert time.monotonic() - started < 1.0
+    assert not data["success"] and fake_server.requests == 1
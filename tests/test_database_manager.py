@@ -0,0 +1,187 @@
+import sqlite3
+
+import pytest
+
+from database_manager import DatabaseManager
+
+CITIES = [("Ancud", -41.87, -73.83), ("Concepción", -36.83, -73.05), ("Puerto Montt", -41.47, -72.94),
+          ("Santiago", -33.45, -70.67), ("Talca, Maule", -35.43, -71.66), ("Ñuñoa", -33.46, -70.6)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "weather.db"))
+    yield manager
+    manager.close()
+
+
+def test_pages_follow_the_name_cursor_to_the_end(db):
+    assert db.get_cities_page() == ([], None)
+    db.import_cities(CITIES)
+
+    for limit in (1, 2, 3, 5, 6, 7):
+        names, after = [], None
+        while True:
+            cities, after = db.get_cities_page(after, limit)
+            names += [city["name"] for city in cities]
+            assert len(cities) <= limit
+            if after is None:
+                break
+        assert names == sorted(name for name, _, _ in CITIES), limit
+
+
+def test_full_last_page_returns_a_cursor_then_an_empty_page(db):
+    db.import_cities(CITIES[:4])
+
+    cities, after = db.get_cities_page(limit=2)
+    assert after == "Concepción"
+    cities, after = db.get_cities_page(after, 2)
+    assert [city["name"] for city in cities] == ["Puerto Montt", "Santiago"] and after == "Santiago"
+    assert db.get_cities_page(after, 2) == ([], None)
+
+
+def test_cursor_survives_deleting_the_city_it_points_to(db):
+    db.import_cities(CITIES)
+    _, after = db.get_cities_page(limit=2)
+    db.delete_city(after)
+
+    cities, _ = db.get_cities_page(after, 2)
+    assert [city["name"] for city in cities] == ["Puerto Montt", "Santiago"]
+
+
+def test_iter_cities_batch_sizes(db):
+    db.import_cities(CITIES)
+    for batch_size in (1, 4, 6, 100):
+        assert [city["name"] for city in db.iter_cities(batch_size)] == sorted(name for name, _, _ in CITIES)
+
+
+def test_update_mode_changes_existing_coordinates(db):
+    db.add_city("Santiago", 0.0, 0.0)
+
+    counts = db.import_cities(CITIES, on_conflict="update")
+
+    assert counts == {"inserted": 5, "updated": 1, "skipped": 0, "invalid": 0}
+    assert db.get_city("Santiago") == {"name": "Santiago", "lat": -33.45, "lon": -70.67}
+    assert db.find_nearest_cities(-33.45, -70.67)[0]["name"] == "Santiago"  # geohash actualizado
+
+
+def test_skip_mode_keeps_existing_coordinates(db):
+    db.add_city("Santiago", 0.0, 0.0)
+
+    counts = db.import_cities(CITIES)
+
+    assert counts == {"inserted": 5, "updated": 0, "skipped": 1, "invalid": 0}
+    assert db.get_city("Santiago")["lat"] == 0.0
+
+
+def test_names_repeated_in_one_import_count_once(db):
+    rows = [("Temuco", -38.74, -72.6), ("Valdivia", -39.81, -73.24), ("Temuco", -38.7, -72.5)]
+
+    counts = db.import_cities(rows, on_conflict="update", batch_size=2)
+    assert counts == {"inserted": 2, "updated": 0, "skipped": 0, "invalid": 0}
+    assert db.get_city("Temuco")["lat"] == -38.7  # Gana la última fila
+
+    counts = db.import_cities(rows + [("Osorno", -40.57, -73.14)], on_conflict="update", batch_size=2)
+    assert counts == {"inserted": 1, "updated": 2, "skipped": 0, "invalid": 0}
+
+
+def test_names_repeated_in_one_import_are_skipped_after_the_first(db):
+    counts = db.import_cities([("Temuco", -38.74, -72.6), ("Temuco", -38.7, -72.5)])
+
+    assert counts == {"inserted": 1, "updated": 0, "skipped": 1, "invalid": 0}
+    assert db.get_city("Temuco")["lat"] == -38.74
+
+
+def test_abort_mode_rolls_back_the_whole_import(db):
+    db.add_city("Santiago", 0.0, 0.0)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        db.import_cities(CITIES, on_conflict="abort", batch_size=2)
+    assert db.count_cities() == 1
+
+
+def test_invalid_rows_are_counted_and_skipped(db):
+    rows = [("Sin latitud", None, 1.0), ("", 1.0, 1.0), ("Polo", 91.0, 0.0), {"name": "Arica"},
+            {"name": "Arica", "latitude": "-18.48", "longitude": "-70.31"}]
+
+    counts = db.import_cities(rows)
+
+    assert counts == {"inserted": 1, "updated": 0, "skipped": 0, "invalid": 4}
+    assert db.get_city("Arica") == {"name": "Arica", "lat": -18.48, "lon": -70.31}
+
+
+@pytest.mark.parametrize("kind", ["csv", "json"])
+def test_export_import_round_trip(db, tmp_path, kind):
+    db.import_cities(CITIES)
+    path = tmp_path / f"cities.{kind}"
+    export = getattr(db, f"export_cities_{kind}")
+    assert export(str(path)) == len(CITIES)
+
+    other = DatabaseManager(str(tmp_path / "other.db"))
+    try:
+        counts = getattr(other, f"import_cities_{kind}")(str(path))
+        assert counts == {"inserted": len(CITIES), "updated": 0, "skipped": 0, "invalid": 0}
+        assert list(other.iter_cities()) == list(db.iter_cities())
+
+        assert getattr(other, f"import_cities_{kind}")(str(path), on_conflict="update")["updated"] == len(CITIES)
+    finally:
+        other.close()
+
+
+def spy_migrations(monkeypatch):
+    runs = []
+    original = DatabaseManager._migrate_geohash
+    monkeypatch.setattr(DatabaseManager, "_migrate_geohash",
+                        lambda self, cursor: runs.append(1) or original(self, cursor))
+    return runs
+
+
+def test_schema_marker_skips_the_ddl_on_later_starts(tmp_path, monkeypatch):
+    runs = spy_migrations(monkeypatch)
+    path = str(tmp_path / "weather.db")
+
+    first = DatabaseManager(path)
+    assert first._get_connection().execute('PRAGMA user_version').fetchone()[0] == DatabaseManager.SCHEMA_VERSION
+    first.close()
+    second = DatabaseManager(path)
+    second.close()
+
+    assert runs == [1]
+
+
+def test_newer_schema_version_runs_the_ddl_again(tmp_path, monkeypatch):
+    runs = spy_migrations(monkeypatch)
+    path = str(tmp_path / "weather.db")
+    DatabaseManager(path).close()
+
+    monkeypatch.setattr(DatabaseManager, "SCHEMA_VERSION", DatabaseManager.SCHEMA_VERSION + 1)
+    manager = DatabaseManager(path)
+
+    assert runs == [1, 1]
+    assert manager._get_connection().execute('PRAGMA user_version').fetchone()[0] == DatabaseManager.SCHEMA_VERSION
+    manager.close()
+
+
+def test_database_without_marker_is_migrated(tmp_path):
+    path = str(tmp_path / "weather.db")
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE cities (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute("INSERT INTO cities (name, latitude, longitude) VALUES ('Concepción', -36.83, -73.05)")
+    conn.commit()
+    conn.close()
+
+    manager = DatabaseManager(path)
+    try:
+        assert manager._get_connection().execute('PRAGMA user_version').fetchone()[0] == DatabaseManager.SCHEMA_VERSION
+        assert manager.find_nearest_cities(-36.8, -73.0)[0]["name"] == "Concepción"  # geohash completado
+        assert manager.get_last_selected_city() is None
+    finally:
+        manager.close()
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import weather_codes
+from forecast_arrays import ForecastArrays
+
+HOURS = [f"2024-05-01T{hour:02d}:00" for hour in range(24)]
+
+
+def sample():
+    return {
+        "success": True,
+        "current": {"temperature_2m": 12.5},
+        "utc_offset_seconds": -14400,
+        "hourly": {
+            "time": HOURS,
+            "temperature_2m": [float(hour) for hour in range(24)],
+            "precipitation": [None] * 12 + [0.5] * 12,
+            "weather_code": [0, 1, 2, 3, 45, 61, 95, None, 42, 0] + [3] * 14,
+        },
+        "daily": {
+            "time": ["2024-05-01"],
+            "sunrise": ["2024-05-01T07:30"],
+            "sunset": ["2024-05-01T18:15"],
+            "precipitation_sum": [6.0],
+            "weather_code": [61],
+        },
+    }
+
+
+@pytest.fixture
+def arrays():
+    return ForecastArrays(sample())
+
+
+def test_next_hours_include_the_current_hour_without_copying(arrays):
+    window = arrays.next_hours(3, now=np.datetime64("2024-05-01T10:45"))
+
+    assert window["temperature_2m"].tolist() == [10.0, 11.0, 12.0]
+    assert np.shares_memory(window["temperature_2m"], arrays.hourly["temperature_2m"])
+    assert arrays.next_hours(5, now=np.datetime64("2024-05-01T22:10"))["time"].size == 2
+
+
+def test_min_max_ignores_missing_values(arrays):
+    assert arrays.min_max("temperature_2m") == (0.0, 23.0)
+    assert arrays.min_max("precipitation") == (0.5, 0.5)
+    assert arrays.min_max("precipitation_sum", block="daily") == (6.0, 6.0)
+    assert arrays.min_max("uv_index") == (None, None)
+    assert ForecastArrays({"hourly": {"rain": [None, None]}}).min_max("rain") == (None, None)
+
+
+def test_rolling_mean_matches_a_plain_loop(arrays):
+    values = sample()["hourly"]["temperature_2m"]
+    expected = [sum(values[i:i + 4]) / 4 for i in range(len(values) - 3)]
+
+    assert np.allclose(arrays.rolling_mean("temperature_2m", 4), expected)
+    assert arrays.rolling_mean("temperature_2m", 0).size == 0
+    assert arrays.rolling_mean("temperature_2m", 25).size == 0
+
+
+def test_precipitation_totals(arrays):
+    assert arrays.precipitation_total() == pytest.approx(6.0)
+    assert arrays.precipitation_total(2, now=np.datetime64("2024-05-01T11:30")) == pytest.approx(0.5)
+    assert ForecastArrays({"daily": {"precipitation_sum": [1.5, 2.0]}}).precipitation_total() == 3.5
+    assert ForecastArrays({}).precipitation_total() == 0.0
+
+
+def test_icons_follow_sunrise_and_sunset(arrays):
+    icons = arrays.icons()
+    codes = sample()["hourly"]["weather_code"]
+
+    for hour, (code, icon) in enumerate(zip(codes, icons)):
+        is_day = 8 <= hour <= 18  # Hora en punto entre 07:30 y 18:15
+        assert icon == weather_codes.icon_file(code, is_day), hour
+
+
+def test_icons_with_explicit_is_day(arrays):
+    assert arrays.icons(is_day=False)[0] == weather_codes.icon_file(0, False) == "wi-night-clear.svg"
+    assert arrays.icons(is_day=True)[1] == "wi-day-sunny-overcast.svg"
+
+
+def test_unknown_and_missing_codes_use_the_defaults(arrays):
+    icons = arrays.icons(is_day=True)
+    descriptions = arrays.descriptions()
+
+    assert icons[7] == icons[8] == weather_codes.icon_file(None, True)
+    assert descriptions[7] == descriptions[8] == weather_codes.DEFAULT_DESCRIPTION
+    assert descriptions[5] == weather_codes.description(61)
+    assert arrays.descriptions("daily").tolist() == [weather_codes.description(61)]
+
+
+def test_hour_labels_match_format_time(weather_service, arrays):
+    assert arrays.hour_labels().tolist() == [weather_service.format_time(time, 'hour') for time in HOURS]
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+
+from database_manager import DatabaseManager
+from forecast_cache import ForecastCache
+
+
+def payload(temperature):
+    return {"success": True, "current": {"temperature_2m": temperature}}
+
+
+def temperature(cached):
+    forecast, _ = cached
+    return forecast.current.temperature_2m
+
+
+@pytest.fixture
+def db_manager(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "cache.db"))
+    yield manager
+    manager.close()
+
+
+def accessed_at(db_manager, key):
+    row = db_manager._get_connection().execute(
+        'SELECT accessed_at FROM forecast_cache WHERE cache_key = ?', (key,)).fetchone()
+    return row and row[0]
+
+
+def test_entries_expire_after_ttl():
+    cache = ForecastCache(ttl=60)
+    cache.set("fresca", payload(20))
+    cache.set("vencida", payload(10), fetched_at=time.time() - 120)
+
+    assert cache.get_forecast("fresca")[1] is True
+    assert cache.get_forecast("vencida")[1] is False
+    assert cache.get_forecast("vencida", ttl=300)[1] is True
+    assert cache.get_forecast("inexistente") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ForecastCache(max_entries=2)
+    cache.set("a", payload(1))
+    cache.set("b", payload(2))
+    cache.get_forecast("a")
+    cache.set("c", payload(3))
+
+    assert cache.get_forecast("b") is None
+    assert temperature(cache.get_forecast("a")) == 1
+    assert temperature(cache.get_forecast("c")) == 3
+
+
+def test_reads_do_not_write_until_next_store(db_manager):
+    cache = ForecastCache(db_manager, touch_interval=0)
+    cache.set("a", payload(1))
+    stored = accessed_at(db_manager, "a")
+
+    for _ in range(5):
+        cache.get_forecast("a")
+    assert accessed_at(db_manager, "a") == stored
+
+    cache.set("b", payload(2))
+    assert accessed_at(db_manager, "a") > stored
+
+
+def test_accesses_are_throttled_per_key(db_manager):
+    cache = ForecastCache(db_manager, touch_interval=60)
+    cache.set("a", payload(1))
+    stored = accessed_at(db_manager, "a")
+
+    cache.get_forecast("a")
+    cache.set("b", payload(2))
+    assert accessed_at(db_manager, "a") == stored  # Anotado hace menos de touch_interval
+
+
+def test_prune_keeps_recently_read_entries(db_manager):
+    cache = ForecastCache(db_manager, max_entries=2, touch_interval=0)
+    cache.set("a", payload(1))
+    cache.set("b", payload(2))
+    cache.get_forecast("a")
+    cache.set("c", payload(3))
+
+    restarted = ForecastCache(db_manager, max_entries=2)
+    assert restarted.get_forecast("b") is None
+    assert temperature(restarted.get_forecast("a")) == 1
+
+
+def test_stale_entries_recheck_the_database_at_most_once_per_interval(db_manager, monkeypatch):
+    other_process = ForecastCache(db_manager, ttl=60)
+    other_process.set("a", payload(1), fetched_at=time.time() - 120)
+    cache = ForecastCache(db_manager, ttl=60, recheck_interval=30)
+    assert cache.get_forecast("a")[1] is False
+
+    reads = []
+    original = db_manager.get_cached_forecast
+    monkeypatch.setattr(db_manager, "get_cached_forecast", lambda key: reads.append(key) or original(key))
+    other_process.set("a", payload(2))
+    for _ in range(3):
+        assert cache.get_forecast("a")[1] is False
+    assert reads == []
+
+    cache.recheck_interval = 0
+    renewed = cache.get_forecast("a")
+    assert renewed[1] is True and temperature(renewed) == 2
+    assert reads == ["a"]
+
+
+def test_get_entry_is_read_only(db_manager):
+    cache = ForecastCache(db_manager, max_entries=1, touch_interval=0)
+    cache.set("b", payload(2))
+    ForecastCache(db_manager).set("a", payload(1))  # Guardada por otro proceso
+
+    forecast, fetched_at = cache.get_entry("a")
+
+    assert forecast.current.temperature_2m == 1
+    assert list(cache._entries) == ["b"]  # Ni se guarda en memoria ni desaloja a "b"
+    assert cache._pending_touches == {}
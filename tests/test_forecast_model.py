@@ -0,0 +1,97 @@
+import math
+
+import pytest
+
+from forecast_model import NO_CODE, NO_TIME, Forecast
+
+
+def sample(**overrides):
+    data = {
+        "current": {"time": "2024-05-01T10:30", "interval": 900, "temperature_2m": 12.5, "is_day": 1,
+                    "weather_code": 3, "uv_index": 4.2},
+        "hourly": {
+            "time": ["2024-05-01T10:00", "2024-05-01T11:00", "2024-05-01T12:00"],
+            "temperature_2m": [12.5, None, 14],
+            "weather_code": [3, None, 61],
+            "precipitation_probability": [0, 35, 80],
+        },
+        "daily": {
+            "time": ["2024-05-01"],
+            "sunrise": ["2024-05-01T07:41"],
+            "sunset": ["--:--"],
+            "temperature_2m_max": [16.1],
+            "weather_code": [61],
+        },
+        "utc_offset_seconds": -14400,
+        "success": True,
+    }
+    data.update(overrides)
+    return data
+
+
+def test_dict_round_trip_keeps_the_original_values():
+    forecast = Forecast.from_dict(sample())
+
+    assert forecast.to_dict() == sample()
+    assert forecast.hourly.variables["weather_code"].typecode == "b"
+    assert forecast.daily.variables["sunrise"].typecode == "q"
+    assert forecast.daily.variables["sunset"][0] == NO_TIME
+    assert forecast.hourly.variables["weather_code"][1] == NO_CODE
+    assert math.isnan(forecast.hourly.variables["temperature_2m"][1])
+
+
+def test_byte_round_trip():
+    forecast = Forecast.from_dict(sample())
+
+    restored = Forecast.from_bytes(forecast.to_bytes())
+
+    assert restored.to_dict() == sample()
+    for name, values in forecast.hourly.variables.items():
+        assert restored.hourly.variables[name].typecode == values.typecode
+    assert restored.hourly.time == forecast.hourly.time
+
+
+def test_byte_round_trip_of_non_numeric_series_and_empty_blocks():
+    data = sample(hourly={"time": ["2024-05-01T10:00"], "wind_label": ["N", "NE"]}, daily={})
+    forecast = Forecast.from_dict(data)
+    assert isinstance(forecast.hourly.variables["wind_label"], tuple)
+
+    restored = Forecast.from_bytes(forecast.to_bytes())
+
+    assert restored.to_dict() == forecast.to_dict()
+    assert restored.to_dict()["daily"] == {"time": []}
+
+
+def test_byte_round_trip_of_a_single_block():
+    forecast = Forecast.from_dict(sample()).only("hourly")
+
+    restored = Forecast.from_bytes(bytes(forecast.to_bytes()))
+
+    assert restored.current.to_dict() == {}
+    assert len(restored.daily) == 0
+    assert restored.to_dict()["hourly"] == sample()["hourly"]
+    assert restored.success and restored.utc_offset_seconds == -14400
+
+
+def test_from_bytes_accepts_memoryview_and_rejects_unknown_formats():
+    blob = Forecast.from_dict(sample()).to_bytes()
+    assert Forecast.from_bytes(memoryview(blob)).to_dict() == sample()
+
+    with pytest.raises(ValueError):
+        Forecast.from_bytes(b"XXXX" + blob[4:])
+
+
+def test_arrays_are_stored_little_endian():
+    forecast = Forecast.from_dict(sample(hourly={"time": ["2024-05-01T10:00"], "temperature_2m": [1.0]},
+                                         daily={}))
+
+    blob = forecast.to_bytes()
+
+    assert blob[-8:] == b"\x00\x00\x00\x00\x00\x00\xf0\x3f"  # 1.0 como float64 little-endian
+
+
+def test_widget_fields_default_missing_values():
+    assert Forecast.from_dict({}).widget_fields() == {
+        "temperature": 0, "humidity": 0, "wind_speed": 0, "weather_code": 0, "is_day": 1}
+    fields = Forecast.from_dict(sample()).widget_fields()
+    assert fields["temperature"] == 12.5 and fields["weather_code"] == 3 and fields["is_day"] == 1
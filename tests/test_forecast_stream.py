@@ -0,0 +1,111 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from forecast_model import Forecast
+from forecast_stream import parse_forecast_stream
+
+OFFSET = -3 * 3600  # América/Santiago en invierno
+START = datetime(2024, 5, 1)  # Hora local
+
+
+def location(unixtime=False, offset=OFFSET, lat=-36.83):
+    """Respuesta de una ubicación con horas ISO locales, o unixtime (UTC) con utc_offset_seconds"""
+    def fmt(moment, pattern):
+        if unixtime:
+            return int((moment - timedelta(seconds=offset)).replace(tzinfo=timezone.utc).timestamp())
+        return moment.strftime(pattern)
+
+    hours = [START + timedelta(hours=h) for h in range(30)]
+    days = [START + timedelta(days=d) for d in range(2)]
+    return {
+        "latitude": lat, "longitude": -73.05, "utc_offset_seconds": offset,
+        "timezone": "America/Santiago", "timezone_abbreviation": "-03", "elevation": 12.0,
+        "current_units": {"temperature_2m": "°C"},
+        "current": {"time": fmt(START + timedelta(hours=13, minutes=15), '%Y-%m-%dT%H:%M'), "interval": 900,
+                    "temperature_2m": -12.375, "relative_humidity_2m": 87, "weather_code": 61, "is_day": 1,
+                    "precipitation": None},
+        "hourly": {
+            "time": [fmt(h, '%Y-%m-%dT%H:%M') for h in hours],
+            "temperature_2m": [round(-5.25 + h * 1.125, 3) if h % 7 else None for h in range(30)],
+            "precipitation_probability": [h * 3 for h in range(30)],
+            "weather_code": [None if h == 4 else (h * 7) % 100 for h in range(30)],
+            "precipitation": [1.5e-3 * h for h in range(30)],
+        },
+        "daily": {
+            "time": [fmt(d, '%Y-%m-%d') for d in days],
+            "sunrise": [fmt(d + timedelta(hours=7, minutes=48), '%Y-%m-%dT%H:%M') for d in days],
+            "sunset": [None, fmt(days[1] + timedelta(hours=18, minutes=2), '%Y-%m-%dT%H:%M')],
+            "temperature_2m_max": [14.25, None],
+            "uv_index_max": [3.45, 123456.789],
+        },
+    }
+
+
+def reference(data):
+    """Camino json.loads de WeatherService (_parse_entry)"""
+    if isinstance(data, list):
+        return [reference(entry) for entry in data]
+    if data.get('error'):
+        return Forecast.from_dict({})
+    return Forecast.from_dict({
+        'current': data.get('current', {}), 'hourly': data.get('hourly', {}),
+        'daily': data.get('daily', {}), 'utc_offset_seconds': data.get('utc_offset_seconds', 0),
+        'success': True,
+    })
+
+
+def chunked(data, size):
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def as_dicts(result):
+    return [forecast.to_dict() for forecast in result] if isinstance(result, list) else result.to_dict()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1 << 20])
+def test_stream_matches_json_path(size):
+    data = location()
+    assert as_dicts(parse_forecast_stream(chunked(data, size))) == as_dicts(reference(data))
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 1 << 20])
+@pytest.mark.parametrize("offset", [OFFSET, 0, 5 * 3600 + 1800])
+def test_unixtime_matches_local_iso_times(size, offset):
+    streamed = parse_forecast_stream(chunked(location(unixtime=True, offset=offset), size))
+    assert streamed.to_dict() == reference(location(offset=offset)).to_dict()
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 1 << 20])
+def test_multi_location_list_with_error_entry(size):
+    data = [location(), {"error": True, "reason": "Latitud inválida"}, location(lat=-38.74)]
+    streamed = parse_forecast_stream(chunked(data, size))
+
+    assert [forecast.success for forecast in streamed] == [True, False, True]
+    assert as_dicts(streamed) == as_dicts(reference(data))
+
+
+def test_nulls_are_kept_as_missing_values():
+    streamed = parse_forecast_stream(chunked(location(), 5)).to_dict()
+
+    assert streamed['hourly']['temperature_2m'][0] is None
+    assert streamed['hourly']['weather_code'][4] is None
+    assert streamed['daily']['sunset'][0] == '--:--'
+    assert streamed['daily']['temperature_2m_max'][1] is None
+
+
+def test_numbers_split_across_chunks():
+    data = {"utc_offset_seconds": 0, "hourly": {"time": ["2024-05-01T00:00"], "temperature_2m": [-123.456789]}}
+    body = json.dumps(data).encode('utf-8')
+    split = body.index(b'-123.4') + 4  # Corta el número por la mitad
+    streamed = parse_forecast_stream([body[:split], body[split:]])
+
+    assert streamed.hourly.variables['temperature_2m'][0] == -123.456789
+
+
+def test_truncated_response_is_rejected():
+    body = json.dumps(location()).encode('utf-8')
+    with pytest.raises(ValueError):
+        parse_forecast_stream([body[:len(body) // 2]])
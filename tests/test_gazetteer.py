@@ -0,0 +1,98 @@
+import pytest
+
+from gazetteer import Gazetteer, build_index, normalize_name
+
+
+def geonames_row(geonameid, name, population, lat=0.0, lon=0.0, ascii_name=None, alternates="", country="CL"):
+    columns = [""] * 19
+    columns[0], columns[1], columns[2], columns[3] = str(geonameid), name, ascii_name or name, alternates
+    columns[4], columns[5], columns[8], columns[10], columns[14] = str(lat), str(lon), country, "01", str(population)
+    return "\t".join(columns)
+
+
+@pytest.fixture
+def make_gazetteer(tmp_path):
+    opened = []
+
+    def make(rows, **kwargs):
+        source = tmp_path / "cities.txt"
+        source.write_text("\n".join(rows) + "\n", encoding="utf-8")
+        index = tmp_path / "gazetteer.idx"
+        build_index(str(source), str(index), **kwargs)
+        gazetteer = Gazetteer(str(index))
+        opened.append(gazetteer)
+        return gazetteer
+
+    yield make
+    for gazetteer in opened:
+        gazetteer.close()
+
+
+def test_normalize_name_strips_accents_and_case():
+    assert normalize_name("  Concepción ") == "concepcion"
+    assert normalize_name("SÃO   Paulo") == "sao paulo"
+    assert normalize_name("Москва") == "москва"
+
+
+def test_most_populated_city_wins_even_if_it_sorts_late(make_gazetteer):
+    # Miles de pueblos "Santa ..." ordenan antes que "Santo Domingo"
+    rows = [geonames_row(i, f"Santa Aldea {i:05d}", 100 + i) for i in range(1, 6001)]
+    rows.append(geonames_row(9001, "Santo Domingo", 3_000_000))
+    rows.append(geonames_row(9002, "Santiago", 6_000_000))
+    gazetteer = make_gazetteer(rows)
+
+    for query in ("s", "sa", "san", "sant", "santo"):
+        names = [result["name"] for result in gazetteer.search(query, limit=3)]
+        assert names[0] == ("Santo Domingo" if query == "santo" else "Santiago"), query
+    assert [r["name"] for r in gazetteer.search("sant", limit=2)] == ["Santiago", "Santo Domingo"]
+    assert gazetteer.search("santa aldea 060")[0]["population"] == 100 + 6000
+
+
+def test_search_ignores_accents_and_case(make_gazetteer):
+    gazetteer = make_gazetteer([
+        geonames_row(1, "Concepción", 223_574, -36.82699, -73.04977, ascii_name="Concepcion"),
+        geonames_row(2, "Concón", 42_152),
+    ])
+
+    for query in ("concep", "CONCEPCIÓN", "Concepcion"):
+        results = gazetteer.search(query)
+        assert [result["name"] for result in results] == ["Concepción"]
+        assert results[0]["lat"] == -36.82699 and results[0]["country"] == "CL"
+    assert [result["name"] for result in gazetteer.search("con")] == ["Concepción", "Concón"]
+
+
+def test_search_non_latin_names(make_gazetteer):
+    gazetteer = make_gazetteer([
+        geonames_row(1, "Москва", 10_381_222, ascii_name="Moskva", country="RU"),
+        geonames_row(2, "Мостовской", 25_000, ascii_name="Mostovskoy", country="RU"),
+        geonames_row(3, "東京", 8_336_599, ascii_name="Tokyo", country="JP"),
+    ])
+
+    assert [result["name"] for result in gazetteer.search("Мос")] == ["Москва", "Мостовской"]
+    assert [result["name"] for result in gazetteer.search("москва")] == ["Москва"]
+    assert [result["name"] for result in gazetteer.search("東")] == ["東京"]
+    assert [result["name"] for result in gazetteer.search("tok")] == ["東京"]
+
+
+def test_alternate_names_return_each_city_once(make_gazetteer):
+    rows = [geonames_row(1, "Valparaíso", 282_448, alternates="Valparaiso,Valparayso,Valpo")]
+    rows += [geonames_row(10 + i, f"Valle {i}", 1_000 + i) for i in range(5)]
+    gazetteer = make_gazetteer(rows, include_alternate_names=True)
+
+    for query in ("val", "valp", "valparai"):
+        results = gazetteer.search(query, limit=3)
+        assert [result["geonameid"] for result in results].count(1) == 1, query
+        assert results[0]["name"] == "Valparaíso"
+    assert gazetteer.search("valpo")[0]["name"] == "Valparaíso"
+
+
+def test_build_skips_small_and_malformed_rows(make_gazetteer):
+    gazetteer = make_gazetteer([
+        geonames_row(1, "Temuco", 238_129),
+        geonames_row(2, "Tomé", 500),
+        "3\tlínea incompleta",
+        geonames_row("x", "Talca", 200_000),
+    ], min_population=1_000)
+
+    assert [result["name"] for result in gazetteer.search("t")] == ["Temuco"]
+    assert gazetteer.search("") == []
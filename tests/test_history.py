@@ -0,0 +1,66 @@
+from datetime import date
+
+from spatial_index import grid_cell
+
+START, END = date(2000, 1, 1), date(2100, 1, 1)
+
+
+def test_cities_sharing_a_grid_cell_share_history(weather_service, fake_server):
+    weather_service.add_location("Norte", 40.001, -2.999)
+    weather_service.add_location("Sur", 40.002, -2.998)
+    assert grid_cell(40.001, -2.999) == grid_cell(40.002, -2.998)
+
+    results = weather_service.get_weather_data_bulk(["Norte", "Sur"])
+
+    assert results["Norte"]["success"] and results["Sur"]["success"]
+    assert fake_server.requests == 1  # Una sola descarga para toda la celda
+    norte = weather_service.get_history("Norte", "temperature_2m", START, END)
+    sur = weather_service.get_history("Sur", "temperature_2m", START, END)
+    assert norte and norte == sur
+    assert weather_service.get_history("Sur", "temperature_2m", START, END, daily=True)
+
+
+def test_history_recorded_before_grid_cells_is_still_found(weather_service):
+    weather_service.add_location("Norte", 40.001, -2.999)
+    slot = f"{date.today().isoformat()}T10:00"
+    weather_service.history.ingest(40.001, -2.999, {
+        "success": True,
+        "hourly": {"time": [slot], "temperature_2m": [18.5]},
+    })
+
+    assert weather_service.get_history("Norte", "temperature_2m", START, END) == [(slot, 18.5)]
+
+
+def ingest_hours(service, lat, lon, hours):
+    day = date.today().isoformat()
+    service.history.ingest(lat, lon, {
+        "success": True,
+        "hourly": {"time": [f"{day}T{hour:02d}:00" for hour in hours], "temperature_2m": list(hours.values())},
+    })
+    return day
+
+
+def test_grid_cell_history_wins_over_exact_coordinates(weather_service):
+    weather_service.add_location("Norte", 40.001, -2.999)
+    ingest_hours(weather_service, 40.001, -2.999, {8: 11.0})
+    day = ingest_hours(weather_service, *grid_cell(40.001, -2.999), {9: 14.0})
+
+    assert weather_service.get_history("Norte", "temperature_2m", START, END) == [(f"{day}T09:00", 14.0)]
+
+
+def test_daily_history_falls_back_to_exact_coordinates(weather_service):
+    weather_service.add_location("Norte", 40.001, -2.999)
+    day = ingest_hours(weather_service, 40.001, -2.999, {6: 10.0, 14: 20.0})
+
+    daily = weather_service.get_history("Norte", "temperature_2m", START, END, daily=True)
+
+    assert daily == [{"day": day, "min": 10.0, "max": 20.0, "mean": 15.0, "samples": 2}]
+
+
+def test_history_of_unknown_or_empty_locations(weather_service):
+    weather_service.add_location("Norte", 40.001, -2.999)
+    weather_service.history.ingest(40.001, -2.999, {"success": False, "hourly": {"time": [], "temperature_2m": []}})
+
+    assert weather_service.get_history("Atlántida", "temperature_2m", START, END) == []
+    assert weather_service.get_history("Norte", "temperature_2m", START, END) == []
+    assert weather_service.get_history("Norte", "temperature_2m", START, END, daily=True) == []
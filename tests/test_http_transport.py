@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+import http_transport
+from http_transport import HttpTransport
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Devuelve (o lanza) las respuestas indicadas, una por intento"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None, stream=False):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(http_transport.time, "sleep", slept.append)
+    return slept
+
+
+def transport(*outcomes, **kwargs):
+    return HttpTransport(session=FakeSession(*outcomes), **kwargs)
+
+
+def test_transient_status_is_retried_with_backoff(sleeps):
+    failed = FakeResponse(503)
+    client = transport(failed, FakeResponse(200), backoff_base=0.5)
+
+    assert client.get("http://api").status_code == 200
+    assert client.session.calls == 2
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= 0.5
+    assert failed.closed
+
+
+def test_retry_after_seconds_is_respected(sleeps):
+    client = transport(FakeResponse(429, {"Retry-After": "2"}), FakeResponse(200))
+
+    assert client.get("http://api").status_code == 200
+    assert sleeps == [2.0]
+
+
+def test_retry_after_http_date_is_respected(sleeps):
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=5)
+    client = transport(FakeResponse(503, {"Retry-After": format_datetime(retry_at, usegmt=True)}),
+                       FakeResponse(200))
+
+    client.get("http://api")
+    assert len(sleeps) == 1 and 3 <= sleeps[0] <= 5
+
+
+def test_retry_after_in_the_past_retries_immediately(sleeps):
+    client = transport(FakeResponse(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), FakeResponse(200))
+
+    client.get("http://api")
+    assert sleeps == [0]
+
+
+def test_invalid_retry_after_falls_back_to_backoff(sleeps):
+    client = transport(FakeResponse(503, {"Retry-After": "pronto"}), FakeResponse(200), backoff_base=0.5)
+
+    client.get("http://api")
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= 0.5
+
+
+def test_too_long_retry_after_returns_the_response(sleeps):
+    client = transport(FakeResponse(429, {"Retry-After": "120"}), FakeResponse(200), max_retry_after=30)
+
+    assert client.get("http://api").status_code == 429
+    assert sleeps == [] and client.session.calls == 1
+
+
+def test_last_response_is_returned_when_retries_run_out(sleeps):
+    client = transport(*[FakeResponse(502) for _ in range(3)], max_retries=2)
+
+    response = client.get("http://api")
+    assert response.status_code == 502 and not response.closed
+    assert client.session.calls == 3 and len(sleeps) == 2
+
+
+def test_client_errors_are_not_retried(sleeps):
+    client = transport(FakeResponse(404))
+
+    assert client.get("http://api").status_code == 404
+    assert sleeps == [] and client.session.calls == 1
+
+
+def test_network_errors_are_retried_then_raised(sleeps):
+    client = transport(requests.ConnectionError("sin red"), requests.Timeout("lento"),
+                       requests.ConnectionError("sin red"), max_retries=2)
+
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://api")
+    assert client.session.calls == 3 and len(sleeps) == 2
+
+
+def test_backoff_grows_exponentially_up_to_the_maximum():
+    client = transport(backoff_base=0.5, backoff_max=4.0)
+
+    for attempt, ceiling in enumerate([0.5, 1.0, 2.0, 4.0, 4.0, 4.0]):
+        delays = [client._backoff_delay(attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2  # Jitter completo: cubre todo el intervalo
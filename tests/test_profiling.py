@@ -0,0 +1,70 @@
+import tracemalloc
+
+from profiling import start_profiling_from_env
+
+
+def test_profiling_can_be_restarted_after_stop(monkeypatch):
+    monkeypatch.setenv("WEATHER_PROFILE", "1")
+    monkeypatch.setenv("WEATHER_PROFILE_INTERVAL", "3600")
+    monkeypatch.setenv("WEATHER_PROFILE_SAMPLE", "0")
+
+    profiler = start_profiling_from_env()
+    assert profiler is not None and tracemalloc.is_tracing()
+    assert start_profiling_from_env() is None  # Una sola vez mientras está en marcha
+
+    profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+    restarted = start_profiling_from_env()
+    try:
+        assert restarted is not None and tracemalloc.is_tracing()
+    finally:
+        restarted.stop()
+
+
+def test_memory_tracker_leaves_foreign_tracing_running():
+    from profiling import MemoryTracker
+
+    tracemalloc.start()
+    try:
+        tracker = MemoryTracker()
+        tracker.start()
+        tracker.stop()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_stopping_another_profiler_keeps_the_env_one_registered(monkeypatch):
+    from profiling import Profiler
+
+    monkeypatch.setenv("WEATHER_PROFILE", "1")
+    monkeypatch.setenv("WEATHER_PROFILE_INTERVAL", "3600")
+    monkeypatch.setenv("WEATHER_PROFILE_SAMPLE", "0")
+    profiler = start_profiling_from_env()
+    try:
+        other = Profiler(interval=3600, sample_interval=0)
+        other.start()
+        other.stop()
+        assert start_profiling_from_env() is None
+        assert tracemalloc.is_tracing()  # Lo arrancó el perfilador del entorno
+    finally:
+        profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+
+def test_widget_service_stops_its_profiler(monkeypatch, shared_data):
+    from widget_service import WidgetService
+
+    monkeypatch.setenv("WEATHER_PROFILE", "1")
+    monkeypatch.setenv("WEATHER_PROFILE_INTERVAL", "3600")
+    monkeypatch.setenv("WEATHER_PROFILE_SAMPLE", "0")
+    service = WidgetService()
+    service.start()
+    assert service.profiler is not None
+    service.stop()
+
+    assert not tracemalloc.is_tracing()
+    restarted = start_profiling_from_env()
+    assert restarted is not None
+    restarted.stop()
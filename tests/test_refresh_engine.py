@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from refresh_engine import InterProcessLock, RefreshEngine, SingleFlight
+
+DEFAULT = {"success": False, "city": "default"}
+
+
+class FakeService:
+    """Servicio mínimo: cada refresco tarda delay segundos y se anota"""
+
+    def __init__(self, delay=0.0, failing=()):
+        self.delay = delay
+        self.failing = set(failing)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def refresh_weather_data(self, name):
+        with self._lock:
+            self.calls.append(name)
+        time.sleep(self.delay)
+        if name in self.failing:
+            raise RuntimeError(f"fallo en {name}")
+        return {"success": True, "city": name}
+
+    def get_all_locations(self):
+        return ["Concepción", "Temuco"]
+
+    def get_default_data(self):
+        return dict(DEFAULT)
+
+
+@pytest.fixture
+def engine_for():
+    engines = []
+
+    def make(service, **kwargs):
+        engine = RefreshEngine(service, **kwargs)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.shutdown()
+
+
+def run_concurrently(fn, times):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(times)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_flight_runs_each_key_once():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "datos"
+
+    assert run_concurrently(lambda: flight.do("clave", slow), 5) == ["datos"] * 5
+    assert calls == [1]
+    assert flight.in_flight() == 0
+
+    flight.do("clave", slow)
+    assert calls == [1, 1]  # Terminada la ejecución, la clave vuelve a ejecutarse
+
+
+def test_single_flight_shares_the_error_with_every_caller():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("sin red")
+
+    def call():
+        try:
+            return flight.do("clave", failing)
+        except ValueError as e:
+            return str(e)
+
+    assert run_concurrently(call, 4) == ["sin red"] * 4
+    assert flight.in_flight() == 0
+
+
+def test_submit_reuses_the_refresh_in_progress(engine_for):
+    service = FakeService(delay=0.2)
+    engine = engine_for(service)
+
+    first = engine.submit("Concepción")
+    assert engine.submit("Concepción") is first
+    assert first.result() == {"success": True, "city": "Concepción"}
+
+    time.sleep(0.05)  # El callback que la olvida corre al terminar
+    second = engine.submit("Concepción")
+    assert second is not first
+    second.result()
+    assert service.calls == ["Concepción", "Concepción"]
+
+
+def test_refresh_many_runs_in_parallel_and_defaults_on_failure(engine_for):
+    service = FakeService(delay=0.2, failing={"Temuco"})
+    engine = engine_for(service, max_concurrency=4)
+
+    started = time.monotonic()
+    results = engine.refresh_many()
+
+    assert time.monotonic() - started < 0.35
+    assert results == {"Concepción": {"success": True, "city": "Concepción"}, "Temuco": DEFAULT}
+
+
+def test_refresh_many_timeout_returns_defaults_for_unfinished(engine_for):
+    engine = engine_for(FakeService(delay=0.5))
+
+    assert engine.refresh_many(["Concepción"], timeout=0.05) == {"Concepción": DEFAULT}
+
+
+def test_refresh_async(engine_for):
+    engine = engine_for(FakeService(failing={"Temuco"}))
+
+    results = asyncio.run(engine.refresh_async(["Concepción", "Temuco"]))
+
+    assert results == {"Concepción": {"success": True, "city": "Concepción"}, "Temuco": DEFAULT}
+
+
+def test_callbacks_arrive_per_city_and_complete_once(engine_for):
+    engine = engine_for(FakeService(delay=0.05))
+    received = []
+    completed = threading.Event()
+    completions = []
+
+    def callback(name, data):
+        received.append((name, data["success"]))
+        if name == "Temuco":
+            raise RuntimeError("la interfaz falló")
+
+    def on_complete():
+        completions.append(1)
+        completed.set()
+
+    engine.refresh_with_callback(None, callback, on_complete)
+
+    assert completed.wait(2)
+    assert sorted(received) == [("Concepción", True), ("Temuco", True)]
+    assert completions == [1]
+
+
+def test_callbacks_with_no_cities_complete_immediately(engine_for):
+    engine = engine_for(FakeService())
+    completions = []
+
+    assert engine.refresh_with_callback([], lambda name, data: None, lambda: completions.append(1)) == {}
+    assert completions == [1]
+
+
+def test_inter_process_lock_excludes_threads_on_the_same_key(tmp_path):
+    lock = InterProcessLock(str(tmp_path / "locks"), stripes=4)
+    inside = []
+    overlaps = []
+
+    def hold():
+        with lock.hold("-36.8375,-73.0375|current"):
+            inside.append(1)
+            if len(inside) > 1:
+                overlaps.append(1)
+            time.sleep(0.02)
+            inside.pop()
+
+    try:
+        run_concurrently(hold, 6)
+    finally:
+        lock.close()
+    assert overlaps == []
@@ -0,0 +1,106 @@
+import time
+
+from refresh_scheduler import AdaptiveRefreshScheduler, RequestBudget
+
+
+def make_scheduler(service):
+    return AdaptiveRefreshScheduler(service, budget=RequestBudget(per_minute=1000, per_day=100000),
+                                    failure_backoff=120)
+
+
+def test_successful_refresh_is_not_due_again(weather_service):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    scheduler = make_scheduler(weather_service)
+    now = time.time()
+
+    results = scheduler.run_once(now)
+    assert results["Concepción"]["success"] and not results["Concepción"].get("stale")
+    assert scheduler.due_locations(now + 1) == []
+
+
+def test_upstream_failure_backs_off(weather_service, fake_server):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    weather_service.add_location("Temuco", -38.74, -72.60)
+    scheduler = make_scheduler(weather_service)
+    now = time.time()
+    scheduler.run_once(now)
+
+    fake_server.error_rate = 1.0
+    later = now + 4 * 3600  # Ambas vencidas en segundo plano
+    results = scheduler.run_once(later)
+
+    # Se sirven los últimos datos guardados, marcados como vencidos
+    assert all(data["stale"] and data["success"] for data in results.values())
+    assert scheduler.due_locations(later + 1) == []
+    assert scheduler.next_refresh_at("Concepción", later) == later + 120
+
+    requests_before = fake_server.requests
+    scheduler.run_once(later + 121)
+    assert scheduler.next_refresh_at("Concepción", later + 121) == later + 121 + 240  # backoff exponencial
+    assert fake_server.requests - requests_before <= 1
+
+
+def test_recovery_clears_backoff(weather_service, fake_server):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    scheduler = make_scheduler(weather_service)
+    now = time.time()
+    fake_server.error_rate = 1.0
+    scheduler.run_once(now)
+    assert scheduler.next_refresh_at("Concepción", now) == now + 120
+
+    fake_server.error_rate = 0.0
+    weather_service.breaker.reset()
+    results = scheduler.run_once(now + 121)
+    assert not results["Concepción"].get("stale")
+    assert "Concepción" not in scheduler._retry_at
+
+
+def test_ticks_only_look_at_due_cities(weather_service, monkeypatch):
+    for i in range(5):
+        weather_service.add_location(f"Ciudad {i}", -36 - i, -73)
+    scheduler = make_scheduler(weather_service)
+    now = time.time()
+    scheduler.run_once(now)
+
+    lookups = []
+    original = weather_service.get_cache_entry
+    monkeypatch.setattr(weather_service, "get_cache_entry", lambda name: lookups.append(name) or original(name))
+    for tick in range(1, 4):
+        assert scheduler.run_once(now + tick) == {}
+        assert scheduler.seconds_until_next(now + tick) > 0
+    assert lookups == []
+
+    weather_service.add_location("Nueva", -40, -70)
+    assert scheduler.due_locations(now + 5) == ["Nueva"]
+    assert lookups == ["Nueva", "Nueva"]  # Al incorporarla y al confirmar que venció
+
+
+def test_visibility_change_reschedules_the_city(weather_service):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    scheduler = make_scheduler(weather_service)
+    now = time.time()
+    scheduler.run_once(now)
+    background = scheduler.seconds_until_next(now)
+
+    scheduler.set_visible(["Concepción"])
+
+    assert scheduler.seconds_until_next(now) < background
+    assert scheduler.seconds_until_next(now) <= scheduler.visible_interval
+
+
+def test_scheduled_refreshes_are_not_hedged(weather_service, fake_server):
+    weather_service.hedge = True
+    for _ in range(20):
+        weather_service.breaker.record_success(0.001)  # p95 reciente de 1 ms: toda petición es lenta
+    fake_server.latency = 0.2
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    weather_service.add_location("Temuco", -38.74, -72.60)
+    scheduler = make_scheduler(weather_service)
+
+    results = scheduler.run_once(time.time())
+
+    assert set(results) == {"Concepción", "Temuco"}
+    assert fake_server.requests == 1  # Una petición múltiple, la misma que descontó el presupuesto
+
+    weather_service.get_weather_data_bulk(["Concepción", "Temuco"])
+    assert fake_server.requests == 3  # Fuera del planificador sí se duplica
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from shared_data import _atomic_write, city_snapshot_path
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_update_publishes_immutable_snapshot(shared_data):
+    shared_data.update_weather_data("Concepción", 12, "Nublado")
+    before = shared_data.get_weather_data()
+    shared_data.update_weather_data("Concepción", 14, "Despejado")
+
+    assert before["temperature"] == 12  # copy-on-write: el snapshot anterior no cambia
+    assert shared_data.get_weather_data()["temperature"] == 14
+    with pytest.raises(TypeError):
+        shared_data.get_weather_data()["temperature"] = 0
+
+
+def test_updates_are_debounced_until_flush(shared_data):
+    shared_data.update_weather_data("Polcura", 10, "Nublado")  # primera escritura inmediata
+    shared_data.update_weather_data("Polcura", 20, "Lluvia")  # queda pendiente
+    assert read_json(shared_data.data_file)["temperature"] == 10
+
+    shared_data.flush()
+    assert read_json(shared_data.data_file)["temperature"] == 20
+
+
+def test_flush_writes_only_changed_cities(shared_data):
+    shared_data.update_weather_data("A", 1, "x", primary=False)
+    shared_data.update_weather_data("B", 2, "x", primary=False)
+    shared_data.flush()
+    path_a = city_snapshot_path(shared_data.data_dir, "A")
+    written = read_json(path_a)["sequence"]
+
+    shared_data.update_weather_data("B", 3, "x", primary=False)
+    shared_data.flush()
+    assert read_json(path_a)["sequence"] == written
+    assert read_json(city_snapshot_path(shared_data.data_dir, "B"))["temperature"] == 3
+
+
+def test_reload_ignores_own_write_with_pending_update(shared_data):
+    shared_data.update_weather_data("Polcura", 10, "Nublado")
+    shared_data.update_weather_data("Polcura", 20, "Lluvia")
+
+    # El watcher avisa de la escritura de 10° mientras 20° sigue pendiente
+    assert shared_data.reload_from_disk() is False
+    assert shared_data.get_weather_data()["temperature"] == 20
+
+    shared_data.flush()
+    assert read_json(shared_data.data_file)["temperature"] == 20
+
+
+def test_reload_takes_newer_write_from_other_process(shared_data):
+    shared_data.update_weather_data("Polcura", 10, "Nublado")
+    other = dict(read_json(shared_data.data_file), temperature=25, writer="otro-proceso",
+                 last_update=(datetime.now() + timedelta(seconds=5)).isoformat())
+    with open(shared_data.data_file, 'w', encoding='utf-8') as f:
+        json.dump(other, f)
+
+    assert shared_data.reload_from_disk() is True
+    assert shared_data.get_weather_data()["temperature"] == 25
+    assert shared_data.get_weather_data("Polcura")["temperature"] == 25
+
+
+def test_reload_keeps_newer_pending_update_over_older_foreign_write(shared_data):
+    shared_data.update_weather_data("Polcura", 10, "Nublado")
+    stale = dict(read_json(shared_data.data_file), temperature=5, writer="otro-proceso",
+                 last_update=(datetime.now() - timedelta(minutes=5)).isoformat())
+    shared_data.update_weather_data("Polcura", 20, "Lluvia")
+    with open(shared_data.data_file, 'w', encoding='utf-8') as f:
+        json.dump(stale, f)
+
+    assert shared_data.reload_from_disk() is False
+    shared_data.flush()
+    assert read_json(shared_data.data_file)["temperature"] == 20
+
+
+def test_concurrent_atomic_writes_never_tear_the_file(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    contents = [json.dumps({"writer": i, "padding": "x" * 200000}).encode() for i in range(8)]
+    errors = []
+
+    def write(content):
+        try:
+            for _ in range(10):
+                _atomic_write(path, content)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(content,)) for content in contents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with open(path, 'rb') as f:
+        assert f.read() in contents
+    assert os.listdir(tmp_path) == ["snapshot.json"]  # Sin temporales huérfanos
+
+
+def test_subscribers_only_hear_about_the_primary_city(shared_data):
+    seen = []
+    shared_data.subscribe(lambda data: seen.append(data["city"]))
+    shared_data.update_weather_data("Principal", 10, "Nublado")
+    shared_data.update_weather_data("Otra", 11, "Nublado", primary=False)
+    shared_data.set_alerts({"Otra": [{"rule": "lluvia"}]})
+    assert seen == ["Principal"]
+
+    shared_data.set_alerts({"Otra": [], "Principal": [{"rule": "helada"}]})
+    assert seen == ["Principal", "Principal"]
+    assert shared_data.get_weather_data()["alerts"] == ({"rule": "helada"},)
+
+
+def test_removing_the_primary_city_promotes_the_latest_one(shared_data):
+    shared_data.update_weather_data("Vieja", 1, "x", primary=False)
+    shared_data.update_weather_data("Reciente", 2, "x", primary=False)
+    shared_data.update_weather_data("Principal", 3, "x")
+    shared_data.flush()
+    seen = []
+    shared_data.subscribe(lambda data: seen.append(data["city"]))
+
+    assert shared_data.remove_city("Principal")
+    shared_data.flush()
+
+    assert shared_data.get_weather_data()["city"] == "Reciente"
+    assert seen == ["Reciente"]
+    assert read_json(shared_data.data_file)["city"] == "Reciente"
+    assert not os.path.exists(city_snapshot_path(shared_data.data_dir, "Principal"))
+
+
+def test_removing_the_last_city_restores_default_data(shared_data):
+    shared_data.update_weather_data("Única", 3, "x")
+    shared_data.remove_city("Única")
+    assert shared_data.get_weather_data()["city"] == "Agregar ciudad"
+
+
+def test_pending_write_does_not_recreate_removed_city(shared_data):
+    shared_data.update_weather_data("Principal", 1, "x")  # primera escritura inmediata
+    shared_data.update_weather_data("Borrada", 2, "x", primary=False)  # queda pendiente
+    shared_data.remove_city("Borrada")
+    shared_data.flush()
+
+    assert not os.path.exists(city_snapshot_path(shared_data.data_dir, "Borrada"))
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from forecast_model import Forecast
+
+
+@pytest.fixture
+def requested(weather_service, monkeypatch):
+    """Bloques pedidos en cada petición a la API"""
+    blocks = []
+    original = weather_service._request_forecasts
+    monkeypatch.setattr(weather_service, "_request_forecasts", lambda params: blocks.append(
+        tuple(block for block in weather_service.BLOCKS if block in params)) or original(params))
+    return blocks
+
+
+def age_block(service, location, block, seconds):
+    """Retrasa fetched_at de un bloque guardado"""
+    key = service._cache_key(location, block)
+    forecast, fetched_at = service.cache.get_entry(key)
+    service.cache.set(key, forecast, fetched_at=fetched_at - seconds)
+
+
+def test_refresh_only_downloads_outdated_blocks(weather_service, requested):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    location = weather_service.locations["Concepción"]
+    first = weather_service.get_weather_data("Concepción")
+    age_block(weather_service, location, "hourly", 2 * 3600)
+
+    refreshed = weather_service.refresh_weather_data("Concepción")
+
+    assert requested == [("current", "hourly", "daily"), ("current", "hourly")]
+    assert refreshed["success"]
+    assert refreshed["daily"] == first["daily"]  # Desde la caché, unido al resto
+    assert refreshed["hourly"]["time"] and refreshed["current"]
+
+
+def test_block_missing_from_cache_is_downloaded_again(weather_service, requested):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    location = weather_service.locations["Concepción"]
+    weather_service.get_weather_data("Concepción")
+    weather_service.cache.invalidate(weather_service._cache_key(location, "daily"))
+
+    result = weather_service._download_blocks(location, ("current",))
+
+    assert result.success and len(result.daily)
+    assert requested[-2:] == [("current",), ("current", "hourly", "daily")]
+
+
+def test_merge_with_missing_block_is_not_a_success(weather_service):
+    complete = Forecast.from_dict({"success": True, "current": {"temperature_2m": 12.5}})
+
+    merged = weather_service._merge_blocks({"current": complete, "hourly": complete, "daily": None})
+
+    assert not merged.success
+    assert merged.current.temperature_2m == 12.5
+    assert weather_service._merge_blocks({block: complete for block in weather_service.BLOCKS}).success
+
+
+def test_each_block_expires_with_its_own_ttl(weather_service):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    location = weather_service.locations["Concepción"]
+    weather_service.get_weather_data("Concepción")
+    now = time.time()
+    assert weather_service._cached_blocks(location, now)[1] == ()
+
+    age_block(weather_service, location, "current", weather_service.block_ttls["current"] + 1)
+    assert weather_service._cached_blocks(location, now)[1] == ("current",)
+
+    age_block(weather_service, location, "daily", weather_service.block_ttls["daily"] + 1)
+    assert weather_service._cached_blocks(location, now)[1] == ("current", "daily")
+
+
+def test_hourly_and_daily_blocks_expire_when_they_stop_covering_today(weather_service):
+    offset = -3 * 3600
+    forecast = Forecast.from_dict({
+        "success": True, "utc_offset_seconds": offset,
+        "hourly": {"time": ["2024-05-01T00:00", "2024-05-01T01:00"], "temperature_2m": [1.0, 2.0]},
+        "daily": {"time": ["2024-05-01"], "temperature_2m_max": [3.0]},
+    })
+    # 2024-05-01T01:30 en hora local
+    local_now = forecast.hourly.time[1] + 1800 - offset
+
+    assert weather_service._covers_today("hourly", forecast, local_now)
+    assert not weather_service._covers_today("hourly", forecast, local_now + 3600)
+    assert weather_service._covers_today("daily", forecast, local_now + 20 * 3600)
+    assert not weather_service._covers_today("daily", forecast, local_now + 23 * 3600)
+    assert weather_service._covers_today("current", forecast, local_now + 10 * 86400)
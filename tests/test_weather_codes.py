@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import weather_codes
+from weather_codes import CODE_RANGE, DEFAULT_DESCRIPTION, description, icon_file, icon_names
+
+ASSETS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+
+def previous_icon_file(weather_code, is_day=True):
+    """Implementación anterior, con reemplazo de texto en cada llamada"""
+    icon = weather_codes.WEATHER_ICONS.get(weather_code, weather_codes.DEFAULT_ICON)
+    if not is_day:
+        icon = icon.replace("day", "night")
+    return f"{icon}.svg"
+
+
+def test_night_icons_for_clear_and_mostly_clear_exist():
+    assert icon_file(0, False) == "wi-night-clear.svg"
+    assert icon_file(1, False) == "wi-night-partly-cloudy.svg"
+    assert icon_file(None, False) == icon_file(42, False) == "wi-night-clear.svg"
+
+
+@pytest.mark.parametrize("is_day", [True, False])
+def test_tables_match_the_previous_lookup_elsewhere(is_day):
+    changed = {"wi-day-sunny", "wi-day-sunny-overcast"}  # Sus variantes nocturnas no existían
+    for code in list(range(CODE_RANGE)) + [None, -1, 100, "3"]:
+        if not is_day and weather_codes.WEATHER_ICONS.get(code, weather_codes.DEFAULT_ICON) in changed:
+            continue
+        assert icon_file(code, is_day) == previous_icon_file(code, is_day), code
+        assert description(code) == weather_codes.WEATHER_DESCRIPTIONS.get(code, DEFAULT_DESCRIPTION), code
+
+
+def test_every_icon_the_tables_can_return_is_in_assets():
+    names = icon_names()
+
+    assert "wi-night-clear" in names and "wi-night-sunny" not in names
+    assert [name for name in names if not os.path.exists(os.path.join(ASSETS, f"{name}.svg"))] == []
+
+
+def test_lookups_accept_loose_inputs():
+    assert icon_file(61, 1) == icon_file(61, True) == "wi-day-rain.svg"
+    assert icon_file(61, 0) == "wi-night-rain.svg"
+    assert icon_file(61.0) == "wi-day-rain.svg"
+    assert icon_file([61]) == icon_file(None)  # Valores no hashables usan el icono por defecto
+    assert description([61]) == description(None) == DEFAULT_DESCRIPTION
+    assert description(95) == "Tormenta eléctrica"
+
+
+def test_tables_are_read_only():
+    with pytest.raises(TypeError):
+        weather_codes.ICON_FILES[0, True] = "otro.svg"
+    with pytest.raises(TypeError):
+        weather_codes.DESCRIPTIONS[0] = "otra"
+
+
+def test_weather_service_uses_the_tables(weather_service):
+    assert weather_service.get_weather_icon(0, is_day=False) == "wi-night-clear.svg"
+    assert weather_service.get_weather_description(3) == "Nublado"
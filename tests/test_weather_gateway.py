@@ -0,0 +1,180 @@
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import quote
+
+import pytest
+
+from weather_gateway import WeatherGateway
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get(port, path, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        conn.request('GET', quote(path, safe='/?=&,'), headers=headers or {})
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def gateway(weather_service):
+    weather_service.add_location("Concepción", -36.83, -73.05)
+    weather_service.add_location("Temuco", -38.74, -72.60)
+    gateway = WeatherGateway(weather_service, threads=8)
+    gateway.port = gateway.start_in_thread()
+    return gateway
+
+
+def count_renders(gateway, monkeypatch, delay=0.0):
+    renders = []
+    original = gateway._render
+
+    def render(kind, names):
+        renders.append((kind, names))
+        time.sleep(delay)
+        return original(kind, names)
+
+    monkeypatch.setattr(gateway, "_render", render)
+    return renders
+
+
+def test_revalidation_answers_304_without_rendering(gateway, monkeypatch):
+    status, headers, body = get(gateway.port, "/weather/Concepción")
+    assert status == 200 and json.loads(body)["success"]
+    etag = headers["ETag"]
+
+    renders = count_renders(gateway, monkeypatch)
+    status, headers, body = get(gateway.port, "/weather/Concepción", {"If-None-Match": etag})
+
+    assert status == 304 and body == b"" and headers["ETag"] == etag
+    assert renders == []
+
+
+def test_etag_changes_when_the_forecast_is_downloaded_again(gateway, weather_service):
+    _, headers, _ = get(gateway.port, "/weather/Concepción")
+    etag = headers["ETag"]
+
+    time.sleep(0.01)  # fetched_at distinto
+    weather_service.refresh_weather_data("Concepción")
+    status, headers, body = get(gateway.port, "/weather/Concepción", {"If-None-Match": etag})
+
+    assert status == 200 and body and headers["ETag"] != etag
+    assert get(gateway.port, "/weather/Concepción", {"If-None-Match": headers["ETag"]})[0] == 304
+
+
+def test_bulk_etag_covers_every_city(gateway, weather_service):
+    status, headers, body = get(gateway.port, "/weather?cities=Concepción,Temuco")
+    assert status == 200 and set(json.loads(body)) == {"Concepción", "Temuco"}
+    etag = headers["ETag"]
+    assert get(gateway.port, "/weather?city=Concepción&city=Temuco", {"If-None-Match": etag})[0] == 304
+
+    time.sleep(0.01)
+    weather_service.refresh_weather_data("Temuco")
+    assert get(gateway.port, "/weather?cities=Concepción,Temuco", {"If-None-Match": etag})[0] == 200
+
+
+def test_unknown_city_is_not_found_even_with_if_none_match(gateway):
+    assert get(gateway.port, "/weather/Atlántida", {"If-None-Match": "*"})[0] == 404
+
+
+def test_simultaneous_requests_render_once(gateway, monkeypatch, fake_server):
+    renders = count_renders(gateway, monkeypatch, delay=0.3)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(get(gateway.port, "/weather/Temuco")))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [status for status, _, _ in results] == [200] * 6
+    assert len({body for _, _, body in results}) == 1
+    assert renders == [("city", ("Temuco",))]
+    assert fake_server.requests == 1
+
+
+def test_city_added_by_another_process_is_found_after_reload(gateway, weather_service):
+    gateway.reload_interval = 0
+    weather_service.db_manager.add_city("Osorno", -40.57, -73.14)  # Solo en la base de datos
+
+    status, _, body = get(gateway.port, "/weather/Osorno")
+    assert status == 200 and json.loads(body)["success"]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_worker_processes_share_the_forecast_cache(tmp_path, fake_server):
+    from database_manager import DatabaseManager
+    db = DatabaseManager(str(tmp_path / "weather_app.db"))
+    db.add_city("Concepción", -36.83, -73.05)
+    db.close()
+
+    port = free_port()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "weather_gateway.py"), "--port", str(port),
+                                "--workers", "2", "--base-url", fake_server.base_url],
+                               cwd=tmp_path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                if get(port, "/health")[0] == 200:
+                    break
+            except OSError:
+                pass
+            assert time.monotonic() < deadline, "la pasarela no arrancó"
+            time.sleep(0.1)
+
+        # Conexiones nuevas: el kernel las reparte entre los procesos
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get(port, "/weather/Concepción")))
+                   for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert [status for status, _, _ in results] == [200] * 12
+        assert all(json.loads(body)["success"] for _, _, body in results)
+        assert fake_server.requests == 1  # Un solo proceso descargó; el otro leyó SQLite
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=15) == 0
+
+
+def test_lookups_and_reloads_from_many_threads(weather_service):
+    from weather_service import LocationDirectory
+
+    names = [f"Ciudad {i}" for i in range(40)]
+    weather_service.db_manager.import_cities([(name, -30 - i / 10, -70) for i, name in enumerate(names)])
+    weather_service.locations = LocationDirectory(weather_service.db_manager, preload_limit=5, max_cached=8)
+    gateway = WeatherGateway(weather_service, reload_interval=0)
+    errors = []
+
+    def lookups():
+        try:
+            for _ in range(20):
+                for name in names:
+                    assert gateway._known(name)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
@@ -0,0 +1,94 @@
+# Tablas de códigos WMO usados por Open-Meteo
+from types import MappingProxyType
+
+CODE_RANGE = 100  # Los códigos WMO van de 0 a 99
+
+DEFAULT_ICON = "wi-day-sunny"
+DEFAULT_DESCRIPTION = "Sin datos"
+
+WEATHER_ICONS = {
+    0: "wi-day-sunny",  # Despejado
+    1: "wi-day-sunny-overcast",  # Mayormente despejado
+    2: "wi-day-cloudy",  # Parcialmente nublado
+    3: "wi-cloudy",  # Nublado
+    45: "wi-fog",  # Niebla
+    48: "wi-fog",  # Niebla escarchada
+    51: "wi-day-sprinkle",  # Llovizna ligera
+    53: "wi-day-sprinkle",  # Llovizna moderada
+    55: "wi-day-sprinkle",  # Llovizna densa
+    61: "wi-day-rain",  # Lluvia ligera
+    63: "wi-day-rain",  # Lluvia moderada
+    65: "wi-day-rain",  # Lluvia fuerte
+    80: "wi-day-rain",  # Chubascos ligeros
+    81: "wi-day-rain",  # Chubascos moderados
+    82: "wi-day-rain",  # Chubascos fuertes
+    95: "wi-day-thunderstorm",  # Tormenta ligera
+    96: "wi-day-thunderstorm",  # Tormenta con granizo ligero
+    99: "wi-day-thunderstorm",  # Tormenta con granizo fuerte
+}
+
+WEATHER_DESCRIPTIONS = {
+    0: "Sin datos",
+    1: "Mayormente despejado",
+    2: "Parcialmente nublado",
+    3: "Nublado",
+    45: "Niebla",
+    48: "Niebla escarchada",
+    51: "Llovizna ligera",
+    53: "Llovizna moderada",
+    55: "Llovizna densa",
+    61: "Lluvia ligera",
+    63: "Lluvia moderada",
+    65: "Lluvia fuerte",
+    80: "Chubascos ligeros",
+    81: "Chubascos moderados",
+    82: "Chubascos fuertes",
+    95: "Tormenta eléctrica",
+    96: "Tormenta con granizo",
+    99: "Tormenta fuerte con granizo"
+}
+
+# Variantes nocturnas sin equivalente directo "wi-night-*" en assets/
+NIGHT_ICONS = {
+    "wi-day-sunny": "wi-night-clear",
+    "wi-day-sunny-overcast": "wi-night-partly-cloudy",
+}
+
+
+def _night_icon(icon):
+    return NIGHT_ICONS.get(icon, icon.replace("day", "night"))
+
+
+DEFAULT_ICON_FILES = (f"{_night_icon(DEFAULT_ICON)}.svg", f"{DEFAULT_ICON}.svg")
+
+# Tablas inmutables precalculadas: (código, es_de_día) -> archivo y código -> descripción.
+# Las consultas son un único acceso a diccionario, sin reemplazos de texto por llamada.
+ICON_FILES = MappingProxyType({
+    (code, is_day): (f"{WEATHER_ICONS[code]}.svg" if is_day else f"{_night_icon(WEATHER_ICONS[code])}.svg")
+    if code in WEATHER_ICONS else DEFAULT_ICON_FILES[is_day]
+    for code in range(CODE_RANGE) for is_day in (False, True)
+})
+DESCRIPTIONS = MappingProxyType({
+    code: WEATHER_DESCRIPTIONS.get(code, DEFAULT_DESCRIPTION) for code in range(CODE_RANGE)
+})
+
+
+def icon_file(weather_code, is_day=True):
+    """Nombre del archivo SVG para un código de clima"""
+    try:
+        return ICON_FILES[weather_code, bool(is_day)]
+    except (KeyError, TypeError):
+        return DEFAULT_ICON_FILES[bool(is_day)]
+
+
+def description(weather_code):
+    """Descripción en español de un código de clima"""
+    try:
+        return DESCRIPTIONS[weather_code]
+    except (KeyError, TypeError):
+        return DEFAULT_DESCRIPTION
+
+
+def icon_names():
+    """Nombres (sin extensión) de todos los iconos que pueden devolver las tablas"""
+    return sorted({name[:-4] for name in ICON_FILES.values()})
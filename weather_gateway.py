@@ -0,0 +1,378 @@
+"""Pasarela HTTP local: varios clientes (app, widget, paneles) comparten una sola caché de pronósticos.
+
+Uso:
+    python weather_gateway.py [--host 127.0.0.1] [--port 8765] [--workers 4] [--threads 8]
+
+Rutas (GET o HEAD):
+    /weather/{ciudad}              pronóstico de una ciudad guardada
+    /weather?city=A&city=B         varias ciudades en una respuesta ({ciudad: datos})
+    /weather?cities=A,B            igual, separadas por comas
+    /weather                       todas las ciudades guardadas
+    /cities                        nombres de las ciudades guardadas
+    /health, /metrics
+
+Las respuestas llevan ETag; con If-None-Match coincidente se responde 304 sin cuerpo. El
+ETag de un pronóstico sale de la caché (clave y fecha de descarga de cada bloque), así que
+la revalidación no construye el cuerpo mientras los datos sigan vigentes.
+Las peticiones simultáneas iguales se resuelven una sola vez. Con --workers > 1 cada
+proceso tiene su WeatherService y todos comparten la caché persistida en SQLite: lo que
+descarga un proceso lo leen los demás en lugar de volver a pedirlo a Open-Meteo.
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import multiprocessing
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from instrumentation import count, error, info, snapshot, span, warning
+
+MAX_HEADER_LINES = 100
+COMPRESS_MIN_BYTES = 1024
+
+
+def make_etag(body: bytes) -> str:
+    """ETag fuerte derivado del contenido de la respuesta"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Compara la cabecera If-None-Match (admite listas, '*' y etiquetas débiles W/)"""
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class WeatherGateway:
+    """Servidor HTTP asyncio sobre un WeatherService.
+
+    El bucle de eventos solo atiende sockets: las llamadas al servicio (caché, SQLite,
+    red) y la serialización a JSON se hacen en un pool de hilos.
+    """
+
+    def __init__(self, weather_service, threads: int = 8, reload_interval: float = 5.0,
+                 idle_timeout: float = 30.0, compressed_entries: int = 256):
+        self.weather_service = weather_service
+        self.reload_interval = reload_interval
+        self.idle_timeout = idle_timeout
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="gateway")
+        self._pending = {}  # clave -> Future de la respuesta en curso (solo desde el bucle de eventos)
+        self._compressed = OrderedDict()  # etag -> cuerpo gzip
+        self._compressed_entries = compressed_entries
+        self._compressed_lock = threading.Lock()
+        self._locations_loaded_at = time.monotonic()
+        self._reload_lock = threading.Lock()
+
+    # --- Contenido ---
+
+    def _known(self, name: str) -> bool:
+        """Comprueba la ciudad; si no está, relee la base de datos (otro proceso pudo agregarla).
+
+        Se ejecuta en el pool de hilos: un solo hilo relee a la vez y el directorio nuevo se
+        reemplaza entero ya construido, así que los demás ven el anterior o el nuevo.
+        """
+        if name in self.weather_service.locations:
+            return True
+        with self._reload_lock:
+            if time.monotonic() - self._locations_loaded_at >= self.reload_interval:
+                self.weather_service.locations = self.weather_service.load_locations_from_db()
+                self._locations_loaded_at = time.monotonic()
+            return name in self.weather_service.locations
+
+    def _version_etag(self, kind: str, names: tuple):
+        """ETag de un pronóstico a partir de las claves y fechas de descarga de la caché.
+
+        Se calcula sin construir el cuerpo; None si alguna ciudad no tiene todos sus bloques
+        vigentes (entonces la respuesta sí depende de una descarga y se usa el contenido).
+        """
+        service = self.weather_service
+        if kind == 'bulk':
+            names = names or tuple(service.get_all_locations())
+        elif kind != 'city':
+            return None
+        versions = []
+        for name in names:
+            version = service.get_cache_version(name)
+            if version is None:
+                return None
+            versions.append((name, version))
+        return make_etag(repr((kind, versions)).encode('utf-8'))
+
+    def _render(self, kind: str, names: tuple):
+        """Construye (estado, cuerpo JSON, etag) de una ruta; se ejecuta en el pool de hilos"""
+        service = self.weather_service
+        if kind == 'city':
+            if not self._known(names[0]):
+                return self._json(HTTPStatus.NOT_FOUND, {'error': f"Ciudad desconocida: {names[0]}"})
+            return self._versioned(kind, names, lambda: service.get_weather_data(names[0]))
+        if kind == 'bulk':
+            names = names or tuple(service.get_all_locations())
+            unknown = [name for name in names if not self._known(name)]
+            if unknown:
+                return self._json(HTTPStatus.NOT_FOUND, {'error': "Ciudades desconocidas", 'cities': unknown})
+            return self._versioned(kind, names, lambda: service.get_weather_data_many(list(names)))
+        if kind == 'cities':
+            return self._json(HTTPStatus.OK, service.get_all_locations())
+        if kind == 'metrics':
+            return self._json(HTTPStatus.OK, snapshot())
+        # upstream: estado del circuito hacia Open-Meteo (closed, open o half_open)
+        return self._json(HTTPStatus.OK, {'status': 'ok', 'cities': len(service.locations),
+                                          'upstream': service.breaker.state})
+
+    def _versioned(self, kind: str, names: tuple, load):
+        """Como _json, con el ETag de la caché si no cambió mientras se leían los datos"""
+        etag = self._version_etag(kind, names)
+        status, body, content_etag = self._json(HTTPStatus.OK, load())
+        after = self._version_etag(kind, names)
+        if etag is None and after is not None:
+            # La lectura descargó los datos: se repite ya desde la caché para saber su versión
+            etag = after
+            status, body, content_etag = self._json(HTTPStatus.OK, load())
+            after = self._version_etag(kind, names)
+        if etag is None or etag != after:
+            return status, body, content_etag
+        return status, body, etag
+
+    @staticmethod
+    def _json(status, payload):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return status, body, make_etag(body)
+
+    def _gzip(self, etag: str, body: bytes) -> bytes:
+        """Comprime una sola vez cada versión de una respuesta"""
+        with self._compressed_lock:
+            compressed = self._compressed.get(etag)
+            if compressed is not None:
+                self._compressed.move_to_end(etag)
+                return compressed
+        compressed = gzip.compress(body, compresslevel=5)
+        with self._compressed_lock:
+            self._compressed[etag] = compressed
+            while len(self._compressed) > self._compressed_entries:
+                self._compressed.popitem(last=False)
+        return compressed
+
+    async def _coalesced(self, key, kind: str, names: tuple):
+        """Una sola ejecución de _render por clave; los demás clientes esperan el mismo resultado"""
+        future = self._pending.get(key)
+        if future is not None:
+            count("gateway.coalesced")
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self._render, kind, names)
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        # shield: si un cliente se desconecta no se cancela la respuesta de los demás
+        return await asyncio.shield(future)
+
+    # --- HTTP ---
+
+    @staticmethod
+    def _route(target: str):
+        """Devuelve (tipo, ciudades) de la ruta pedida, o None si no existe"""
+        parts = urlsplit(target)
+        path = parts.path.rstrip('/') or '/'
+        if path.startswith('/weather/'):
+            return 'city', (unquote(path[len('/weather/'):]),)
+        if path == '/weather':
+            query = parse_qs(parts.query)
+            names = list(query.get('city', []))
+            for value in query.get('cities', []):
+                names.extend(name.strip() for name in value.split(',') if name.strip())
+            return 'bulk', tuple(dict.fromkeys(names))
+        if path in ('/cities', '/health', '/metrics'):
+            return path[1:], ()
+        return None
+
+    @staticmethod
+    def _headers(etag: str):
+        return {'ETag': etag, 'Cache-Control': 'no-cache', 'Content-Type': 'application/json; charset=utf-8'}
+
+    async def _read_request(self, reader):
+        """Lee la línea de petición y las cabeceras; None si el cliente cerró la conexión"""
+        line = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+        if not line:
+            return None
+        method, target, version = line.decode('latin-1').split()
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise ValueError("Demasiadas cabeceras")
+        # Las rutas no tienen cuerpo; si llega uno se descarta para no romper el keep-alive
+        length = int(headers.get('content-length') or 0)
+        if length:
+            await reader.readexactly(length)
+        return method, target, version, headers
+
+    async def _respond(self, method, target, headers):
+        """Devuelve (estado, cabeceras extra, cuerpo)"""
+        if method not in ('GET', 'HEAD'):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'Allow': 'GET, HEAD'}, b''
+        route = self._route(target)
+        if route is None:
+            return HTTPStatus.NOT_FOUND, {}, b''
+
+        kind, names = route
+        if_none_match = headers.get('if-none-match', '')
+        if if_none_match and kind in ('city', 'bulk'):
+            # Revalidación sin construir ni serializar el pronóstico
+            etag = await asyncio.get_running_loop().run_in_executor(self._executor, self._version_etag, kind, names)
+            if etag is not None and etag_matches(if_none_match, etag):
+                count("gateway.not_modified")
+                return HTTPStatus.NOT_MODIFIED, self._headers(etag), b''
+
+        status, body, etag = await self._coalesced(route, kind, names)
+        extra = self._headers(etag)
+        if status == HTTPStatus.OK and etag_matches(if_none_match, etag):
+            count("gateway.not_modified")
+            return HTTPStatus.NOT_MODIFIED, extra, b''
+        if len(body) >= COMPRESS_MIN_BYTES and 'gzip' in headers.get('accept-encoding', ''):
+            body = await asyncio.get_running_loop().run_in_executor(self._executor, self._gzip, etag, body)
+            extra['Content-Encoding'] = 'gzip'
+            extra['Vary'] = 'Accept-Encoding'
+        return status, extra, body
+
+    async def handle(self, reader, writer):
+        """Atiende una conexión (HTTP/1.1 con keep-alive)"""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    break
+                if request is None:
+                    break
+                method, target, version, headers = request
+                count("gateway.requests")
+                with span("gateway.request") as request_span:
+                    try:
+                        status, extra, body = await self._respond(method, target, headers)
+                    except Exception as e:
+                        error(f"Error en la pasarela ({target}): {e}")
+                        request_span.fail()
+                        status, extra, body = HTTPStatus.INTERNAL_SERVER_ERROR, {}, b''
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                lines = [f"HTTP/1.1 {status.value} {status.phrase}",
+                         f"Content-Length: {len(body)}",
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                lines.extend(f"{name}: {value}" for name, value in extra.items())
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD' and status != HTTPStatus.NOT_MODIFIED:
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, sock=None):
+        """Atiende conexiones hasta que se cancele la tarea"""
+        if sock is not None:
+            server = await asyncio.start_server(self.handle, sock=sock)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def start_in_thread(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Arranca la pasarela en un hilo daemon (útil para incrustarla en otra app); devuelve el puerto"""
+        sock = socket.create_server((host, port))
+        threading.Thread(target=asyncio.run, args=(self.serve(sock=sock),),
+                         name="weather-gateway", daemon=True).start()
+        return sock.getsockname()[1]
+
+
+def _run_worker(sock, threads, service_options, shared=False):
+    """Proceso de trabajo: su propio WeatherService sobre la base de datos compartida"""
+    from weather_service import WeatherService
+    service = WeatherService(**service_options)
+    if shared:
+        # Un solo proceso descarga cada ciudad; los demás la leen de SQLite al terminar
+        try:
+            from refresh_engine import InterProcessLock
+            service.fetch_lock = InterProcessLock(f"{service.db_manager.db_name}.locks")
+        except (ImportError, OSError) as e:
+            warning(f"⚠️ Sin bloqueo entre procesos ({e}); puede haber descargas duplicadas")
+    gateway = WeatherGateway(service, threads=threads)
+    try:
+        asyncio.run(gateway.serve(sock=sock))
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(host: str = '127.0.0.1', port: int = 8765, workers: int = 1, threads: int = 8, **service_options):
+    """Arranca la pasarela; con workers > 1 los procesos comparten el socket de escucha y la caché SQLite"""
+    sock = socket.create_server((host, port), backlog=1024)
+    info(f"🌐 Pasarela escuchando en http://{host}:{sock.getsockname()[1]} ({workers} procesos)")
+    if workers <= 1:
+        _run_worker(sock, threads, service_options)
+        return
+
+    # El esquema se crea una vez aquí para que los procesos no compitan por la migración
+    from database_manager import DatabaseManager
+    DatabaseManager().close()
+
+    def spawn():
+        process = multiprocessing.Process(target=_run_worker, args=(sock, threads, service_options, True),
+                                          daemon=True)
+        process.start()
+        return process
+
+    # SIGTERM debe pasar por el finally para detener también a los procesos de trabajo
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    processes = [spawn() for _ in range(workers)]
+    try:
+        while True:
+            for index, process in enumerate(processes):
+                process.join(timeout=1)
+                if not process.is_alive():
+                    warning(f"Proceso de la pasarela terminado (código {process.exitcode}); se reinicia")
+                    processes[index] = spawn()
+    except KeyboardInterrupt:
+        info("Deteniendo la pasarela")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=5)
+        sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1, help="procesos (por ejemplo, uno por núcleo)")
+    parser.add_argument('--threads', type=int, default=8, help="hilos por proceso para caché, SQLite y red")
+    parser.add_argument('--base-url', default=None, help="URL de la API (por defecto, Open-Meteo)")
+    parser.add_argument('--hedge', action='store_true', help="repetir las peticiones que superan el p95")
+    args = parser.parse_args()
+
+    options = {'base_url': args.base_url} if args.base_url else {}
+    if args.hedge:
+        options['hedge'] = True
+    serve(args.host, args.port, workers=args.workers, threads=args.threads, **options)
+
+
+if __name__ == '__main__':
+    main()
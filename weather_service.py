@@ -1,28 +1,174 @@
 #Funcionamiento con la API de Open-Meteo para obtener datos meteorológicos 
 # y mostrarlos en una interfaz gráfica usando Flet.
 
-import requests
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
 from datetime import datetime
+import weather_codes
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
 from database_manager import DatabaseManager  # Agregar esta importación
+from forecast_cache import ForecastCache
+from forecast_model import Forecast
+from history_store import HistoryStore
+from instrumentation import count, debug, error, info, span, start_exporters_from_env, warning
+from refresh_engine import SingleFlight
+from spatial_index import grid_cell
+
+class LocationDirectory(MutableMapping):
+    """Ubicaciones guardadas como diccionario nombre -> {"lat", "lon"}, respaldado por la base de datos.
+    
+    Si la tabla tiene hasta preload_limit ciudades se cargan todas al crearlo. Si tiene más,
+    solo se guardan en memoria (con desalojo LRU) las consultadas: el resto se busca por
+    nombre en SQLite y la iteración recorre la tabla por páginas, así que el arranque y la
+    memoria no dependen del tamaño de la tabla.
+    """
+    
+    def __init__(self, db_manager, preload_limit=2000, max_cached=4096):
+        self.db_manager = db_manager
+        self.max_cached = max_cached
+        self._cities = OrderedDict()
+        self._lock = threading.RLock()  # Leer también reordena el LRU: la pasarela lo usa desde varios hilos
+        cities, more = db_manager.get_cities_page(limit=preload_limit + 1)
+        self.complete = more is None
+        if self.complete:
+            for city in cities:
+                self._cities[city["name"]] = {"lat": city["lat"], "lon": city["lon"]}
+    
+    def __getitem__(self, name):
+        with self._lock:
+            location = self._cities.get(name)
+            if location is not None:
+                if not self.complete:
+                    self._cities.move_to_end(name)
+                return location
+        if self.complete:
+            raise KeyError(name)
+        city = self.db_manager.get_city(name)
+        if city is None:
+            raise KeyError(name)
+        location = {"lat": city["lat"], "lon": city["lon"]}
+        self._remember(name, location)
+        return location
+    
+    def __setitem__(self, name, location):
+        with self._lock:
+            if self.complete:
+                self._cities[name] = location
+            else:
+                self._remember(name, location)
+    
+    def __delitem__(self, name):
+        with self._lock:
+            if self.complete:
+                del self._cities[name]
+            else:
+                self._cities.pop(name, None)
+    
+    def __iter__(self):
+        if self.complete:
+            with self._lock:
+                return iter(list(self._cities))
+        return (city["name"] for city in self.db_manager.iter_cities())
+    
+    def __len__(self):
+        if self.complete:
+            with self._lock:
+                return len(self._cities)
+        return self.db_manager.count_cities()
+    
+    def _remember(self, name, location):
+        with self._lock:
+            self._cities[name] = location
+            self._cities.move_to_end(name)
+            while len(self._cities) > self.max_cached:
+                self._cities.popitem(last=False)
+
 
 class WeatherService:
-    def __init__(self):
-        self.base_url = "https://api.open-meteo.com/v1/forecast"
+    CURRENT_VARIABLES = 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,rain,pressure_msl,surface_pressure,wind_speed_10m,wind_direction_10m,is_day,weather_code'
+    HOURLY_VARIABLES = 'temperature_2m,relative_humidity_2m,precipitation_probability,weather_code'
+    DAILY_VARIABLES = 'weather_code,temperature_2m_max,temperature_2m_min,sunrise,sunset,uv_index_max,precipitation_sum'
+    BLOCKS = ('current', 'hourly', 'daily')
+    BLOCK_VARIABLES = {'current': CURRENT_VARIABLES, 'hourly': HOURLY_VARIABLES, 'daily': DAILY_VARIABLES}
+    BULK_CHUNK_SIZE = 50  # Ubicaciones por petición para mantener la URL en un tamaño razonable
+
+    def __init__(self, cache_ttl=600, cache_max_entries=64, transport=None,
+                 base_url="https://api.open-meteo.com/v1/forecast", gazetteer_path="gazetteer.idx",
+                 hourly_ttl=3600, daily_ttl=6 * 3600, forecast_days=1, past_days=0, variables=None,
+                 streaming=None, fetch_lock=None, breaker=None, hedge=False):
+        self.base_url = base_url
+        self.forecast_days = forecast_days
+        self.past_days = past_days
+        # variables permite cambiar la lista de un bloque: {'hourly': ['temperature_2m', 'rain']}
+        self.block_variables = dict(self.BLOCK_VARIABLES)
+        for block, names in (variables or {}).items():
+            self.block_variables[block] = names if isinstance(names, str) else ','.join(names)
+        # Los pronósticos largos se leen por fragmentos directamente a arreglos compactos
+        self.streaming = forecast_days + past_days > 3 if streaming is None else streaming
+        self.gazetteer_path = gazetteer_path
+        self._gazetteer = None
+        self._transport = transport
         self.db_manager = DatabaseManager()
         self.locations = self.load_locations_from_db()
+        # Cada bloque se guarda y vence por separado: 'current' cambia cada pocos minutos,
+        # el diario (amanecer, índice UV) apenas una vez al día
+        self.block_ttls = {'current': cache_ttl, 'hourly': max(cache_ttl, hourly_ttl), 'daily': max(cache_ttl, daily_ttl)}
+        self.cache = ForecastCache(self.db_manager, ttl=cache_ttl, max_entries=cache_max_entries * len(self.BLOCKS))
+        self.history = HistoryStore(self.db_manager)
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        # InterProcessLock opcional: coordina las descargas de varios procesos sobre la misma base de datos
+        self.fetch_lock = fetch_lock
+        # Con el servidor caído o lento se sirven los datos guardados sin esperar al timeout
+        self.breaker = breaker or CircuitBreaker()
+        # hedge=True lanza una segunda petición igual si la primera supera el p95 reciente
+        self.hedge = hedge
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+        start_exporters_from_env()
+    
+    @property
+    def transport(self):
+        """Transporte HTTP; requests se importa al hacer la primera descarga, no al arrancar"""
+        if self._transport is None:
+            from http_transport import HttpTransport
+            self._transport = HttpTransport()
+        return self._transport
+    
+    @transport.setter
+    def transport(self, transport):
+        self._transport = transport
     
     def load_locations_from_db(self):
-        """Carga las ubicaciones desde la base de datos"""
-        cities = self.db_manager.get_all_cities()
-        locations = {}
-        for city in cities:
-            locations[city["name"]] = {
-                "lat": city["lat"],
-                "lon": city["lon"]
-            }
-        print(f"Se cargaron {len(locations)} ciudades desde la base de datos")
+        """Carga las ubicaciones desde la base de datos (todas si son pocas; si no, a demanda)"""
+        locations = LocationDirectory(self.db_manager)
+        if locations.complete:
+            info(f"Se cargaron {len(locations)} ciudades desde la base de datos")
+        else:
+            info("Ciudades en modo de consulta a demanda (tabla grande)")
         return locations
     
+    def import_locations(self, path, on_conflict="skip"):
+        """Importa ciudades desde un archivo .csv o .json/.jsonl y recarga las ubicaciones"""
+        if str(path).lower().endswith('.csv'):
+            counts = self.db_manager.import_cities_csv(path, on_conflict)
+        else:
+            counts = self.db_manager.import_cities_json(path, on_conflict)
+        self.locations = self.load_locations_from_db()
+        return counts
+    
+    def export_locations(self, path):
+        """Exporta las ciudades a un archivo .csv o .json; devuelve cuántas se escribieron"""
+        if str(path).lower().endswith('.csv'):
+            return self.db_manager.export_cities_csv(path)
+        return self.db_manager.export_cities_json(path)
+    
     def get_last_selected_city(self):
         """Obtiene la última ciudad seleccionada"""
         return self.db_manager.get_last_selected_city()
@@ -37,57 +183,521 @@ class WeatherService:
         if success:
             # Actualizar el diccionario en memoria
             self.locations[name] = {"lat": lat, "lon": lon}
-            print(f"Ciudad {name} agregada al servicio")
+            info(f"Ciudad {name} agregada al servicio")
         return success
     
+    def search_cities(self, query: str, limit: int = 10):
+        """Busca ciudades por nombre en el índice offline (ver gazetteer.py)"""
+        if self._gazetteer is None:
+            if not os.path.exists(self.gazetteer_path):
+                warning(f"No se encontró el índice de ciudades: {self.gazetteer_path}")
+                return []
+            from gazetteer import Gazetteer
+            self._gazetteer = Gazetteer(self.gazetteer_path)
+        return self._gazetteer.search(query, limit)
+    
+    def add_location_from_search(self, result, name=None) -> bool:
+        """Agrega una ciudad devuelta por search_cities"""
+        return self.add_location(name or result["name"], result["lat"], result["lon"])
+    
     def delete_location(self, name: str) -> bool:
         """Elimina una ubicación de la base de datos y del servicio"""
-        print(f"Intentando eliminar ciudad: {name}")
+        debug(f"Intentando eliminar ciudad: {name}")
         success = self.db_manager.delete_city(name)
         if success:
             if name in self.locations:
                 # Actualizar el diccionario en memoria
                 del self.locations[name]
-                print(f"Ciudad {name} eliminada exitosamente del servicio")
+                info(f"Ciudad {name} eliminada exitosamente del servicio")
             else:
-                print(f"Ciudad {name} no encontrada en locations (pero se eliminó de BD)")
+                warning(f"Ciudad {name} no encontrada en locations (pero se eliminó de BD)")
         else:
-            print(f"Fallo al eliminar ciudad: {name} de la base de datos")
+            error(f"Fallo al eliminar ciudad: {name} de la base de datos")
         return success
     
+    def find_nearest_locations(self, lat: float, lon: float, k: int = 1):
+        """Devuelve las k ciudades guardadas más cercanas a una posición (por ejemplo, el GPS)"""
+        return self.db_manager.find_nearest_cities(lat, lon, k)
+    
+    def find_locations_within(self, lat: float, lon: float, radius_km: float):
+        """Devuelve las ciudades guardadas dentro de un radio en km"""
+        return self.db_manager.find_cities_within(lat, lon, radius_km)
+    
+    def get_startup_data(self, on_update=None):
+        """Datos para la primera pantalla sin esperar a la red.
+        
+        Devuelve (ciudad, datos) con el último pronóstico guardado de la última ciudad
+        seleccionada. Si no está vigente, lo descarga en segundo plano y llama a
+        on_update(ciudad, datos) al terminar.
+        """
+        city = self.get_last_selected_city()
+        if city not in self.locations:
+            city = next(iter(self.locations), None)
+        if city is None:
+            return None, self.get_default_data()
+        
+        location = self.locations[city]
+        blocks, outdated = self._cached_blocks(location)
+        if not outdated:
+            return city, self._merge_blocks(blocks).to_dict()
+        
+        def fetch():
+            data = self._to_data(location, self._fetch_blocks(location, outdated))
+            if on_update is not None:
+                try:
+                    on_update(city, data)
+                except Exception as e:
+                    error(f"Error en callback de arranque para {city}: {e}")
+        
+        threading.Thread(target=fetch, daemon=True).start()
+        return city, self._get_cached_or_default(location)
+    
     def get_weather_data(self, location_name):
         """Obtiene datos meteorológicos para una ubicación específica"""
         if location_name not in self.locations:
             return self.get_default_data()
         
         location = self.locations[location_name]
+        return self._to_data(location, self._current_forecast(location))
+    
+    def _current_forecast(self, location):
+        """Pronóstico combinado de la caché; descarga lo que falte y refresca lo vencido en segundo plano"""
+        blocks, outdated = self._cached_blocks(location)
+        if any(forecast is None for forecast in blocks.values()):
+            # Faltan bloques: se descargan junto con los vencidos en una sola petición
+            return self._fetch_blocks(location, outdated)
         
-        try:
-            params = {
-                'latitude': location['lat'],
-                'longitude': location['lon'],
-                'current': 'temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,rain,pressure_msl,surface_pressure,wind_speed_10m,wind_direction_10m,is_day,weather_code',
-                'hourly': 'temperature_2m,relative_humidity_2m,precipitation_probability,weather_code',
-                'daily': 'weather_code,temperature_2m_max,temperature_2m_min,sunrise,sunset,uv_index_max,precipitation_sum',
-                'timezone': 'auto',
-                'forecast_days': 1
-            }
+        if outdated:
+            # Devolver los datos vencidos de inmediato y refrescar solo esos bloques en segundo plano
+            self._refresh_in_background(location, outdated)
+        return self._merge_blocks(blocks)
+    
+    def _to_data(self, location, forecast):
+        """Diccionario para la interfaz; si la descarga falló, los últimos datos conocidos o por defecto"""
+        if forecast is None:
+            return self._get_cached_or_default(location)
+        return forecast.to_dict()
+    
+    def _build_params(self, location, blocks=BLOCKS):
+        """Construye los parámetros de la petición a Open-Meteo para los bloques indicados"""
+        params = {
+            'latitude': location['lat'],
+            'longitude': location['lon'],
+        }
+        for block in blocks:
+            params[block] = self.block_variables[block]
+        params['timezone'] = 'auto'
+        params['forecast_days'] = self.forecast_days
+        if self.past_days:
+            params['past_days'] = self.past_days
+        if self.streaming:
+            # Números en lugar de cadenas ISO: se decodifican directamente a array('q')
+            params['timeformat'] = 'unixtime'
+        return params
+    
+    def refresh_weather_data(self, location_name):
+        """Descarga datos nuevos para una ubicación: 'current' y los bloques vencidos"""
+        if location_name not in self.locations:
+            return self.get_default_data()
+        
+        location = self.locations[location_name]
+        _, outdated = self._cached_blocks(location)
+        return self._to_data(location, self._fetch_blocks(location, self._refresh_set(outdated)))
+    
+    def _refresh_set(self, outdated):
+        """Bloques a pedir en un refresco forzado: siempre 'current', más los vencidos"""
+        return tuple(block for block in self.BLOCKS if block == 'current' or block in outdated)
+    
+    def _cache_key(self, location, block):
+        """Clave de caché de un bloque por celda de la rejilla: ubicaciones muy cercanas comparten entrada"""
+        lat, lon = grid_cell(location['lat'], location['lon'])
+        return ForecastCache.make_key(lat, lon, self._build_params(location, (block,)))
+    
+    def _cached_blocks(self, location, now=None):
+        """Devuelve ({bloque: Forecast o None}, [bloques que faltan o están vencidos])"""
+        now = time.time() if now is None else now
+        blocks = {}
+        outdated = []
+        for block in self.BLOCKS:
+            cached = self.cache.get_forecast(self._cache_key(location, block), ttl=self.block_ttls[block])
+            if cached is None:
+                blocks[block] = None
+                outdated.append(block)
+                continue
+            forecast, is_fresh = cached
+            blocks[block] = forecast
+            if not is_fresh or not self._covers_today(block, forecast, now):
+                outdated.append(block)
+        return blocks, tuple(outdated)
+    
+    @staticmethod
+    def _covers_today(block, forecast, now):
+        """Los bloques horario y diario dejan de servir cuando no incluyen la hora local actual"""
+        if block == 'current':
+            return True
+        series = forecast.hourly if block == 'hourly' else forecast.daily
+        if not len(series):
+            return False
+        local_now = now + forecast.utc_offset_seconds
+        step = 3600 if block == 'hourly' else 86400
+        return series.time[0] <= local_now < series.time[-1] + step
+    
+    def _merge_blocks(self, blocks):
+        """Une los bloques guardados por separado en un solo Forecast (sin copiar arreglos).
+        
+        Los bloques que falten (None) se rellenan con los datos por defecto y el resultado
+        queda con success=False: no es un pronóstico real.
+        """
+        missing = [block for block in self.BLOCKS if blocks.get(block) is None]
+        if missing:
+            placeholder = Forecast.from_dict(self.get_default_data())
+            blocks = {block: placeholder if blocks.get(block) is None else blocks[block] for block in self.BLOCKS}
+        return Forecast(
+            current=blocks['current'].current,
+            hourly=blocks['hourly'].hourly,
+            daily=blocks['daily'].daily,
+            success=not missing,
+            utc_offset_seconds=blocks['current'].utc_offset_seconds,
+        )
+    
+    def _fetch_blocks(self, location, blocks):
+        """Descarga los bloques indicados agrupando las peticiones simultáneas iguales"""
+        blocks = tuple(blocks)
+        lat, lon = grid_cell(location['lat'], location['lon'])
+        key = f"{lat:.4f},{lon:.4f}|{','.join(blocks)}"
+        return self._single_flight.do(key, lambda: self._download_shared(location, blocks, key))
+    
+    def _download_shared(self, location, blocks, key):
+        """Con fetch_lock, solo un proceso descarga cada clave; los demás leen lo que guardó en SQLite"""
+        if self.fetch_lock is None:
+            return self._download_blocks(location, blocks)
+        
+        _, outdated = self._cached_blocks(location)
+        with self.fetch_lock.hold(key):
+            if set(blocks) <= set(outdated):
+                cached, outdated = self._cached_blocks(location)
+                if not set(blocks) & set(outdated) and None not in cached.values():
+                    # Otro proceso los descargó mientras se esperaba el bloqueo
+                    count("weather.fetch.shared")
+                    return self._merge_blocks(cached)
+            return self._download_blocks(location, blocks)
+    
+    def _download_blocks(self, location, blocks):
+        """Descarga solo las variables de los bloques indicados y las combina con el resto de la caché.
+        
+        Devuelve el Forecast completo, o None si la descarga falló.
+        """
+        params = self._build_params(location, blocks)
+        with span("weather.fetch") as fetch_span:
+            try:
+                forecast = self._request_forecasts(params)
+                if forecast.success:
+                    result = self._store_blocks(location, blocks, forecast)
+                    count("weather.fetch.success")
+                    if not result.success and len(blocks) < len(self.BLOCKS):
+                        # Un bloque no pedido desapareció de la caché (desalojado o depurado)
+                        count("weather.fetch.refetch_missing")
+                        return self._download_blocks(location, self.BLOCKS)
+                    return result
+                error("Error en los datos del pronóstico")
+            except CircuitOpenError:
+                count("weather.fetch.short_circuit")
+                fetch_span.fail()
+                return None
+            except Exception as e:
+                error(f"Error fetching weather data: {e}")
             
-            response = requests.get(self.base_url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
-                return {
-                    'current': data.get('current', {}),
-                    'hourly': data.get('hourly', {}),
-                    'daily': data.get('daily', {}),
-                    'success': True
-                }
-            else:
-                return self.get_default_data()
+            count("weather.fetch.failures")
+            fetch_span.fail()
+            return None
+    
+    def _request_forecasts(self, params, hedge=True):
+        """Hace la petición y devuelve un Forecast (o una lista con varias ubicaciones).
+        
+        Cada intento del transporte pasa por el circuit breaker: con el circuito abierto se
+        lanza CircuitOpenError sin contactar al servidor (ni seguir reintentando), y cada
+        intento (o su latencia) actualiza el estado del circuito. hedge=False desactiva la
+        petición duplicada aunque el servicio tenga hedge activo.
+        """
+        if hedge and self.hedge and self.breaker.state == CLOSED:
+            return self._request_hedged(params)
+        return self._request_once(params)
+    
+    def _request_hedged(self, params):
+        """Si la petición tarda más que el p95 reciente, lanza otra igual y usa la primera que responda"""
+        delay = self.breaker.latency_percentile(0.95)
+        if delay is None:
+            return self._request_once(params)
+        
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+            executor = self._hedge_executor
+        first = executor.submit(self._request_once, params)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        
+        count("weather.fetch.hedged")
+        second = executor.submit(self._request_once, params)
+        done, _ = wait((first, second), return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None:
+            # La más rápida falló: esperar a la otra
+            winner = second if winner is first else first
+        if winner is second:
+            count("weather.fetch.hedge_won")
+        return winner.result()
+    
+    def _request_once(self, params):
+        """Una petición a la API.
+        
+        En modo streaming la respuesta se decodifica por fragmentos: los arreglos horarios
+        van directamente a array.array sin pasar por listas de floats de Python.
+        """
+        response = self.transport.get(self.base_url, params=params, stream=self.streaming, breaker=self.breaker)
+        try:
+            if response.status_code != 200:
+                raise ValueError(f"HTTP {response.status_code}")
+            if self.streaming:
+                from forecast_stream import parse_forecast_stream
+                return parse_forecast_stream(response.iter_content(chunk_size=64 * 1024))
+            data = response.json()
+        finally:
+            response.close()
+        
+        if isinstance(data, list):
+            return [self._parse_entry(entry) for entry in data]
+        return self._parse_entry(data)
+    
+    def _parse_entry(self, entry):
+        """Forecast de una ubicación de la respuesta; las ubicaciones con error quedan con success=False"""
+        if not isinstance(entry, dict) or entry.get('error'):
+            return Forecast.from_dict({})
+        return Forecast.from_dict(self._parse_response(entry))
+    
+    def _store_blocks(self, location, blocks, forecast):
+        """Guarda cada bloque descargado en su propia entrada y devuelve el pronóstico completo"""
+        for block in blocks:
+            self.cache.set(self._cache_key(location, block), forecast.only(block))
+        self._record_history(location, forecast)
+        
+        parts = {}
+        for block in self.BLOCKS:
+            if block in blocks:
+                parts[block] = forecast
+                continue
+            entry = self.cache.get_entry(self._cache_key(location, block))
+            parts[block] = entry[0] if entry else None
+        return self._merge_blocks(parts)
+    
+    def _parse_response(self, data):
+        """Convierte la respuesta de la API al formato usado por la aplicación"""
+        return {
+            'current': data.get('current', {}),
+            'hourly': data.get('hourly', {}),
+            'daily': data.get('daily', {}),
+            'utc_offset_seconds': data.get('utc_offset_seconds', 0),
+            'success': True
+        }
+    
+    def _get_cached_or_default(self, location):
+        """Devuelve los últimos datos conocidos de la caché (aunque estén vencidos) o los datos por defecto.
+        
+        Se usa cuando la descarga falló: el resultado lleva stale=True y, si viene de la caché,
+        fetched_at de los datos servidos, para que los llamadores distingan el fallo.
+        """
+        entries = {block: self.cache.get_entry(self._cache_key(location, block)) for block in self.BLOCKS}
+        if any(entry is None for entry in entries.values()):
+            data = self.get_default_data()
+        else:
+            data = self._merge_blocks({block: entry[0] for block, entry in entries.items()}).to_dict()
+            data['fetched_at'] = entries['current'][1]
+        data['stale'] = True
+        return data
+    
+    def plan_bulk_requests(self, location_names):
+        """Agrupa las ubicaciones en peticiones múltiples; devuelve [(bloques, [[ciudades de una celda], ...])]
+        
+        Una petición múltiple pide las mismas variables para todas sus ubicaciones, así que
+        se agrupan por bloques a refrescar, y las ciudades de la misma celda de la rejilla
+        comparten una sola descarga.
+        """
+        cells = {}
+        for name in location_names:
+            if name in self.locations:
+                location = self.locations[name]
+                cells.setdefault(grid_cell(location['lat'], location['lon']), []).append(name)
+        
+        by_blocks = {}
+        for members in cells.values():
+            _, outdated = self._cached_blocks(self.locations[members[0]])
+            by_blocks.setdefault(self._refresh_set(outdated), []).append(members)
+        
+        return [
+            (blocks, groups[start:start + self.BULK_CHUNK_SIZE])
+            for blocks, groups in by_blocks.items()
+            for start in range(0, len(groups), self.BULK_CHUNK_SIZE)
+        ]
+    
+    def get_weather_data_many(self, location_names):
+        """Como get_weather_data para varias ciudades: las que aún no tienen caché se descargan juntas"""
+        missing = [
+            name for name in location_names if name in self.locations
+            and any(forecast is None for forecast in self._cached_blocks(self.locations[name])[0].values())
+        ]
+        fetched = self.get_weather_data_bulk(missing) if missing else {}
+        return {name: fetched[name] if name in fetched else self.get_weather_data(name) for name in location_names}
+    
+    def get_weather_data_bulk(self, location_names=None, hedge=True):
+        """Refresca varias ubicaciones con el mínimo de peticiones ('current' y los bloques vencidos).
+        
+        hedge=False no duplica las peticiones lentas: lo usa el planificador, que descuenta
+        de su presupuesto exactamente una petición por grupo.
+        """
+        if location_names is None:
+            location_names = list(self.locations.keys())
+        
+        fetched = {}
+        for blocks, groups in self.plan_bulk_requests(location_names):
+            representatives = [members[0] for members in groups]
+            fetched.update(self._fetch_weather_data_chunk(representatives, blocks, hedge))
+            for members in groups:
+                for name in members[1:]:
+                    fetched[name] = dict(fetched[members[0]])
+        
+        # Mantener el orden solicitado; las ciudades desconocidas reciben datos por defecto
+        return {
+            name: fetched[name] if name in fetched else self.get_default_data()
+            for name in location_names
+        }
+    
+    def _fetch_weather_data_chunk(self, names, blocks, hedge=True):
+        """Descarga en una sola petición los bloques indicados de un grupo de ubicaciones"""
+        params = self._build_params(self.locations[names[0]], blocks)
+        params['latitude'] = ','.join(str(self.locations[name]['lat']) for name in names)
+        params['longitude'] = ','.join(str(self.locations[name]['lon']) for name in names)
+        
+        try:
+            with span("weather.fetch_bulk"):
+                data = self._request_forecasts(params, hedge)
+                # Con una sola ubicación la API devuelve un objeto en lugar de una lista
+                if isinstance(data, Forecast):
+                    data = [data]
+                if len(data) != len(names):
+                    raise ValueError(f"Se esperaban {len(names)} ubicaciones y se recibieron {len(data)}")
                 
+        except CircuitOpenError:
+            count("weather.fetch.short_circuit", len(names))
+            return {name: self._get_cached_or_default(self.locations[name]) for name in names}
         except Exception as e:
-            print(f"Error fetching weather data: {e}")
-            return self.get_default_data()
+            error(f"Error fetching bulk weather data: {e}", cities=len(names))
+            count("weather.fetch.failures", len(names))
+            return {name: self._get_cached_or_default(self.locations[name]) for name in names}
+        
+        results = {}
+        for name, forecast in zip(names, data):
+            location = self.locations[name]
+            if not forecast.success:
+                error(f"Error en los datos de {name}")
+                count("weather.fetch.failures")
+                results[name] = self._get_cached_or_default(location)
+                continue
+            
+            results[name] = self._store_blocks(location, blocks, forecast).to_dict()
+        
+        count("weather.fetch.success", len(results))
+        return results
+    
+    def _record_history(self, location, forecast):
+        """Agrega una respuesta exitosa al histórico sin afectar a la descarga.
+
+        Se guarda por celda de la rejilla, igual que la caché: get_weather_data_bulk descarga
+        una sola ciudad por celda y el resto de ciudades de la celda comparten sus datos.
+        """
+        lat, lon = grid_cell(location['lat'], location['lon'])
+        try:
+            self.history.ingest_forecast(lat, lon, forecast)
+        except Exception as e:
+            error(f"Error guardando histórico: {e}")
+    
+    def get_history(self, location_name, variable, start_day, end_day, daily=False):
+        """Consulta el histórico de una variable para una ubicación guardada"""
+        if location_name not in self.locations:
+            return []
+        
+        location = self.locations[location_name]
+        query = self.history.query_daily if daily else self.history.query
+        series = query(*grid_cell(location['lat'], location['lon']), variable, start_day, end_day)
+        if not series:
+            # Histórico guardado con las coordenadas exactas antes de agruparlo por celda
+            series = query(location['lat'], location['lon'], variable, start_day, end_day)
+        return series
+    
+    def _refresh_in_background(self, location, blocks):
+        """Refresca los bloques vencidos sin bloquear al llamador"""
+        key = (grid_cell(location['lat'], location['lon']), tuple(blocks))
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        count("weather.background_refresh")
+        
+        def refresh():
+            try:
+                self._fetch_blocks(location, blocks)
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+        
+        threading.Thread(target=refresh, daemon=True).start()
+    
+    def get_forecast(self, location_name):
+        """Devuelve el pronóstico de una ubicación como modelo compacto (Forecast)"""
+        if location_name in self.locations:
+            forecast = self._current_forecast(self.locations[location_name])
+            if forecast is not None:
+                return forecast
+        return Forecast.from_dict(self.get_weather_data(location_name))
+    
+    def get_cache_entry(self, location_name):
+        """Devuelve (Forecast, fetched_at del bloque 'current') de una ubicación, o None si falta algún bloque"""
+        if location_name not in self.locations:
+            return None
+        location = self.locations[location_name]
+        entries = {block: self.cache.get_entry(self._cache_key(location, block)) for block in self.BLOCKS}
+        if any(entry is None for entry in entries.values()):
+            return None
+        return self._merge_blocks({block: entry[0] for block, entry in entries.items()}), entries['current'][1]
+    
+    def get_cache_version(self, location_name):
+        """Versión de los datos que get_weather_data serviría sin descargar nada.
+        
+        Devuelve ((clave, fetched_at), ...) de cada bloque, o None si la ciudad no existe
+        o algún bloque falta o está vencido (en ese caso get_weather_data descargaría o
+        refrescaría). Es de solo lectura, como get_cache_entry.
+        """
+        if location_name not in self.locations:
+            return None
+        location = self.locations[location_name]
+        now = time.time()
+        version = []
+        for block in self.BLOCKS:
+            key = self._cache_key(location, block)
+            entry = self.cache.get_entry(key)
+            if entry is None:
+                return None
+            forecast, fetched_at = entry
+            if now - fetched_at >= self.block_ttls[block] or not self._covers_today(block, forecast, now):
+                return None
+            version.append((key, fetched_at))
+        return tuple(version)
+    
+    def get_forecast_arrays(self, location_name):
+        """Devuelve el pronóstico de una ubicación como arreglos NumPy"""
+        from forecast_arrays import ForecastArrays  # NumPy solo se carga si se usa
+        return ForecastArrays(self.get_weather_data(location_name))
     
     def get_default_data(self):
         """Devuelve datos por defecto en caso de error o cuando no hay ciudades"""
@@ -119,56 +729,11 @@ class WeatherService:
     
     def get_weather_icon(self, weather_code, is_day=True):
         """Obtiene el icono correspondiente al código del clima"""
-        weather_icons = {
-            0: "wi-day-sunny",  # Despejado
-            1: "wi-day-sunny-overcast",  # Mayormente despejado
-            2: "wi-day-cloudy",  # Parcialmente nublado
-            3: "wi-cloudy",  # Nublado
-            45: "wi-fog",  # Niebla
-            48: "wi-fog",  # Niebla escarchada
-            51: "wi-day-sprinkle",  # Llovizna ligera
-            53: "wi-day-sprinkle",  # Llovizna moderada
-            55: "wi-day-sprinkle",  # Llovizna densa
-            61: "wi-day-rain",  # Lluvia ligera
-            63: "wi-day-rain",  # Lluvia moderada
-            65: "wi-day-rain",  # Lluvia fuerte
-            80: "wi-day-rain",  # Chubascos ligeros
-            81: "wi-day-rain",  # Chubascos moderados
-            82: "wi-day-rain",  # Chubascos fuertes
-            95: "wi-day-thunderstorm",  # Tormenta ligera
-            96: "wi-day-thunderstorm",  # Tormenta con granizo ligero
-            99: "wi-day-thunderstorm",  # Tormenta con granizo fuerte
-        }
-
-        icon = weather_icons.get(weather_code, "wi-day-sunny")
-        if not is_day:
-            icon = icon.replace("day", "night")
-        
-        return f"{icon}.svg"
+        return weather_codes.icon_file(weather_code, is_day)
     
     def get_weather_description(self, weather_code):
         """Obtiene la descripción del clima basada en el código"""
-        descriptions = {
-            0: "Sin datos",
-            1: "Mayormente despejado", 
-            2: "Parcialmente nublado",
-            3: "Nublado",
-            45: "Niebla",
-            48: "Niebla escarchada",
-            51: "Llovizna ligera",
-            53: "Llovizna moderada", 
-            55: "Llovizna densa",
-            61: "Lluvia ligera",
-            63: "Lluvia moderada",
-            65: "Lluvia fuerte",
-            80: "Chubascos ligeros",
-            81: "Chubascos moderados",
-            82: "Chubascos fuertes",
-            95: "Tormenta eléctrica",
-            96: "Tormenta con granizo",
-            99: "Tormenta fuerte con granizo"
-        }
-        return descriptions.get(weather_code, "Sin datos")
+        return weather_codes.description(weather_code)
     
 
     def format_time(self, time_str, format_type='hour'):
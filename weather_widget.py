@@ -7,7 +7,9 @@ from jnius import autoclass, cast
 import json
 import os
 from datetime import datetime
+from profiling import start_profiling_from_env
 from shared_data import SharedWeatherData
+from snapshot_watcher import SnapshotWatcher
 
 # Solo en Android
 if platform == 'android':
@@ -23,6 +25,7 @@ if platform == 'android':
 class AndroidWeatherWidget:
     def __init__(self):
         self.context = None
+        self._last_pushed = None  # Campos enviados en la última actualización
         self.setup_widget()
     
     def setup_widget(self):
@@ -46,20 +49,30 @@ class AndroidWeatherWidget:
             shared_data = SharedWeatherData()
             data = shared_data.get_weather_data()
             
+            fields = (
+                data['city'],
+                f"{data['temperature']}°",
+                data['description'],
+                f"Actualizado: {data['last_update'][11:16]}"
+            )
+            if fields == self._last_pushed:
+                return  # Nada cambió: no reconstruir RemoteViews
+            
             # Crear RemoteViews
             views = RemoteViews(self.context.getPackageName(), R.layout.widget_weather)
             
             # Actualizar vistas
-            views.setTextViewText(R.id.widget_city, data['city'])
-            views.setTextViewText(R.id.widget_temp, f"{data['temperature']}°")
-            views.setTextViewText(R.id.widget_desc, data['description'])
-            views.setTextViewText(R.id.widget_update, 
-                                f"Actualizado: {datetime.now().strftime('%H:%M')}")
+            city, temperature, description, updated = fields
+            views.setTextViewText(R.id.widget_city, city)
+            views.setTextViewText(R.id.widget_temp, temperature)
+            views.setTextViewText(R.id.widget_desc, description)
+            views.setTextViewText(R.id.widget_update, updated)
             
             # Actualizar widget
             appWidgetManager = AppWidgetManager.getInstance(self.context)
             componentName = ComponentName(self.context, WeatherWidgetProvider)
             appWidgetManager.updateAppWidget(componentName, views)
+            self._last_pushed = fields
             
             print("✅ Widget actualizado")
             
@@ -70,8 +83,32 @@ class AndroidWeatherWidget:
 class WeatherWidgetService:
     def __init__(self):
         self.widget = AndroidWeatherWidget()
+        self.shared_data = SharedWeatherData()
+        self.watcher = None
+        self.profiler = start_profiling_from_env()
         self.start_widget_updater()
     
     def start_widget_updater(self):
-        """Inicia las actualizaciones automáticas del widget"""
-        Clock.schedule_interval(lambda dt: self.widget.update_widget(), 300)  # 5 minutos
\ No newline at end of file
+        """Actualiza el widget solo cuando cambian los datos"""
+        # Cambios hechos en este proceso
+        self.shared_data.subscribe(self._on_data_changed)
+        # Cambios escritos por otros procesos en el archivo compartido
+        self.watcher = SnapshotWatcher(self.shared_data.data_file, self._on_file_changed)
+        self.watcher.start()
+        Clock.schedule_once(lambda dt: self.widget.update_widget(), 0)
+    
+    def stop_widget_updater(self):
+        """Detiene las notificaciones de cambios"""
+        self.shared_data.unsubscribe(self._on_data_changed)
+        if self.watcher:
+            self.watcher.stop()
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+    
+    def _on_data_changed(self, data):
+        # Puede llegar desde otro hilo: programar la actualización en el hilo de Kivy
+        Clock.schedule_once(lambda dt: self.widget.update_widget(), 0)
+    
+    def _on_file_changed(self, path):
+        self.shared_data.reload_from_disk()
@@ -2,6 +2,7 @@ import os
 import time
 import threading
 from datetime import datetime
+from profiling import start_profiling_from_env
 from shared_data import SharedWeatherData
 
 class WidgetService:
@@ -9,6 +10,7 @@ class WidgetService:
         self.shared_data = SharedWeatherData()
         self.is_running = False
         self.thread = None
+        self.profiler = None
         
     def start(self):
         """Inicia el servicio del widget"""
@@ -17,15 +19,28 @@ class WidgetService:
             return
             
         self.is_running = True
+        # Opcional (WEATHER_PROFILE=1): memoria y CPU del hilo del servicio a lo largo de los días
+        self.profiler = start_profiling_from_env()
         self._start_development_service()
     
     def _start_development_service(self):
         """Servicio para desarrollo (simulación)"""
         def development_loop():
             update_count = 0
+            last_sequence = -1
+            last_data = None
             while self.is_running:
                 try:
+                    # Esperar a que cambien los datos en lugar de consultar cada 30 segundos
+                    sequence = self.shared_data.wait_for_change(last_sequence, timeout=300)
+                    if sequence is None or not self.is_running:
+                        continue
+                    last_sequence = sequence
+                    
                     data = self.shared_data.get_weather_data()
+                    if data is last_data:
+                        continue  # Cambió otra ciudad: el registro principal es el mismo objeto
+                    last_data = data
                     update_count += 1
                     
                     print(f"🎯 Widget Simulator - Ejecución #{update_count}")
@@ -36,8 +51,6 @@ class WidgetService:
                     print(f"   ⏰ Última actualización: {data['last_update'][11:16]}")
                     print("   " + "─" * 40)
                     
-                    time.sleep(30)  # Actualizar cada 30 segundos en desarrollo
-                    
                 except Exception as e:
                     print(f"❌ Error en simulador: {e}")
                     time.sleep(60)
@@ -49,8 +62,12 @@ class WidgetService:
     def stop(self):
         """Detiene el servicio del widget"""
         self.is_running = False
+        self.shared_data.wake_waiters()
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=5)
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
         print("🛑 Servicio de widget detenido")
 
 # Instancia global del servicio